@@ -0,0 +1,21 @@
+Feature: Content cache
+
+    Scenario: Least-recently-used eviction
+        Given a content cache with a budget of 1000 bytes
+        And 13 GridFS files of 90 bytes each
+        When the files range(11) are read through the cache
+        And the files [0] are read through the cache
+        And the files [11, 12] are read through the cache
+        Then the cache should contain the files [0] + list(range(3, 13))
+
+    Scenario: Large files bypass the cache
+        Given a content cache with a budget of 1000 bytes
+        And 2 GridFS files of 100 bytes each
+        And 1 GridFS files of 101 bytes each
+        When the files [0, 1, 2] are read through the cache
+        Then the cache should contain the files [0, 1]
+
+    Scenario: Interrupted cache writes
+        Given a content cache with a budget of 1000 bytes
+        When storing a file fails partway through
+        Then the cache directory should be empty
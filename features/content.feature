@@ -0,0 +1,99 @@
+Feature: Content
+
+    Scenario Outline: Range headers
+        Given content with length <length>
+        When the range header <header> is parsed
+        Then the content ranges should match <ranges>
+
+        Examples:
+            | length | header                        | ranges                     |
+            | 100    | 'bytes=0-9'                   | [(0, 10)]                  |
+            | 100    | 'bytes=90-'                   | [(90, 100)]                |
+            | 100    | 'bytes=-10'                   | [(90, 100)]                |
+            | 100    | 'bytes=95-200'                | [(95, 100)]                |
+            | 100    | 'bytes=0-9,20-29'             | [(0, 10), (20, 30)]        |
+            | 100    | 'bytes=20-29,0-9'             | [(0, 10), (20, 30)]        |
+            | 100    | 'bytes=0-10,5-20'             | [(0, 21)]                  |
+            | 100    | 'bytes=0-9,10-19'             | [(0, 20)]                  |
+            | 100    | 'bytes=0-99,0-99,0-99'        | [(0, 100)]                 |
+            | 100    | 'bytes=' + ','.join(['0-0'] * 17) | []                     |
+            | 100    | 'items=0-9'                   | []                         |
+            | 100    | 'bytes=9-0'                   | []                         |
+            | 100    | 'bytes=a-b'                   | []                         |
+            | 100    | 'bytes=100-'                  | None                       |
+
+    Scenario Outline: Derived content sizes
+        Given a maximum derived content size <maximum>
+        Then the requested size <size> should be snapped to <snapped>
+
+        Examples:
+            | maximum | size  | snapped |
+            | 2048    | 1     | 16      |
+            | 2048    | 16    | 16      |
+            | 2048    | 17    | 32      |
+            | 2048    | 256   | 256     |
+            | 2048    | 300   | 512     |
+            | 2048    | 2048  | 2048    |
+            | 2048    | 99999 | 2048    |
+            | 1000    | 600   | 1000    |
+
+    Scenario Outline: Partial array reads
+        Given the stored array <array>
+        When the stored array is read with index <index>
+        Then the array read should match <result>
+
+        Examples:
+            | array                                  | index                 | result                                  |
+            | numpy.arange(10)                       | None                  | numpy.arange(10)                        |
+            | numpy.arange(10)                       | 3                     | numpy.array(3)                          |
+            | numpy.arange(10)                       | -1                    | numpy.array(9)                          |
+            | numpy.arange(10)                       | slice(2, 8, 3)        | numpy.array([2, 5])                     |
+            | numpy.arange(10)                       | slice(None, None, -4) | numpy.array([9, 5, 1])                  |
+            | numpy.arange(12).reshape(3, 4)         | (1, slice(1, 3))      | numpy.array([5, 6])                     |
+            | numpy.arange(12).reshape(3, 4)         | (slice(1, None), 0)   | numpy.array([4, 8])                     |
+            | numpy.asfortranarray(numpy.eye(3))     | (1,)                  | numpy.array([0.0, 1.0, 0.0])            |
+            | numpy.zeros(0)                         | slice(None)           | numpy.zeros(0)                          |
+            | numpy.zeros((0, 3))                    | slice(0, 5)           | numpy.zeros((0, 3))                     |
+            | numpy.zeros((2, 0))                    | 1                     | numpy.zeros(0)                          |
+
+    Scenario: Partial array reads out of bounds
+        Given the stored array numpy.arange(10)
+        Then reading the stored array with index 10 should raise IndexError
+
+    Scenario Outline: Array downsampling
+        Given the array <array>
+        When the array is downsampled to <points> points
+        Then the downsampled array should match <result>
+
+        Examples:
+            | array                           | points | result                            |
+            | numpy.arange(10)                | None   | numpy.arange(10)                  |
+            | numpy.arange(10)                | 5      | numpy.arange(0, 10, 2)            |
+            | numpy.arange(10)                | 3      | numpy.array([0, 4, 8])            |
+            | numpy.arange(10)                | 100    | numpy.arange(10)                  |
+            | numpy.array(5)                  | 2      | numpy.array(5)                    |
+            | numpy.zeros(0)                  | 2      | numpy.zeros(0)                    |
+            | numpy.zeros((0, 4))             | 2      | numpy.zeros((0, 2))               |
+
+    Scenario Outline: Compressed content
+        Given the compressed array numpy.arange(10000) using <codec>
+        Then the decoded content should match the original data
+        And the decoded content should match the original data without its decoded length
+        And the decoded array should match numpy.arange(10000)
+        And the decoded array with index slice(5000, 5004) should match numpy.arange(5000, 5004)
+        And the decoded content from offset 40000 to 40008 should match the original data
+        And the decoded content from offset 8 to 16 should match the original data
+
+        @zstandard
+        Examples: zstd
+            | codec |
+            | zstd  |
+
+        @lz4
+        Examples: lz4
+            | codec |
+            | lz4   |
+
+        Examples: zlib
+            | codec |
+            | zlib  |
@@ -0,0 +1,144 @@
+Feature: Dashboard
+
+    Scenario: Bulk tagging the results of a search
+        Given an empty database
+        And an observation with attributes {} and tags ["todo"]
+        And an observation with attributes {} and tags ["todo", "x"]
+        And an observation with attributes {} and tags []
+        And a dashboard client
+        When the client sends PUT /observations/bulk/tags with {"search": "todo", "remove": ["todo"], "toggle": ["x"]}
+        Then the response status should be 200
+        And the response should contain {"count": 4}
+        And the observation tags should be [["x"], [], []]
+
+    Scenario Outline: Malformed bulk requests
+        Given an empty database
+        And a dashboard client
+        When the client sends PUT /observations/bulk/<operation> with <body>
+        Then the response status should be 400
+
+        Examples:
+            | operation  | body                                  |
+            | tags       | not json                              |
+            | tags       | ["todo"]                              |
+            | tags       | {}                                    |
+            | tags       | {"oids": "todo"}                      |
+            | tags       | {"search": 3}                         |
+            | tags       | {"search": "todo", "add": "x"}        |
+            | attributes | {"oids": ["bogus"], "set": {"a": 1}}  |
+
+    Scenario Outline: Malformed view requests
+        Given an empty database
+        And a dashboard client
+        When the client sends PUT /views/observations/todo with <body>
+        Then the response status should be 400
+
+        Examples:
+            | body             |
+            | not json         |
+            | ["todo"]         |
+            | {}               |
+            | {"search": 3}    |
+            | {"search": "("}  |
+
+    Scenario: Saving a view
+        Given an empty database
+        And an observation with attributes {} and tags ["todo"]
+        And an observation with attributes {} and tags []
+        And a dashboard client
+        When the client sends PUT /views/observations/todo with {"search": "todo"}
+        Then the response status should be 200
+        And the response should contain {"count": 1}
+
+    Scenario: Loading a batch of objects
+        Given an empty database
+        And an observation with attributes {"n": 0} and tags ["a"]
+        And an observation with attributes {"n": 1} and tags []
+        And a dashboard client
+        When the client sends POST /observations/batch with the JSON {"oids": [str(oid) for oid in reversed(context.oids)], "views": ["attributes", "tags"]}
+        Then the response status should be 200
+        And the response should contain {"objects": [{"id": str(context.oids[1]), "attributes": {"n": 1}, "tags": []}, {"id": str(context.oids[0]), "attributes": {"n": 0}, "tags": ["a"]}]}
+
+    Scenario Outline: Malformed batch requests
+        Given an empty database
+        And a dashboard client
+        When the client sends POST /observations/batch with <body>
+        Then the response status should be 400
+
+        Examples:
+            | body                   |
+            | not json               |
+            | ["todo"]               |
+            | {"oids": "todo"}       |
+            | {"oids": ["bogus"]}    |
+            | {"views": "object"}    |
+            | {"views": [["object"]]} |
+            | {"views": ["bogus"]}   |
+
+    Scenario: Batch requests without a body
+        Given an empty database
+        And a dashboard client
+        When the client sends POST /observations/batch without a body
+        Then the response status should be 400
+
+    Scenario: Caching tag counts
+        Given an empty database
+        And an observation with attributes {} and tags ["a"]
+        And an observation with attributes {} and tags ["a", "b"]
+        And a dashboard client
+        When the client requests /observations/tags/counts
+        Then the response should contain {"tags": [{"tag": "a", "count": 2}, {"tag": "b", "count": 1}]}
+        When an observation with tags ["b"] is created without the dashboard
+        And the client requests /observations/tags/counts
+        Then the response should contain {"tags": [{"tag": "a", "count": 2}, {"tag": "b", "count": 1}]}
+        When the client requests /observations/tags/counts?search=b
+        Then the response should contain {"tags": [{"tag": "a", "count": 1}, {"tag": "b", "count": 2}]}
+        When the client sends PUT /observations/bulk/tags with the JSON {"oids": [str(context.oids[0])], "add": ["c"]}
+        And the client requests /observations/tags/counts
+        Then the response should contain {"tags": [{"tag": "a", "count": 2}, {"tag": "b", "count": 2}, {"tag": "c", "count": 1}]}
+        When the client sends PUT /observations/{oids[0]}/tags with the JSON {"remove": ["c"]}
+        And the client requests /observations/tags
+        Then the response should contain {"tags": ["a", "b"]}
+
+    Scenario Outline: Array metadata
+        Given an empty database
+        And an observation with content {"a": samlab.serialize.array(numpy.arange(4)), "b": samlab.serialize.arrays(c=numpy.zeros((2, 3)))}
+        And a dashboard client
+        When the client requests /observations/{oids[0]}/content/<key>/<endpoint>/metadata
+        Then the response status should be 200
+        And the response should contain <response>
+
+        Examples:
+            | key | endpoint | response |
+            | a   | array    | {"metadata": {"dtype": "int64", "ndim": 1, "shape": [4], "size": 4, "min": 0, "mean": 1.5, "max": 3, "sum": 6.0}} |
+            | b   | arrays   | {"metadata": [{"key": "c", "dtype": "float64", "shape": [2, 3], "size": 6}]} |
+
+    Scenario Outline: Array metadata for content stored without it
+        Given an empty database
+        And an observation with content {"a": samlab.serialize.array(numpy.arange(4)), "b": samlab.serialize.arrays(c=numpy.zeros((2, 3)))}
+        And the content metadata of observation 0 has been removed
+        And a dashboard client
+        When the client requests /observations/{oids[0]}/content/<key>/<endpoint>/metadata
+        Then the response status should be 200
+        And the response should contain <response>
+
+        Examples:
+            | key | endpoint | response |
+            | a   | array    | {"metadata": {"dtype": "int64", "ndim": 1, "shape": [4], "size": 4, "min": 0, "mean": 1.5, "max": 3, "sum": 6.0}} |
+            | b   | arrays   | {"metadata": [{"key": "c", "dtype": "float64", "shape": [2, 3], "size": 6}]} |
+
+    Scenario Outline: Array metadata for other content
+        Given an empty database
+        And an observation with content {"a": samlab.serialize.array(numpy.arange(4)), "b": samlab.serialize.arrays(c=numpy.zeros((2, 3))), "s": samlab.serialize.string("s")}
+        And a dashboard client
+        When the client requests /observations/{oids[0]}/content/<key>/<endpoint>/metadata
+        Then the response status should be <status>
+
+        Examples:
+            | key     | endpoint | status |
+            | missing | array    | 404    |
+            | missing | arrays   | 404    |
+            | s       | array    | 400    |
+            | s       | arrays   | 400    |
+            | b       | array    | 400    |
+            | a       | arrays   | 400    |
@@ -4,6 +4,7 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import importlib
 import logging
 import os
 
@@ -15,10 +16,32 @@ logging.basicConfig(level=logging.INFO)
 root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 db_dir = os.path.join(root_dir, "features", "db")
 
+# Scenarios with these tags are skipped when the corresponding optional package isn't installed.
+optional_packages = {
+    "lz4": "lz4.frame",
+    "torch": "torch",
+    "zstandard": "zstandard",
+}
+
+
+def _available(module):
+    try:
+        importlib.import_module(module)
+        return True
+    except ImportError:
+        return False
+
 
 def before_all(context):
     context.database_server = samlab.database.Server(dbpath=db_dir, reset=True, quiet=True)
 
 
+def before_scenario(context, scenario):
+    for tag in scenario.effective_tags:
+        if tag in optional_packages and not _available(optional_packages[tag]):
+            scenario.skip("Requires the optional %s package." % tag)
+            return
+
+
 def after_all(context):
     context.database_server.stop()
@@ -0,0 +1,61 @@
+Feature: Objects
+
+    Scenario Outline: Loading objects by id
+        Given an empty database
+        And an observation with attributes {"n": 0} and tags []
+        And an observation with attributes {"n": 1} and tags []
+        And an observation with attributes {"n": 2} and tags []
+        And an observation with attributes {"n": 3} and tags []
+        And an observation with attributes {"n": 4} and tags []
+        When the observations <indices> are iterated in batches of <batch_size>
+        Then the loaded observations should be <indices>
+
+        Examples:
+            | indices                     | batch_size |
+            | []                          | 2          |
+            | [0, 1, 2, 3, 4]             | 2          |
+            | [4, 3, 2, 1, 0]             | 2          |
+            | [4, 3, 2, 1, 0]             | 1          |
+            | [4, 3, 2, 1, 0]             | 10         |
+            | [2, None, 0, 2, None, 4, 1] | 2          |
+            | [2, None, 0, 2, None, 4, 1] | 3          |
+
+    Scenario: Loading objects by id with a limit
+        Given an empty database
+        And an observation with attributes {"n": 0} and tags []
+        And an observation with attributes {"n": 1} and tags []
+        And an observation with attributes {"n": 2} and tags []
+        When the observations [2, None, 1, 0] are iterated in batches of 2 with limit 3
+        Then the loaded observations should be [2, None, 1]
+
+    Scenario: Loading a list of objects by id
+        Given an empty database
+        And an observation with attributes {"n": 0} and tags []
+        And an observation with attributes {"n": 1} and tags []
+        And an observation with attributes {"n": 2} and tags []
+        When the observations [2, 0, None, 1] are loaded
+        Then the loaded observations should be [2, 0, None, 1]
+
+    Scenario Outline: Setting many objects at once
+        Given an empty database
+        And an observation with attributes {"n": 0} and tags ["a"]
+        And an observation with attributes {"n": 1} and tags ["b"]
+        And an observation with attributes {"n": 2} and tags ["c"]
+        When the <field> of observations <indices> are set to <values>
+        Then the result should be <count>
+        And the <field> field of each observation should be <result>
+
+        Examples:
+            | field      | indices   | values                 | count | result                         |
+            | attributes | [2, 0]    | [{"m": 2}, {"m": 0}]   | 2     | [{"m": 0}, {"n": 1}, {"m": 2}] |
+            | attributes | []        | []                     | 0     | [{"n": 0}, {"n": 1}, {"n": 2}] |
+            | tags       | [1, 1]    | [["x"], ["y"]]         | 1     | [["a"], ["y"], ["c"]]          |
+            | name       | [0, 1, 2] | ["zero", "one", "two"] | 3     | ["zero", "one", "two"]         |
+
+    Scenario: Setting many objects including missing ones
+        Given an empty database
+        And an observation with attributes {"n": 0} and tags []
+        And an observation with attributes {"n": 1} and tags []
+        When the attributes of observations [1, None, 0] are set to [{"m": 1}, {"m": None}, {"m": 0}]
+        Then setting them should fail for the observations [None]
+        And the observation attributes should be [{"m": 0}, {"m": 1}]
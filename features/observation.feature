@@ -0,0 +1,138 @@
+Feature: Observations
+
+    Scenario Outline: Setting tags
+        Given an empty database
+        And an observation with attributes {"n": 0} and tags []
+        And an observation with attributes {"n": 1} and tags []
+        And an observation with attributes {"n": 2} and tags ["even"]
+        And an observation with attributes {} and tags []
+        When the tag "even" is set to <state> for observations matching <filter> using <processes> processes
+        Then the result should be <count>
+        And the observations tagged "even" should be <tagged>
+
+        Examples:
+            | state                                 | filter                        | processes | count | tagged       |
+            | True                                  | {}                            | None      | 4     | [0, 1, 2, 3] |
+            | True                                  | {"attributes.n": {"$lt": 2}}  | None      | 2     | [0, 1, 2]    |
+            | False                                 | {}                            | None      | 1     | []           |
+            | False                                 | {"attributes.n": 0}           | None      | 0     | [2]          |
+            | lambda o: o["attributes"]["n"] == 0   | {"attributes.n": {"$gte": 0}} | None      | 1     | [0]          |
+            | operator.itemgetter("attributes")     | {}                            | 2         | 3     | [0, 1, 2]    |
+
+    Scenario Outline: Updating observations
+        Given an empty database
+        And an observation with attributes {"n": 0} and tags []
+        And an observation with attributes {"n": 1} and tags ["b", "a"]
+        And an observation with attributes {"n": 2} and tags []
+        When the observations are updated using <updater> and <processes> processes
+        Then the result should be <count>
+        And the observation attributes should be <attributes>
+        And the observation tags should be <tags>
+
+        Examples:
+            | updater                                                                      | processes | count | attributes                        | tags                   |
+            | lambda o: None                                                               | None      | 0     | [{"n": 0}, {"n": 1}, {"n": 2}]    | [[], ["b", "a"], []]   |
+            | lambda o: o                                                                  | None      | 1     | [{"n": 0}, {"n": 1}, {"n": 2}]    | [[], ["a", "b"], []]   |
+            | lambda o: dict(o, attributes={"n": o["attributes"]["n"] * 10})               | None      | 2     | [{"n": 0}, {"n": 10}, {"n": 20}]  | [[], ["a", "b"], []]   |
+            | functools.partial(dict, attributes={"n": 5})                                 | 2         | 3     | [{"n": 5}, {"n": 5}, {"n": 5}]    | [[], ["a", "b"], []]   |
+
+    Scenario: Ingesting files
+        Given an empty database
+        And a directory containing a 64x32 image a.png, identical arrays b.npy and c.npy, a corrupt image d.jpg, and a text file e.txt
+        When the directory is ingested with size 16 using 2 processes
+        Then the result should be 3
+        And the ingested observations should have the files ["a.png", "b.npy", "c.npy"]
+        And the ingested image a.png should have size [16, 8]
+        And the ingested files b.npy and c.npy should share stored content with 2 references
+        And the checkpoint should list the files ["a.png", "b.npy", "c.npy"]
+        When the directory is ingested with size 16 using 2 processes
+        Then the result should be 0
+
+    Scenario: Resizing images
+        Given an empty database
+        And an observation with a 64x32 image
+        And an observation with a 32x32 image
+        And an observation with a corrupt image
+        When the images are resized to (16, 8) using 2 processes
+        Then the result should be 2
+        And the resized images should have sizes [[16, 8], [16, 8], None]
+        When the images are resized to (16, 8) using 2 processes
+        Then the result should be 0
+        When the images are resized to (4, 4) using 2 processes, overwriting existing images
+        Then the result should be 2
+        And the resized images should have sizes [[4, 4], [4, 4], None]
+        And the replaced images should have been deleted
+
+    Scenario: Creating observations in batches
+        Given an empty database
+        When a batch of observations is started with batch size 2
+        And 3 observations with content are added to the batch
+        Then the database should contain the observations [0, 1]
+        When the batch is finished
+        Then finishing the batch should succeed
+        And the database should contain the observations [0, 1, 2]
+        And the observation content should be readable for observations [0, 1, 2]
+        And the database should store 3 files
+
+    Scenario: Creating observations in batches with failures
+        Given an empty database
+        When a batch of observations is started with batch size 10
+        And 3 observations with content are added to the batch
+        And another observation is inserted directly with the id of observation 1
+        And the batch is finished
+        Then finishing the batch should fail with RuntimeError
+        And the batch failures should be [1]
+        And the database should contain the observations [0, 1, 2]
+        And the observation content should be readable for observations [0, 2]
+        And the database should store 2 files
+
+    Scenario: Content reference counting
+        Given an empty database
+        And an observation with shared content "a" and tags []
+        And an observation with shared content "a" and tags []
+        And an observation with shared content "b" and tags []
+        Then the stored content "a" should have 2 references
+        And the stored content "b" should have 1 references
+        And the database should store 2 files
+        When the content of observation 0 is replaced with shared content "b"
+        Then the stored content "a" should have 1 references
+        And the stored content "b" should have 2 references
+        When the content of observation 1 is removed
+        Then the stored content "a" should be deleted
+        When observation 2 is deleted
+        Then the stored content "b" should have 1 references
+        When observation 0 is deleted
+        Then the stored content "b" should be deleted
+        And the database should store 0 files
+
+    Scenario: Releasing unshared content
+        Given an empty database
+        And an observation with unshared content "x" and tags []
+        And an observation with unshared content "y" and tags []
+        When the content of observation 0 is replaced with unshared content "z"
+        Then the stored content "x" should be deleted
+        And the stored content "z" should exist
+        When the content of observation 0 is replaced with shared content "z"
+        Then the stored content "z" should have 1 references
+        And the database should store 2 files
+        When observation 1 is deleted
+        Then the stored content "y" should be deleted
+
+    Scenario: Deleting many observations
+        Given an empty database
+        And an observation with shared content "a" and tags ["old"]
+        And an observation with shared content "a" and tags []
+        And an observation with unshared content "x" and tags ["old"]
+        And an observation with unshared content "y" and tags []
+        And an observation with attributes {} and tags ["old"]
+        Then deleting observations without a filter or search should raise ValueError
+        When the observations matching the filter {"tags": "old"} are deleted
+        Then the result should be 3
+        And the database should contain the observations [1, 3]
+        And the stored content "a" should have 1 references
+        And the stored content "x" should be deleted
+        And the stored content "y" should exist
+        When the observations matching the search "not old" are deleted
+        Then the result should be 2
+        And the database should contain the observations []
+        And the database should store 0 files
@@ -0,0 +1,94 @@
+Feature: Search
+
+    Scenario Outline: Parsing
+        Given the search expression <expression>
+        Then the search parse tree should match <tree>
+
+        Examples:
+            | expression                   | tree                                |
+            | 'foo'                        | "'foo'"                             |
+            | '"foo bar"'                  | "'foo bar'"                         |
+            | 'label:foo'                  | "'label:foo'"                       |
+            | 'not foo'                    | "not('foo')"                        |
+            | 'foo and bar or baz'         | "or(and('foo', 'bar'), 'baz')"      |
+            | 'foo and (bar or baz)'       | "and('foo', or('bar', 'baz'))"      |
+            | 'not (foo or bar)'           | "not(or('foo', 'bar'))"             |
+            | 'attributes.score > 0.9'     | ">('attributes.score', 0.9)"        |
+            | 'attributes.n <= 3'          | "<=('attributes.n', 3)"             |
+            | 'a in (cat, "hot dog")'      | "in('a', 'cat', 'hot dog')"         |
+            | 'a between 1 and 2 and foo'  | "and(between('a', 1, 2), 'foo')"    |
+            | 'name startswith IMG_'       | "startswith('name', 'IMG_')"        |
+            | 'a != null'                  | "!=('a', None)"                     |
+            | 'a in (true, false, NULL)'   | "in('a', True, False, None)"        |
+
+    Scenario Outline: Invalid searches
+        Then parsing the search expression <expression> should fail
+
+        Examples:
+            | expression                                    |
+            | 'foo and'                                     |
+            | '(foo'                                        |
+            | 'attributes.t = 2026-13-45'                   |
+            | 'created between 2026-01-01 and 2026-02-30'   |
+            | 'attributes.t in (2026-01-01, 2026-99-01)'    |
+
+    Scenario: Parse tree caching
+        Given the search expression 'foo and not bar'
+        Then parsing the search expression again should return the same parse tree
+
+    Scenario: Substring trigrams
+        Given a document with attribute name 'IMG_0042.png'
+        Then the document trigrams for attributes.name should include the trigrams of 'img_00'
+        And the document trigrams for attributes.name should not include the trigrams of 'jpg'
+
+    Scenario Outline: Compiled search filters
+        Given an empty database
+        And an observation with attributes {"note": "cat"} and tags []
+        And an observation with attributes {} and tags ["cat"]
+        And an observation with attributes {"name": "dog"} and tags ["label:reviewed"]
+        And an observation with attributes {"n": 2} and tags []
+        Then the search filter for <expression> should match <filter>
+
+        Examples:
+            | expression                                 | filter                                                                                                                                                                                                         |
+            | 'cat'                                      | {"$or": [{"$text": {"$search": '"cat"'}}, {"tags": "cat"}]}                                                                                                                                                    |
+            | 'cat and dog'                              | {"$or": [{"$text": {"$search": '"cat" "dog"'}}, {"$and": [{"tags": "cat"}, {"tags": "dog"}]}]}                                                                                                                 |
+            | 'not cat'                                  | {"$nor": [{"$or": [{"tags": "cat"}, {"_id": {"$in": [oids[0]]}}]}]}                                                                                                                                            |
+            | 'not label:reviewed'                       | {"$nor": [{"tags": "label:reviewed"}]}                                                                                                                                                                         |
+            | 'cat or dog'                               | {"$or": [{"$or": [{"tags": "cat"}, {"_id": {"$in": [oids[0]]}}]}, {"$or": [{"tags": "dog"}, {"_id": {"$in": [oids[2]]}}]}]}                                                                                    |
+            | 'cat and attributes.n > 1 and not dog'     | {"$and": [{"$or": [{"$text": {"$search": '"cat"'}}, {"tags": "cat"}]}, {"attributes.n": {"$gt": 1}}, {"$nor": [{"$or": [{"tags": "dog"}, {"_id": {"$in": [oids[2]]}}]}]}]}                                     |
+            | str(oids[3])                               | {"$or": [{"tags": str(oids[3])}, {"_id": oids[3]}]}                                                                                                                                                            |
+            | 'attributes.n = 2 or ' + str(oids[3])      | {"$or": [{"attributes.n": 2}, {"$or": [{"tags": str(oids[3])}, {"_id": oids[3]}]}]}                                                                                                                            |
+
+    Scenario Outline: Search terms match the same objects everywhere
+        Given an empty database
+        And an observation with attributes {"note": "cat"} and tags []
+        And an observation with attributes {} and tags ["cat"]
+        And an observation with attributes {"name": "dog"} and tags ["label:reviewed"]
+        And an observation with attributes {"n": 2} and tags []
+        And an observation with attributes {"original": 1} and tags []
+        Then the search <expression> should match the observations <oids>
+        And the search <expression> or <expression> should match the observations <oids>
+        And the search not (<expression>) should match every other observation
+
+        Examples:
+            | expression         | oids                 |
+            | cat                | [oids[0], oids[1]]   |
+            | dog                | [oids[2]]            |
+            | label:reviewed     | [oids[2]]            |
+            | cat and not dog    | [oids[0], oids[1]]   |
+            | fish               | []                   |
+            | original           | []                   |
+
+    Scenario Outline: Explained search filters
+        Given an empty database
+        And an observation with attributes {"note": "cat"} and tags []
+        And an observation with attributes {"name": "dog"} and tags []
+        Then explaining the search <expression> should report the filters <filters>
+
+        Examples:
+            | expression        | filters                                                                                                                                                                                                                                                                                                                                   |
+            | 'cat'             | [{"$or": [{"$text": {"$search": '"cat"'}}, {"tags": "cat"}]}]                                                                                                                                                                                                                                                                             |
+            | 'not cat'         | [{"$nor": [{"$or": [{"tags": "cat"}, {"_id": {"$in": [oids[0]]}}]}]}, {"$or": [{"tags": "cat"}, {"_id": {"$in": [oids[0]]}}]}]                                                                                                                                                                                                            |
+            | 'cat or dog'      | [{"$or": [{"$or": [{"tags": "cat"}, {"_id": {"$in": [oids[0]]}}]}, {"$or": [{"tags": "dog"}, {"_id": {"$in": [oids[1]]}}]}]}, {"$or": [{"tags": "cat"}, {"_id": {"$in": [oids[0]]}}]}, {"$or": [{"tags": "dog"}, {"_id": {"$in": [oids[1]]}}]}]                                                                                           |
+            | 'cat and not dog' | [{"$and": [{"$or": [{"$text": {"$search": '"cat"'}}, {"tags": "cat"}]}, {"$nor": [{"$or": [{"tags": "dog"}, {"_id": {"$in": [oids[1]]}}]}]}]}, {"$or": [{"$text": {"$search": '"cat"'}}, {"tags": "cat"}]}, {"$nor": [{"$or": [{"tags": "dog"}, {"_id": {"$in": [oids[1]]}}]}]}, {"$or": [{"tags": "dog"}, {"_id": {"$in": [oids[1]]}}]}] |
@@ -0,0 +1,94 @@
+# Copyright 2018, National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS).  Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import io
+import os
+import shutil
+import tempfile
+
+from behave import *
+import bson.objectid
+import gridfs
+import nose.tools
+
+import samlab.cache
+
+
+class _Source(io.BytesIO):
+    """Stands in for :class:`gridfs.grid_file.GridOut`."""
+    def __init__(self, fid, data):
+        io.BytesIO.__init__(self, data)
+        self._id = fid
+        self.chunk_size = 32
+        self.length = len(data)
+
+
+class _FailingSource(_Source):
+    def read(self, size=-1):
+        if self.tell():
+            raise RuntimeError("Simulated read failure.")
+        return _Source.read(self, size)
+
+
+class _GridFS(gridfs.GridFS):
+    """Stands in for :class:`gridfs.GridFS`, without a database."""
+    def __init__(self):
+        self.files = {}
+
+    def get(self, fid):
+        return _Source(fid, self.files[fid])
+
+
+def _cleanup(directory):
+    samlab.cache.configure(None)
+    shutil.rmtree(directory)
+
+
+@given(u'a content cache with a budget of {max_bytes} bytes')
+def step_impl(context, max_bytes):
+    context.directory = tempfile.mkdtemp()
+    context.add_cleanup(_cleanup, context.directory)
+    samlab.cache.configure(context.directory, eval(max_bytes))
+    context.fs = _GridFS()
+    context.fids = []
+    context.clock = 1000000
+
+
+@given(u'{count} GridFS files of {length} bytes each')
+def step_impl(context, count, length):
+    for index in range(eval(count)):
+        fid = bson.objectid.ObjectId()
+        context.fs.files[fid] = os.urandom(eval(length))
+        context.fids.append(fid)
+
+
+@when(u'the files {indices} are read through the cache')
+def step_impl(context, indices):
+    for index in eval(indices):
+        fid = context.fids[index]
+        with samlab.cache.get(context.fs, fid) as data:
+            nose.tools.assert_equal(data.read(), context.fs.files[fid])
+        # Use explicit modification times, so the order of use doesn't depend on timestamp resolution.
+        path = samlab.cache._path(context.directory, fid)
+        if os.path.exists(path):
+            os.utime(path, (context.clock, context.clock))
+            context.clock += 1
+
+
+@when(u'storing a file fails partway through')
+def step_impl(context):
+    fid = bson.objectid.ObjectId()
+    with nose.tools.assert_raises(RuntimeError):
+        samlab.cache._store(_FailingSource(fid, os.urandom(100)), samlab.cache._path(context.directory, fid))
+
+
+@then(u'the cache should contain the files {indices}')
+def step_impl(context, indices):
+    cached = [index for index, fid in enumerate(context.fids) if os.path.exists(samlab.cache._path(context.directory, fid))]
+    nose.tools.assert_equal(cached, eval(indices))
+
+
+@then(u'the cache directory should be empty')
+def step_impl(context):
+    nose.tools.assert_equal([files for root, dirs, files in os.walk(context.directory) if files], [])
@@ -0,0 +1,136 @@
+# Copyright 2018, National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS).  Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import io
+
+from behave import *
+import nose.tools
+import numpy
+import numpy.testing
+
+import samlab.deserialize
+import samlab.serialize
+import samlab.web.app.handlers.object
+
+
+@given(u'content with length {}')
+def step_impl(context, length):
+    context.length = eval(length)
+
+
+@when(u'the range header {} is parsed')
+def step_impl(context, header):
+    context.ranges = samlab.web.app.handlers.object._content_ranges(eval(header), context.length)
+
+
+@then(u'the content ranges should match {}')
+def step_impl(context, ranges):
+    nose.tools.assert_equal(context.ranges, eval(ranges))
+
+
+@given(u'a maximum derived content size {}')
+def step_impl(context, maximum):
+    context.maximum = eval(maximum)
+
+
+@then(u'the requested size {size} should be snapped to {snapped}')
+def step_impl(context, size, snapped):
+    nose.tools.assert_equal(samlab.web.app.handlers.object._snap_size(eval(size), context.maximum), eval(snapped))
+
+
+@given(u'the stored array {}')
+def step_impl(context, array):
+    context.stream = io.BytesIO()
+    numpy.save(context.stream, eval(array))
+
+
+@when(u'the stored array is read with index {}')
+def step_impl(context, index):
+    context.stream.seek(0)
+    context.array = samlab.deserialize._read_npy(context.stream, eval(index))
+
+
+@then(u'the array read should match {}')
+def step_impl(context, result):
+    result = eval(result)
+    nose.tools.assert_equal(context.array.shape, result.shape)
+    numpy.testing.assert_array_equal(context.array, result)
+
+
+@then(u'reading the stored array with index {index} should raise {exception}')
+def step_impl(context, index, exception):
+    context.stream.seek(0)
+    with nose.tools.assert_raises(eval(exception)):
+        samlab.deserialize._read_npy(context.stream, eval(index))
+
+
+@given(u'the array {}')
+def step_impl(context, array):
+    context.array = eval(array)
+
+
+@when(u'the array is downsampled to {} points')
+def step_impl(context, points):
+    context.array = samlab.web.app.handlers.object._downsample(context.array, eval(points))
+
+
+@then(u'the downsampled array should match {}')
+def step_impl(context, result):
+    result = eval(result)
+    nose.tools.assert_equal(context.array.shape, result.shape)
+    numpy.testing.assert_array_equal(context.array, result)
+
+
+class _Source(io.BytesIO):
+    """Stands in for :class:`gridfs.grid_file.GridOut`, with a small chunk size so content is decoded in pieces."""
+    def __init__(self, data):
+        io.BytesIO.__init__(self, data)
+        self._id = None
+        self.chunk_size = 256
+
+
+def _decoded(context, length=True):
+    return samlab.deserialize._DecodedContent(_Source(context.content["data"]), context.content["content-encoding"], context.content["decoded-length"] if length else None)
+
+
+@given(u'the compressed array {array} using {codec}')
+def step_impl(context, array, codec):
+    context.original = samlab.serialize.array(eval(array))["data"]
+    context.content = samlab.serialize.compressed(samlab.serialize.array(eval(array)), codec)
+    nose.tools.assert_equal(context.content["decoded-length"], len(context.original))
+
+
+@then(u'the decoded content should match the original data')
+def step_impl(context):
+    stream = _decoded(context)
+    nose.tools.assert_equal(stream.length, len(context.original))
+    nose.tools.assert_equal(stream.read(), context.original)
+
+
+@then(u'the decoded content should match the original data without its decoded length')
+def step_impl(context):
+    stream = _decoded(context, length=False)
+    nose.tools.assert_equal(stream.length, len(context.original))
+    nose.tools.assert_equal(stream.tell(), 0)
+    nose.tools.assert_equal(stream.read(), context.original)
+
+
+@then(u'the decoded array should match {}')
+def step_impl(context, result):
+    numpy.testing.assert_array_equal(numpy.load(_decoded(context)), eval(result))
+
+
+@then(u'the decoded array with index {index} should match {result}')
+def step_impl(context, index, result):
+    numpy.testing.assert_array_equal(samlab.deserialize._read_npy(_decoded(context), eval(index)), eval(result))
+
+
+@then(u'the decoded content from offset {begin} to {end} should match the original data')
+def step_impl(context, begin, end):
+    begin, end = eval(begin), eval(end)
+    stream = _decoded(context)
+    # Start from the end, so the decoder has to be restarted.
+    stream.seek(0, io.SEEK_END)
+    stream.seek(begin)
+    nose.tools.assert_equal(stream.read(end - begin), context.original[begin:end])
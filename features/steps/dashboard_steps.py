@@ -0,0 +1,81 @@
+# Copyright 2018, National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS).  Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import json
+
+from behave import *
+import nose.tools
+import numpy
+
+import samlab.observation
+import samlab.serialize
+import samlab.web.app
+import samlab.web.app.acl
+import samlab.web.app.credentials
+import samlab.web.app.handlers.object
+import samlab.web.app.handlers.view
+
+
+@given(u'a dashboard client')
+def step_impl(context):
+    application = samlab.web.app.application
+    application.config["acl"] = samlab.web.app.acl.permit_all()
+    application.config["check-credentials"] = samlab.web.app.credentials.pass_empty()
+    application.config["session-timeout"] = 3600
+
+    # The request handlers are imported before the dashboard is configured,
+    # so point them at the test database explicitly.
+    for module in [samlab.web.app.handlers.object, samlab.web.app.handlers.view]:
+        module.database, module.fs = context.database, context.fs
+    samlab.web.app.handlers.object.get_tag_counts.cache_clear()
+
+    context.client = application.test_client()
+
+
+@given(u'an observation with content {content}')
+def step_impl(context, content):
+    context.oids.append(samlab.observation.create(context.database, context.fs, content=eval(content)))
+
+
+@given(u'the content metadata of observation {index:d} has been removed')
+def step_impl(context, index):
+    keys = context.database.observations.find_one({"_id": context.oids[index]})["content"].keys()
+    context.database.observations.update_one({"_id": context.oids[index]}, {"$unset": {"content.%s.metadata" % key: True for key in keys}})
+
+
+@when(u'the client requests {path}')
+def step_impl(context, path):
+    context.response = context.client.get(path.format(oids=context.oids))
+
+
+@when(u'an observation with tags {tags} is created without the dashboard')
+def step_impl(context, tags):
+    context.oids.append(samlab.observation.create(context.database, context.fs, tags=eval(tags)))
+
+
+@when(u'the client sends {method} {path} with the JSON {document}')
+def step_impl(context, method, path, document):
+    context.response = context.client.open(path.format(oids=context.oids), method=method, data=json.dumps(eval(document)), content_type="application/json")
+
+
+@when(u'the client sends {method} {path} without a body')
+def step_impl(context, method, path):
+    context.response = context.client.open(path, method=method)
+
+
+@when(u'the client sends {method} {path} with {body}')
+def step_impl(context, method, path, body):
+    context.response = context.client.open(path, method=method, data=body, content_type="application/json")
+
+
+@then(u'the response status should be {status:d}')
+def step_impl(context, status):
+    nose.tools.assert_equal(context.response.status_code, status)
+
+
+@then(u'the response should contain {fields}')
+def step_impl(context, fields):
+    response = json.loads(context.response.get_data(as_text=True))
+    for key, value in eval(fields).items():
+        nose.tools.assert_equal(response[key], value)
@@ -0,0 +1,21 @@
+# Copyright 2018, National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS).  Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+from behave import *
+import pymongo
+
+import samlab.database
+import samlab.observation
+
+
+@given(u'an empty database')
+def step_impl(context):
+    pymongo.MongoClient(context.database_server.uri).drop_database("samlab-testing")
+    context.database, context.fs = samlab.database.connect(name="samlab-testing", uri=context.database_server.uri, replicaset=context.database_server.replicaset)
+    context.oids = []
+
+
+@given(u'an observation with attributes {attributes} and tags {tags}')
+def step_impl(context, attributes, tags):
+    context.oids.append(samlab.observation.create(context.database, context.fs, attributes=eval(attributes), tags=eval(tags)))
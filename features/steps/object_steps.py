@@ -0,0 +1,60 @@
+# Copyright 2018, National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS).  Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+from behave import *
+import bson
+import nose.tools
+
+import samlab.object
+
+
+def _oids(context, indices):
+    # None stands for an id that isn't in the database.
+    if not hasattr(context, "missing"):
+        context.missing = bson.objectid.ObjectId()
+    return [context.missing if index is None else context.oids[index] for index in eval(indices)]
+
+
+def _indices(context, objects):
+    return [None if obj is None else context.oids.index(obj["_id"]) for obj in objects]
+
+
+@when(u'the observations {indices} are loaded')
+def step_impl(context, indices):
+    context.loaded = samlab.object.load(context.database, "observations", oids=_oids(context, indices))
+
+
+@when(u'the observations {indices} are iterated in batches of {batch_size:d}')
+def step_impl(context, indices, batch_size):
+    context.loaded = list(samlab.object.iterate(context.database, "observations", oids=_oids(context, indices), batch_size=batch_size))
+
+
+@when(u'the observations {indices} are iterated in batches of {batch_size:d} with limit {limit:d}')
+def step_impl(context, indices, batch_size, limit):
+    context.loaded = list(samlab.object.iterate(context.database, "observations", oids=_oids(context, indices), batch_size=batch_size, limit=limit))
+
+
+@then(u'the loaded observations should be {indices}')
+def step_impl(context, indices):
+    nose.tools.assert_equal(_indices(context, context.loaded), eval(indices))
+
+
+@when(u'the {field} of observations {indices} are set to {values}')
+def step_impl(context, field, indices, values):
+    context.exception = None
+    try:
+        context.result = samlab.object.set_many(context.database, "observations", field, zip(_oids(context, indices), eval(values)))
+    except KeyError as e:
+        context.exception = e
+
+
+@then(u'setting them should fail for the observations {indices}')
+def step_impl(context, indices):
+    nose.tools.assert_is_instance(context.exception, KeyError)
+    nose.tools.assert_equal(context.exception.args[0], _oids(context, indices))
+
+
+@then(u'the {field} field of each observation should be {values}')
+def step_impl(context, field, values):
+    nose.tools.assert_equal([context.database.observations.find_one({"_id": oid}).get(field) for oid in context.oids], eval(values))
@@ -0,0 +1,263 @@
+# Copyright 2018, National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS).  Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import functools
+import operator
+import os
+import shutil
+import tempfile
+
+from behave import *
+import nose.tools
+import numpy
+
+import samlab.deserialize
+import samlab.observation
+import samlab.serialize
+
+
+@when(u'the tag "{tag}" is set to {state} for observations matching {filter} using {processes} processes')
+def step_impl(context, tag, state, filter, processes):
+    context.result = samlab.observation.set_tag(context.database, tag, eval(state), filter=eval(filter), processes=eval(processes), chunk_size=2)
+
+
+@when(u'the observations are updated using {updater} and {processes} processes')
+def step_impl(context, updater, processes):
+    context.result = samlab.observation.update(context.database, context.fs, eval(updater), processes=eval(processes), chunk_size=2)
+
+
+@then(u'the result should be {result}')
+def step_impl(context, result):
+    nose.tools.assert_equal(context.result, eval(result))
+
+
+@then(u'the observations tagged "{tag}" should be {indices}')
+def step_impl(context, tag, indices):
+    tagged = [observation["_id"] for observation in context.database.observations.find({"tags": tag}, projection={"_id": True})]
+    nose.tools.assert_equal(sorted(tagged), sorted([context.oids[index] for index in eval(indices)]))
+
+
+@then(u'the observation attributes should be {attributes}')
+def step_impl(context, attributes):
+    nose.tools.assert_equal([context.database.observations.find_one({"_id": oid})["attributes"] for oid in context.oids], eval(attributes))
+
+
+@then(u'the observation tags should be {tags}')
+def step_impl(context, tags):
+    nose.tools.assert_equal([context.database.observations.find_one({"_id": oid})["tags"] for oid in context.oids], eval(tags))
+
+
+@given(u'a directory containing a 64x32 image a.png, identical arrays b.npy and c.npy, a corrupt image d.jpg, and a text file e.txt')
+def step_impl(context):
+    import PIL.Image
+
+    context.directory = tempfile.mkdtemp()
+    context.add_cleanup(shutil.rmtree, context.directory)
+    PIL.Image.new("RGB", (64, 32)).save(os.path.join(context.directory, "a.png"))
+    numpy.save(os.path.join(context.directory, "b.npy"), numpy.arange(10))
+    numpy.save(os.path.join(context.directory, "c.npy"), numpy.arange(10))
+    with open(os.path.join(context.directory, "d.jpg"), "wb") as stream:
+        stream.write(b"not an image")
+    with open(os.path.join(context.directory, "e.txt"), "w") as stream:
+        stream.write("not ingested")
+    context.checkpoint = os.path.join(context.directory, "checkpoint")
+
+
+@when(u'the directory is ingested with size {size} using {processes} processes')
+def step_impl(context, size, processes):
+    context.result = samlab.observation.ingest(context.database, context.fs, context.directory, size=eval(size), processes=eval(processes), checkpoint=context.checkpoint, deduplicate=True)
+
+
+def _ingested(context):
+    return {os.path.basename(observation["content"]["original"]["filename"]): observation for observation in context.database.observations.find()}
+
+
+@then(u'the ingested observations should have the files {names}')
+def step_impl(context, names):
+    nose.tools.assert_equal(sorted(_ingested(context)), eval(names))
+
+
+@then(u'the ingested image {name} should have size {size}')
+def step_impl(context, name, size):
+    nose.tools.assert_equal(_ingested(context)[name]["content"]["original"]["metadata"]["size"], eval(size))
+
+
+@then(u'the ingested files {first} and {second} should share stored content with {references} references')
+def step_impl(context, first, second, references):
+    observations = _ingested(context)
+    fid = observations[first]["content"]["original"]["data"]
+    nose.tools.assert_equal(observations[second]["content"]["original"]["data"], fid)
+    nose.tools.assert_equal(context.database.fs.files.find_one({"_id": fid})["references"], eval(references))
+
+
+@then(u'the checkpoint should list the files {names}')
+def step_impl(context, names):
+    with open(context.checkpoint, "r") as stream:
+        nose.tools.assert_equal(sorted([os.path.basename(line.strip()) for line in stream]), eval(names))
+
+
+@given(u'an observation with a {width:d}x{height:d} image')
+def step_impl(context, width, height):
+    import PIL.Image
+
+    context.oids.append(samlab.observation.create(context.database, context.fs, content={"original": samlab.serialize.image(PIL.Image.new("RGB", (width, height)))}))
+
+
+@given(u'an observation with a corrupt image')
+def step_impl(context):
+    context.oids.append(samlab.observation.create(context.database, context.fs, content={"original": {"data": b"not an image", "content-type": "image/jpeg"}}))
+
+
+def _resized(context):
+    observations = [context.database.observations.find_one({"_id": oid}) for oid in context.oids]
+    return [observation["content"].get("small") for observation in observations]
+
+
+@when(u'the images are resized to {size} using {processes} processes')
+def step_impl(context, size, processes):
+    context.result = samlab.observation.resize_images(context.database, eval(size), "small", processes=eval(processes))
+
+
+@when(u'the images are resized to {size} using {processes} processes, overwriting existing images')
+def step_impl(context, size, processes):
+    context.replaced = [content["data"] for content in _resized(context) if content is not None]
+    context.result = samlab.observation.resize_images(context.database, eval(size), "small", overwrite=True, processes=eval(processes))
+
+
+@then(u'the resized images should have sizes {sizes}')
+def step_impl(context, sizes):
+    nose.tools.assert_equal([content["metadata"]["size"] if content is not None else None for content in _resized(context)], eval(sizes))
+
+
+@then(u'the replaced images should have been deleted')
+def step_impl(context):
+    for fid in context.replaced:
+        nose.tools.assert_false(context.fs.exists(fid))
+
+
+@when(u'a batch of observations is started with batch size {batch_size}')
+def step_impl(context, batch_size):
+    context.batch = samlab.observation.create_many(context.database, context.fs, batch_size=eval(batch_size))
+    context.batch.__enter__()
+    context.oids = []
+
+
+@when(u'{count:d} observations with content are added to the batch')
+def step_impl(context, count):
+    for index in range(count):
+        context.oids.append(context.batch.create(attributes={"index": index}, content={"original": samlab.serialize.string("observation %s" % index)}))
+
+
+@when(u'another observation is inserted directly with the id of observation {index:d}')
+def step_impl(context, index):
+    context.database.observations.insert_one({"_id": context.oids[index]})
+
+
+@when(u'the batch is finished')
+def step_impl(context):
+    try:
+        context.batch.__exit__(None, None, None)
+        context.error = None
+    except Exception as e:
+        context.error = e
+
+
+@then(u'finishing the batch should succeed')
+def step_impl(context):
+    nose.tools.assert_is_none(context.error)
+
+
+@then(u'finishing the batch should fail with {exception}')
+def step_impl(context, exception):
+    nose.tools.assert_is_instance(context.error, eval(exception))
+
+
+@then(u'the batch failures should be {indices}')
+def step_impl(context, indices):
+    nose.tools.assert_equal([oid for oid, e in context.batch.failures], [context.oids[index] for index in eval(indices)])
+
+
+@then(u'the database should contain the observations {indices}')
+def step_impl(context, indices):
+    oids = [observation["_id"] for observation in context.database.observations.find(projection={"_id": True})]
+    nose.tools.assert_equal(sorted(oids), sorted([context.oids[index] for index in eval(indices)]))
+
+
+@then(u'the observation content should be readable for observations {indices}')
+def step_impl(context, indices):
+    for index in eval(indices):
+        observation = context.database.observations.find_one({"_id": context.oids[index]})
+        nose.tools.assert_equal(samlab.deserialize.stream(context.fs, observation["content"]["original"]).read(), ("observation %s" % index).encode("utf8"))
+
+
+@then(u'the database should store {count:d} files')
+def step_impl(context, count):
+    nose.tools.assert_equal(context.database.fs.files.count_documents({}), count)
+
+
+def _content(name, kind):
+    content = samlab.serialize.string(name)
+    return samlab.serialize.content_addressed(content) if kind == "shared" else content
+
+
+def _remember_content(context, oid):
+    # Remember stored content by its value, so scenarios can refer to it by name.
+    if not hasattr(context, "fids"):
+        context.fids = {}
+    for content in context.database.observations.find_one({"_id": oid})["content"].values():
+        context.fids[samlab.deserialize.stream(context.fs, content).read().decode("utf8")] = content["data"]
+
+
+@given(u'an observation with {kind} content "{name}" and tags {tags}')
+def step_impl(context, kind, name, tags):
+    context.oids.append(samlab.observation.create(context.database, context.fs, content={"original": _content(name, kind)}, tags=eval(tags)))
+    _remember_content(context, context.oids[-1])
+
+
+@when(u'the content of observation {index:d} is replaced with {kind} content "{name}"')
+def step_impl(context, index, kind, name):
+    value = _content(name, kind)
+    samlab.observation.update(context.database, context.fs, lambda observation: dict(observation, content={"original": value}), filter={"_id": context.oids[index]})
+    _remember_content(context, context.oids[index])
+
+
+@when(u'the content of observation {index:d} is removed')
+def step_impl(context, index):
+    samlab.observation.update(context.database, context.fs, lambda observation: dict(observation, content={}), filter={"_id": context.oids[index]})
+
+
+@when(u'observation {index:d} is deleted')
+def step_impl(context, index):
+    samlab.observation.delete(context.database, context.fs, context.oids[index])
+
+
+@then(u'the stored content "{name}" should have {references:d} references')
+def step_impl(context, name, references):
+    nose.tools.assert_equal(context.database.fs.files.find_one({"_id": context.fids[name]})["references"], references)
+
+
+@then(u'the stored content "{name}" should exist')
+def step_impl(context, name):
+    nose.tools.assert_true(context.fs.exists(context.fids[name]))
+
+
+@then(u'the stored content "{name}" should be deleted')
+def step_impl(context, name):
+    nose.tools.assert_false(context.fs.exists(context.fids[name]))
+
+
+@then(u'deleting observations without a filter or search should raise {exception}')
+def step_impl(context, exception):
+    with nose.tools.assert_raises(eval(exception)):
+        samlab.observation.delete_many(context.database, context.fs)
+
+
+@when(u'the observations matching the filter {filter} are deleted')
+def step_impl(context, filter):
+    context.result = samlab.observation.delete_many(context.database, context.fs, filter=eval(filter), chunk_size=2)
+
+
+@when(u'the observations matching the search "{search}" are deleted')
+def step_impl(context, search):
+    context.result = samlab.observation.delete_many(context.database, context.fs, search=search, chunk_size=2)
@@ -0,0 +1,77 @@
+# Copyright 2018, National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS).  Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+from behave import *
+import nose.tools
+import pyparsing
+
+import samlab.ngram
+import samlab.object
+import samlab.search
+
+
+@given(u'the search expression {}')
+def step_impl(context, expression):
+    context.expression = eval(expression)
+    context.tree = samlab.search.parser().parse(context.expression)
+
+
+@then(u'the search parse tree should match {}')
+def step_impl(context, tree):
+    nose.tools.assert_equal(repr(context.tree), eval(tree))
+
+
+@then(u'parsing the search expression {} should fail')
+def step_impl(context, expression):
+    with nose.tools.assert_raises(pyparsing.ParseException):
+        samlab.search.parser().parse(eval(expression))
+
+
+@then(u'parsing the search expression again should return the same parse tree')
+def step_impl(context):
+    nose.tools.assert_is(samlab.search.parser().parse(context.expression), context.tree)
+
+
+@given(u'a document with attribute name {}')
+def step_impl(context, name):
+    context.document = {"attributes": {"name": eval(name)}}
+
+
+@then(u'the document trigrams for {field} should include the trigrams of {term}')
+def step_impl(context, field, term):
+    ngrams = samlab.ngram.ngrams(context.document, [field])
+    nose.tools.assert_true(samlab.ngram.trigrams(eval(term)).issubset(ngrams))
+
+
+@then(u'the document trigrams for {field} should not include the trigrams of {term}')
+def step_impl(context, field, term):
+    ngrams = samlab.ngram.ngrams(context.document, [field])
+    nose.tools.assert_false(samlab.ngram.trigrams(eval(term)).issubset(ngrams))
+
+
+@then(u'the search filter for {expression} should match {filter}')
+def step_impl(context, expression, filter):
+    names = {"oids": context.oids}
+    nose.tools.assert_equal(samlab.object.search_filter(context.database, "observations", eval(expression, names)), eval(filter, names))
+
+
+@then(u'the search {expression} should match the observations {oids}')
+def step_impl(context, expression, oids):
+    nose.tools.assert_equal(sorted(samlab.object.search(context.database, "observations", expression)), sorted(eval(oids, {"oids": context.oids})))
+
+
+@then(u'the search not ({expression}) should match every other observation')
+def step_impl(context, expression):
+    matches = set(samlab.object.search(context.database, "observations", expression))
+    nose.tools.assert_equal(sorted(samlab.object.search(context.database, "observations", "not (%s)" % expression)), sorted(set(context.oids) - matches))
+
+
+@then(u'explaining the search {expression} should report the filters {filters}')
+def step_impl(context, expression, filters):
+    def walk(node):
+        yield node["filter"]
+        for child in node["children"]:
+            yield from walk(child)
+    explanation = samlab.object.explain_search(context.database, "observations", eval(expression))
+    nose.tools.assert_equal(list(walk(explanation)), eval(filters, {"oids": context.oids}))
@@ -0,0 +1,22 @@
+# Copyright 2018, National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS).  Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+from behave import *
+import bson.objectid
+import nose.tools
+
+
+@given(u'the observation ids {}')
+def step_impl(context, oids):
+    context.oids = eval(oids)
+
+
+@then(u'the packed observation ids should match the originals')
+def step_impl(context):
+    # Imported here, so the other step definitions load without torch.
+    import samlab.torch
+
+    packed = samlab.torch._pack_oids(context.oids)
+    nose.tools.assert_equal(len(packed), len(context.oids))
+    nose.tools.assert_equal([samlab.torch._unpack_oid(packed, index) for index in range(len(packed))], context.oids)
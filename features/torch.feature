@@ -0,0 +1,13 @@
+@torch
+Feature: Torch integration
+
+    Scenario Outline: Dataset observation ids
+        Given the observation ids <oids>
+        Then the packed observation ids should match the originals
+
+        Examples:
+            | oids                                                                                                 |
+            | []                                                                                                   |
+            | [bson.objectid.ObjectId("5b3e1c2a9d1e8a0012345678")]                                                 |
+            | [bson.objectid.ObjectId("5b3e1c2a9d1e8a0012345600")]                                                 |
+            | [bson.objectid.ObjectId("5b3e1c2a9d1e8a0000000000"), bson.objectid.ObjectId("000000000000000000000000")] |
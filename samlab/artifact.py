@@ -13,6 +13,7 @@ import bson.objectid
 import gridfs
 import pymongo
 
+import samlab.ngram
 import samlab.object
 
 log = logging.getLogger(__name__)
@@ -57,7 +58,7 @@ def create(database, fs, experiment, name, attributes=None, content=None, tags=N
     if content is None:
         content = {}
     assert(isinstance(content, dict))
-    content = {key: {"data": fs.put(value["data"]), "content-type": value["content-type"], "filename": value.get("filename", None)} for key, value in content.items()}
+    content = {key: samlab.object.put_content(database, fs, value) for key, value in content.items()}
 
     if tags is None:
         tags = []
@@ -74,6 +75,8 @@ def create(database, fs, experiment, name, attributes=None, content=None, tags=N
         "experiment": eid,
     }
 
+    samlab.ngram.add(database, "artifacts", document)
+
     document["_id"] = database.artifacts.insert_one(document).inserted_id
 
     return document
@@ -95,14 +98,20 @@ def delete(database, fs, artifact):
     assert(isinstance(fs, gridfs.GridFS))
     aid = samlab.object.require_objectid(artifact)
 
-    # Delete favorites pointing to this artifact.
-    database.favorites.delete_many({"otype": "artifacts", "oid": str(aid)})
-    # Delete content owned by this artifact.
-    for artifact in database.artifacts.find({"_id": aid}):
-        for key, value in artifact["content"].items():
-            fs.delete(value["data"])
-    # Delete the artifact.
-    database.artifacts.delete_many({"_id": aid})
+    samlab.object.delete_many(database, fs, "artifacts", filter={"_id": aid})
+
+
+def delete_many(database, fs, filter=None, search=None, chunk_size=1000):
+    """Delete every artifact that matches a filter and/or search expression.
+
+    See :func:`samlab.object.delete_many` for details.
+
+    Returns
+    -------
+    count: int
+        Number of artifacts deleted.
+    """
+    return samlab.object.delete_many(database, fs, "artifacts", filter=filter, search=search, chunk_size=chunk_size)
 
 
 def set_attributes(database, fs, artifact, attributes):
@@ -0,0 +1,171 @@
+# Copyright 2018, National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS).  Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+"""Local on-disk cache for content stored in GridFS.
+
+Stored content is never modified in-place, so a GridFS file id always refers
+to the same bytes, and copies can be cached on local disk indefinitely.  Once
+enabled with :func:`configure`, :mod:`samlab.deserialize`, :mod:`samlab.derived`,
+and the dashboard read content through the cache, so repeated reads (such as
+training epochs or repeated dashboard views) don't go back to the database.
+
+Cache files are written atomically, so one cache directory can safely be
+shared by multiple processes on the same machine.  When the total size of the
+cache exceeds its byte budget, the least-recently-used files are removed.
+"""
+
+import io
+import logging
+import os
+import tempfile
+import threading
+
+import gridfs
+
+log = logging.getLogger(__name__)
+
+_directory = None
+_max_bytes = 0
+_size = None
+_size_lock = threading.Lock()
+
+
+class _CachedContent(io.BufferedReader):
+    """Cached file, with the same attributes as :class:`gridfs.grid_file.GridOut` used by samlab."""
+    def __init__(self, path, fid, chunk_size):
+        io.BufferedReader.__init__(self, io.FileIO(path, "rb"))
+        self._id = fid
+        self.chunk_size = chunk_size
+        self.length = os.fstat(self.fileno()).st_size
+        self.md5 = None
+
+
+def configure(directory, max_bytes=10 * 1024 * 1024 * 1024):
+    """Enable or disable the content cache for this process.
+
+    Parameters
+    ----------
+    directory: str or `None`, required
+        Cache directory, which will be created if it doesn't exist.  Use `None` to disable caching.
+    max_bytes: int, optional
+        Maximum total size of cached content.
+    """
+    global _directory, _max_bytes, _size
+    assert(directory is None or isinstance(directory, str))
+    assert(isinstance(max_bytes, int) and max_bytes > 0)
+
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+    with _size_lock:
+        _directory = directory
+        _max_bytes = max_bytes
+        _size = None
+    log.info("Content cache %s.", "using %s with budget %s bytes" % (directory, max_bytes) if directory else "disabled")
+
+
+def _path(directory, fid):
+    fid = str(fid)
+    return os.path.join(directory, fid[-2:], fid)
+
+
+def _entries():
+    for root, dirs, files in os.walk(_directory):
+        for name in files:
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield stat.st_mtime, stat.st_size, path
+
+
+def _evict():
+    # Called with the size lock held.  Other processes may be writing to the
+    # same directory, so always start from the actual contents of the cache.
+    global _size
+    entries = sorted(_entries())
+    size = sum([entry[1] for entry in entries])
+    budget = int(_max_bytes * 0.9)
+    for mtime, length, path in entries:
+        if size <= budget:
+            break
+        try:
+            os.remove(path)
+            size -= length
+        except FileNotFoundError:
+            pass
+    _size = size
+
+
+def _store(data, path):
+    global _size
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=".", delete=False) as stream:
+        try:
+            while True:
+                chunk = data.read(data.chunk_size)
+                if not chunk:
+                    break
+                stream.write(chunk)
+        except Exception:
+            os.remove(stream.name)
+            raise
+    os.replace(stream.name, path)
+
+    with _size_lock:
+        if _size is None:
+            _evict()
+        else:
+            _size += data.length
+            if _size > _max_bytes:
+                _evict()
+
+
+def get(fs, fid):
+    """Return the contents of a GridFS file, using the cache if it is enabled.
+
+    Parameters
+    ----------
+    fs: :class:`gridfs.GridFS`, required
+    fid: :class:`bson.objectid.ObjectId`, required
+        GridFS file id.
+
+    Returns
+    -------
+    data: file-like object
+        Provides `length` (size in bytes) and `chunk_size` attributes, like
+        :class:`gridfs.grid_file.GridOut`.  Files larger than a tenth of the
+        cache budget are always read directly from GridFS.
+    """
+    assert(isinstance(fs, gridfs.GridFS))
+
+    directory = _directory
+    if directory is None:
+        return fs.get(fid)
+
+    path = _path(directory, fid)
+    try:
+        cached = _CachedContent(path, fid, gridfs.DEFAULT_CHUNK_SIZE)
+    except FileNotFoundError:
+        cached = None
+    if cached is not None:
+        # The modification time records when a file was last used.
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return cached
+
+    data = fs.get(fid)
+    if data.length > _max_bytes // 10:
+        return data
+
+    try:
+        _store(data, path)
+        return _CachedContent(path, fid, data.chunk_size)
+    except OSError as e:
+        log.warning("Couldn't cache GridFS file %s: %s", fid, e)
+        return fs.get(fid)
@@ -209,12 +209,17 @@ def connect(name="samlab", uri="mongodb://localhost:27017", replicaset="samlab")
 
     # Create database indexes
     database.layouts.create_index("lid")
+    database.derived.create_index([("source", pymongo.ASCENDING), ("kind", pymongo.ASCENDING), ("colormap", pymongo.ASCENDING), ("size", pymongo.ASCENDING)], unique=True)
     database.artifacts.create_index([("$**", pymongo.TEXT)])
     database.artifacts.create_index("tags")
     database.experiments.create_index([("$**", pymongo.TEXT)])
     database.experiments.create_index("tags")
+    database.fs.files.create_index("sha256", unique=True, sparse=True)
     database.observations.create_index([("$**", pymongo.TEXT)])
     database.observations.create_index("tags")
+    database.views.create_index([("otype", pymongo.ASCENDING), ("name", pymongo.ASCENDING)], unique=True)
+    database.view_members.create_index([("view", pymongo.ASCENDING), ("oid", pymongo.ASCENDING)], unique=True)
+    database.search_fields.create_index([("otype", pymongo.ASCENDING), ("field", pymongo.ASCENDING)], unique=True)
     database.timeseries.create_index([("$**", pymongo.TEXT)])
     database.timeseries.create_index("key")
 
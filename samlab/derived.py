@@ -0,0 +1,238 @@
+# Copyright 2018, National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS).  Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+"""Caches content derived from stored content, such as colormapped arrays and image thumbnails.
+
+Derived content is generated on demand the first time it is requested and
+stored in GridFS, tracked by the `derived` collection and keyed by the id of
+the source file, the kind of derived content, the colormap, and the target
+size.  Because stored content is never modified in-place, cached entries never
+need to be invalidated; use :func:`prune` to reclaim space used by entries
+whose source content has been deleted.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import io
+import logging
+import math
+
+import arrow
+import gridfs
+import pymongo
+
+import samlab.cache
+import samlab.deserialize
+
+log = logging.getLogger(__name__)
+
+
+def lookup_colormap(name):
+    """Lookup a toyplot colormap by name.
+
+    Parameters
+    ----------
+    name: str, required
+        Colormap name, in the form "factory/name", where factory is one of
+        "brewer", "linear", or "diverging".
+
+    Returns
+    -------
+    colormap: :class:`toyplot.color.Map`
+
+    Raises
+    ------
+    ValueError, if the colormap doesn't exist.
+    """
+    import toyplot.color
+
+    factory, _, name = name.partition("/")
+    if factory == "brewer":
+        factory = toyplot.color.brewer
+    elif factory == "linear":
+        factory = toyplot.color.linear
+    elif factory == "diverging":
+        factory = toyplot.color.diverging
+    else:
+        raise ValueError("Unknown colormap factory: %s" % factory)
+
+    try:
+        return factory.map(name)
+    except Exception:
+        raise ValueError("Unknown colormap: %s" % name)
+
+
+def _lookup(database, fs, key, generate):
+    derived = database.derived.find_one(key)
+    if derived is not None:
+        try:
+            return samlab.cache.get(fs, derived["data"])
+        except gridfs.errors.NoFile:
+            database.derived.delete_one({"_id": derived["_id"]})
+
+    data = generate()
+    fid = fs.put(data)
+    try:
+        database.derived.insert_one(dict(key, data=fid, created=arrow.utcnow().datetime))
+    except pymongo.errors.DuplicateKeyError:
+        # Someone else generated the same content concurrently, so use theirs.
+        fs.delete(fid)
+        return samlab.cache.get(fs, database.derived.find_one(key)["data"])
+    return samlab.cache.get(fs, fid)
+
+
+def array_image(database, fs, content, colormap="linear/Blackbody", size=None):
+    """Return a colormapped PNG image of a Numpy array stored in the database.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    fs: :class:`gridfs.GridFS`, required
+    content: dict, required
+        Content object containing an array, stored as part of an :ref:`observation <observations>` or :ref:`artifact <artifacts>`.
+    colormap: str, optional
+        Colormap name, see :func:`lookup_colormap`.
+    size: int, optional
+        If specified, arrays with more than `size` elements along any axis are
+        downsampled so that no axis is larger than `size`.
+
+    Returns
+    -------
+    data: :class:`gridfs.grid_file.GridOut`
+        Cached PNG image.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(isinstance(fs, gridfs.GridFS))
+    assert(isinstance(content, dict))
+    assert(content["content-type"] == "application/x-numpy-array")
+    assert(isinstance(colormap, str))
+    assert(size is None or (isinstance(size, int) and size > 0))
+
+    import toyplot.bitmap
+
+    cmap = lookup_colormap(colormap)
+
+    def generate():
+        array = samlab.deserialize.array(fs, content)
+        if size is not None and array.ndim and max(array.shape) > size:
+            step = int(math.ceil(max(array.shape) / size))
+            array = array[tuple([slice(None, None, step)] * array.ndim)]
+        stream = io.BytesIO()
+        toyplot.bitmap.to_png(cmap.colors(array), stream)
+        return stream.getvalue()
+
+    key = {"source": content["data"], "kind": "array-image", "colormap": colormap, "size": size}
+    return _lookup(database, fs, key, generate)
+
+
+def image(database, fs, content, size):
+    """Return a thumbnail of an image stored in the database.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    fs: :class:`gridfs.GridFS`, required
+    content: dict, required
+        Content object containing an image, stored as part of an :ref:`observation <observations>` or :ref:`artifact <artifacts>`.
+    size: int, required
+        Maximum thumbnail width and height.  The image aspect ratio is preserved,
+        and images that are already small enough are not enlarged.
+
+    Returns
+    -------
+    data: :class:`gridfs.grid_file.GridOut`
+        Cached thumbnail, with the same content type as the original image.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(isinstance(fs, gridfs.GridFS))
+    assert(isinstance(content, dict))
+    assert(content["content-type"] in ["image/jpeg", "image/png"])
+    assert(isinstance(size, int) and size > 0)
+
+    def generate():
+        import PIL.Image
+
+        thumbnail = samlab.deserialize.image(fs, content)
+        thumbnail.thumbnail((size, size), resample=PIL.Image.BICUBIC)
+        stream = io.BytesIO()
+        if content["content-type"] == "image/jpeg":
+            thumbnail.convert("RGB").save(stream, format="jpeg", quality=90)
+        else:
+            thumbnail.save(stream, format="png")
+        return stream.getvalue()
+
+    key = {"source": content["data"], "kind": "image", "colormap": None, "size": size}
+    return _lookup(database, fs, key, generate)
+
+
+def prewarm(database, fs, otype="observations", filter=None, colormap="linear/Blackbody", array_size=None, image_size=None):
+    """Generate derived content ahead of time, so it is available on first view.
+
+    This can be run from a notebook or a background process while the dashboard
+    is in use.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    fs: :class:`gridfs.GridFS`, required
+    otype: str, optional
+        Object type.  One of "observations", "experiments", or "artifacts".
+    filter: filter specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
+    colormap: str, optional
+        Colormap used to generate array images.
+    array_size: int, optional
+        Target size for array images, or `None` to keep arrays full-size.
+    image_size: int, optional
+        Thumbnail size for images, or `None` to skip image thumbnails.
+
+    Returns
+    -------
+    count: int
+        Number of content items processed.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(isinstance(fs, gridfs.GridFS))
+    assert(otype in ["observations", "experiments", "artifacts"])
+
+    count = 0
+    for obj in database[otype].find(filter=filter, projection={"content": True}):
+        for key, content in obj.get("content", {}).items():
+            try:
+                if content["content-type"] == "application/x-numpy-array":
+                    array_image(database, fs, content, colormap=colormap, size=array_size)
+                    count += 1
+                elif content["content-type"] in ["image/jpeg", "image/png"] and image_size is not None:
+                    image(database, fs, content, size=image_size)
+                    count += 1
+            except Exception as e:
+                log.error("Couldn't generate derived content for %s %s %s: %s", otype, obj["_id"], key, e)
+    log.info("Generated derived content for %s items.", count)
+    return count
+
+
+def prune(database, fs):
+    """Delete derived content whose source content no longer exists.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    fs: :class:`gridfs.GridFS`, required
+
+    Returns
+    -------
+    count: int
+        Number of derived content items deleted.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(isinstance(fs, gridfs.GridFS))
+
+    count = 0
+    for derived in database.derived.find(projection={"source": True, "data": True}):
+        if fs.exists(derived["source"]):
+            continue
+        fs.delete(derived["data"])
+        database.derived.delete_one({"_id": derived["_id"]})
+        count += 1
+    log.info("Pruned %s derived content items.", count)
+    return count
@@ -6,18 +6,174 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import io
 import logging
 import os
 import tempfile
+import zipfile
+import zlib
 
 import gridfs
 import numpy
 import PIL.Image
 
+import samlab.cache
+
 
 log = logging.getLogger(__name__)
 
 
+class _ZlibReader(io.RawIOBase):
+    """Incrementally decompress a zlib stream, reading `chunk_size` compressed bytes at a time."""
+    def __init__(self, source, chunk_size):
+        self._source = source
+        self._chunk_size = chunk_size
+        self._decompressor = zlib.decompressobj()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._decompressor.eof:
+            data = self._decompressor.unconsumed_tail
+            if not data:
+                data = self._source.read(self._chunk_size)
+                if not data:
+                    raise ValueError("Truncated zlib content.")
+            chunk = self._decompressor.decompress(data, len(buffer))
+            if chunk:
+                buffer[:len(chunk)] = chunk
+                return len(chunk)
+        return 0
+
+
+def _decoder(source, encoding, chunk_size):
+    if encoding == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(source, read_size=chunk_size)
+    if encoding == "lz4":
+        import lz4.frame
+        return lz4.frame.open(source, mode="rb")
+    if encoding == "zlib":
+        return _ZlibReader(source, chunk_size)
+    raise ValueError("Unknown content encoding: %s" % encoding)
+
+
+class _DecodedContent(io.RawIOBase):
+    """Incrementally decoded content, with the same attributes as :class:`gridfs.grid_file.GridOut` used by samlab.
+
+    Memory use is bounded by the chunk size.  Seeking forward decodes and
+    discards the skipped content, and seeking backward starts decoding again
+    from the beginning.
+    """
+    def __init__(self, source, encoding, length=None):
+        io.RawIOBase.__init__(self)
+        self._source = source
+        self._encoding = encoding
+        self._length = length
+        self._id = source._id
+        self.chunk_size = source.chunk_size
+        self.md5 = getattr(source, "md5", None)
+        self._restart()
+
+    def _restart(self):
+        self._source.seek(0)
+        self._decoder = _decoder(self._source, self._encoding, self.chunk_size)
+        self._position = 0
+
+    @property
+    def length(self):
+        # Content stored without its decoded length has to be decoded once to find it.
+        if self._length is None:
+            position = self._position
+            self._skip(None)
+            self.seek(position)
+        return self._length
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self._decoder.readinto(buffer)
+        self._position += count
+        if not count and len(buffer) and self._length is None:
+            self._length = self._position
+        return count
+
+    def read(self, size=-1):
+        # Like GridOut, only return fewer bytes than requested at the end of the content.
+        if size is None or size < 0:
+            return self.readall()
+        buffer = bytearray(size)
+        count = 0
+        with memoryview(buffer) as view:
+            while count < size:
+                chunk = self.readinto(view[count:])
+                if not chunk:
+                    break
+                count += chunk
+        del buffer[count:]
+        return bytes(buffer)
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_END and self._length is None:
+            self._skip(None)
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._length
+        if offset < 0:
+            raise ValueError("Negative seek position %s" % offset)
+
+        if offset < self._position:
+            self._restart()
+        self._skip(offset)
+        return self._position
+
+    def _skip(self, offset):
+        """Decode and discard content up to `offset`, or to the end if `offset` is None."""
+        buffer = memoryview(bytearray(self.chunk_size))
+        while offset is None or self._position < offset:
+            count = len(buffer) if offset is None else min(offset - self._position, len(buffer))
+            if not self.readinto(buffer[:count]):
+                break
+
+
+def stream(fs, content):
+    """Return a readable, seekable file-like object containing stored content.
+
+    Compressed content (see :func:`samlab.serialize.compressed`) is decompressed
+    incrementally as it is read, and content is read through the local cache if it is
+    enabled (see :mod:`samlab.cache`).  All of the other functions in this module use this to
+    retrieve content.
+
+    Parameters
+    ----------
+    fs: :class:`gridfs.GridFS` instance, required
+
+    content: dict, required
+        Content object stored as part of an :ref:`observation <observations>` or :ref:`artifact <artifacts>`.
+
+    Returns
+    -------
+    stream: file-like object
+        Provides `length` (size in bytes) and `chunk_size` attributes, like :class:`gridfs.grid_file.GridOut`.
+    """
+    assert(isinstance(fs, gridfs.GridFS))
+    assert(isinstance(content, dict))
+
+    data = samlab.cache.get(fs, content["data"])
+    if content.get("content-encoding", None) is None:
+        return data
+    return _DecodedContent(data, content["content-encoding"], content.get("decoded-length", None))
+
+
 def any(fs, content):
     """Deserialize any data stored in the database.
 
@@ -36,7 +192,7 @@ def any(fs, content):
     assert(isinstance(content, dict))
     assert("content-type" in content)
 
-    return content["content-type"], fs.get(content["data"])
+    return content["content-type"], stream(fs, content)
 
 
 def array(fs, content):
@@ -58,7 +214,77 @@ def array(fs, content):
     assert("content-type" in content)
     assert(content["content-type"] == "application/x-numpy-array")
 
-    return numpy.load(fs.get(content["data"]))
+    return numpy.load(stream(fs, content))
+
+
+def _read_npy(stream, index):
+    # Read the .npy header, so we know where the array data begins.
+    version = numpy.lib.format.read_magic(stream)
+    if version == (1, 0):
+        shape, fortran_order, dtype = numpy.lib.format.read_array_header_1_0(stream)
+    else:
+        shape, fortran_order, dtype = numpy.lib.format.read_array_header_2_0(stream)
+    offset = stream.tell()
+
+    if index is None:
+        index = ()
+    if not isinstance(index, tuple):
+        index = (index,)
+
+    # Fall back to reading the entire array when we can't compute byte offsets.
+    if fortran_order or dtype.hasobject or not shape or not index or not isinstance(index[0], (int, slice)):
+        stream.seek(0)
+        return numpy.lib.format.read_array(stream)[index]
+
+    # Only read the contiguous block of rows spanned by the first index.
+    first, rest = index[0], index[1:]
+    if isinstance(first, slice):
+        rows = range(*first.indices(shape[0]))
+    else:
+        if first < 0:
+            first += shape[0]
+        if not 0 <= first < shape[0]:
+            raise IndexError("Index %s is out of bounds for axis 0 with size %s." % (index[0], shape[0]))
+        rows = range(first, first + 1)
+    begin = min(rows) if rows else 0
+    end = max(rows) + 1 if rows else 0
+
+    row_shape = tuple(shape[1:])
+    row_bytes = dtype.itemsize * int(numpy.prod(row_shape, dtype=numpy.int64))
+    stream.seek(offset + begin * row_bytes)
+    block = numpy.frombuffer(stream.read((end - begin) * row_bytes), dtype=dtype).reshape((end - begin,) + row_shape)
+
+    if isinstance(first, slice):
+        return block[numpy.array(rows, dtype=numpy.int64) - begin][(slice(None),) + rest]
+    return block[first - begin][rest]
+
+
+def array_slice(fs, content, index):
+    """Deserialize part of a Numpy array stored in the database.
+
+    Only the bytes spanned by the first axis of `index` are retrieved from the
+    database, so small slices of large arrays are inexpensive.
+
+    Parameters
+    ----------
+    fs: :class:`gridfs.GridFS` instance, required
+
+    content: dict, required
+        Content object stored as part of an :ref:`observation <observations>` or :ref:`artifact <artifacts>`.
+
+    index: int, slice, or tuple of int and slice objects, required
+        Numpy-style index specifying the part of the array to return.
+
+    Returns
+    -------
+    array: :class:`numpy.ndarray`
+    """
+    assert(isinstance(fs, gridfs.GridFS))
+    assert(isinstance(content, dict))
+    assert("content-type" in content)
+    assert(content["content-type"] == "application/x-numpy-array")
+
+    return _read_npy(stream(fs, content), index)
 
 
 def arrays(fs, content):
@@ -80,7 +306,50 @@ def arrays(fs, content):
     assert("content-type" in content)
     assert(content["content-type"] == "application/x-numpy-arrays")
 
-    return numpy.load(fs.get(content["data"]))
+    return numpy.load(stream(fs, content))
+
+
+def arrays_slice(fs, content, name, index):
+    """Deserialize part of one array from a collection of Numpy arrays stored in the database.
+
+    When the array is stored without compression (the default for
+    :func:`samlab.serialize.arrays`), only the bytes spanned by the first axis
+    of `index` are retrieved from the database.
+
+    Parameters
+    ----------
+    fs: :class:`gridfs.GridFS` instance, required
+
+    content: dict, required
+        Content object stored as part of an :ref:`observation <observations>` or :ref:`artifact <artifacts>`.
+
+    name: str, required
+        Name of the array to be retrieved.
+
+    index: int, slice, or tuple of int and slice objects, required
+        Numpy-style index specifying the part of the array to return.
+
+    Returns
+    -------
+    array: :class:`numpy.ndarray`
+
+    Raises
+    ------
+    KeyError, if the named array doesn't exist.
+    """
+    assert(isinstance(fs, gridfs.GridFS))
+    assert(isinstance(content, dict))
+    assert("content-type" in content)
+    assert(content["content-type"] == "application/x-numpy-arrays")
+    assert(isinstance(name, str))
+
+    with zipfile.ZipFile(stream(fs, content)) as archive:
+        try:
+            member = archive.open(name + ".npy")
+        except KeyError:
+            raise KeyError(name)
+        with member:
+            return _read_npy(member, index)
 
 
 def image(fs, content):
@@ -102,6 +371,6 @@ def image(fs, content):
     assert("content-type" in content)
     assert(content["content-type"] in ["image/jpeg", "image/png"])
 
-    return PIL.Image.open(fs.get(content["data"]))
+    return PIL.Image.open(stream(fs, content))
 
 
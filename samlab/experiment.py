@@ -11,6 +11,7 @@ import bson.objectid
 import gridfs
 import pymongo
 
+import samlab.ngram
 import samlab.object
 
 log = logging.getLogger(__name__)
@@ -52,7 +53,7 @@ def create(database, fs, name, attributes=None, content=None, tags=None):
     if content is None:
         content = {}
     assert(isinstance(content, dict))
-    content = {key: {"data": fs.put(value["data"]), "content-type": value["content-type"], "filename": value.get("filename", None)} for key, value in content.items()}
+    content = {key: samlab.object.put_content(database, fs, value) for key, value in content.items()}
 
     if tags is None:
         tags = []
@@ -69,6 +70,8 @@ def create(database, fs, name, attributes=None, content=None, tags=None):
         "tags": tags,
     }
 
+    samlab.ngram.add(database, "experiments", document)
+
     document["_id"] = database.experiments.insert_one(document).inserted_id
 
     return document
@@ -90,23 +93,20 @@ def delete(database, fs, experiment):
     assert(isinstance(fs, gridfs.GridFS))
     eid = samlab.object.require_objectid(experiment)
 
-    # Delete favorites pointing to artifacts owned by this experiment.
-    for artifact in database.artifacts.find({"experiment": eid}):
-        database.favorites.delete_many({"otype": "artifacts", "oid": str(artifact["_id"])})
-    # Delete content owned by artifacts owned by this experiment.
-    for artifact in database.artifacts.find({"experiment": eid}):
-        for key, value in artifact["content"].items():
-            fs.delete(value["data"])
-    # Delete artifacts owned by this experiment.
-    database.artifacts.delete_many({"experiment": eid})
-    # Delete favorites pointing to this experiment.
-    database.favorites.delete_many({"otype": "experiments", "oid": str(eid)})
-    # Delete content owned by this experiment.
-    for experiment in database.experiments.find({"_id": eid}):
-        for key, value in experiment["content"].items():
-            fs.delete(value["data"])
-    # Delete the experiment.
-    database.experiments.delete_many({"_id": eid})
+    samlab.object.delete_many(database, fs, "experiments", filter={"_id": eid})
+
+
+def delete_many(database, fs, filter=None, search=None, chunk_size=1000):
+    """Delete every experiment that matches a filter and/or search expression.
+
+    See :func:`samlab.object.delete_many` for details.
+
+    Returns
+    -------
+    count: int
+        Number of experiments deleted.
+    """
+    return samlab.object.delete_many(database, fs, "experiments", filter=filter, search=search, chunk_size=chunk_size)
 
 
 def set_attributes(database, fs, experiment, attributes):
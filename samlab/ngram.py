@@ -0,0 +1,175 @@
+# Copyright 2018, National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS).  Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+"""Optional trigram index for substring search.
+
+MongoDB text indexes only match whole, stemmed words, so searching for
+fragments of filenames or ids would require a collection scan.  When
+enabled for an object type, every object stores hashes of the lowercase
+trigrams (three-character substrings) of selected field values in an indexed
+`ngrams` array, and :mod:`samlab.search` terms also match objects whose
+selected fields contain the term as a substring::
+
+    >>> samlab.ngram.enable(database, "observations", ["attributes.name", "content.original.filename"])
+
+Terms shorter than three characters can't use the index, and don't match
+substrings.
+
+Trigrams are stored as integers rather than strings so they aren't picked up
+by the wildcard text indexes; hash collisions only add candidates, which are
+always checked against the original field values.
+"""
+
+import logging
+import re
+import zlib
+
+import cachetools.func
+import pymongo
+
+log = logging.getLogger(__name__)
+
+
+def _values(document, field):
+    values = [document]
+    for key in field.split("."):
+        values = [value[key] for value in values if isinstance(value, dict) and key in value]
+        values = [item for value in values for item in (value if isinstance(value, list) else [value])]
+    return [value for value in values if isinstance(value, str)]
+
+
+def trigrams(value):
+    """Return the set of hashed lowercase trigrams in a string."""
+    value = value.lower()
+    return set([zlib.crc32(value[index:index + 3].encode("utf-8")) for index in range(len(value) - 2)])
+
+
+def ngrams(document, fields):
+    """Return the sorted, hashed trigrams of a document's field values.
+
+    Parameters
+    ----------
+    document: dict, required
+        Database object.
+    fields: list of str, required
+        Fields to be indexed, using MongoDB dotted notation.
+
+    Returns
+    -------
+    ngrams: list of int
+    """
+    result = set()
+    for field in fields:
+        for value in _values(document, field):
+            result.update(trigrams(value))
+    return sorted(result)
+
+
+@cachetools.func.ttl_cache(ttl=60)
+def indexed_fields(database, otype):
+    """Return the list of fields with trigram indexing for an object type, or an empty list if disabled."""
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+
+    config = database.ngram_fields.find_one({"otype": otype})
+    return list(config["fields"]) if config is not None else []
+
+
+def enable(database, otype, fields, chunk_size=1000):
+    """Enable trigram indexing for an object type, and index existing objects.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    fields: list of str, required
+        Fields to be indexed, using MongoDB dotted notation.
+    chunk_size: int, optional
+        Maximum number of objects to update at a time.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+    assert(isinstance(fields, list))
+    for field in fields:
+        assert(isinstance(field, str))
+
+    database.ngram_fields.update_one({"otype": otype}, {"$set": {"otype": otype, "fields": fields}}, upsert=True)
+    indexed_fields.cache_clear()
+    database[otype].create_index("ngrams")
+    refresh(database, otype, chunk_size=chunk_size)
+    log.info("Enabled trigram indexing for %s fields %s.", otype, fields)
+
+
+def disable(database, otype):
+    """Disable trigram indexing for an object type, and remove trigrams from existing objects."""
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+
+    database.ngram_fields.delete_many({"otype": otype})
+    indexed_fields.cache_clear()
+    database[otype].update_many({"ngrams": {"$exists": True}}, {"$unset": {"ngrams": ""}})
+    if "ngrams_1" in database[otype].index_information():
+        database[otype].drop_index("ngrams_1")
+
+
+def add(database, otype, document):
+    """Add trigrams to a new document before it is inserted into the database.
+
+    Does nothing if trigram indexing isn't enabled for the object type.
+    """
+    indexed = indexed_fields(database, otype)
+    if indexed:
+        document["ngrams"] = ngrams(document, indexed)
+    return document
+
+
+def refresh(database, otype, filter=None, chunk_size=1000):
+    """Recompute trigrams for existing objects after they have been modified.
+
+    Does nothing if trigram indexing isn't enabled for the object type.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    filter: filter specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
+    chunk_size: int, optional
+        Maximum number of objects to update at a time.
+    """
+    indexed = indexed_fields(database, otype)
+    if not indexed:
+        return
+
+    requests = []
+    for obj in database[otype].find(filter=filter, projection={field: True for field in indexed}):
+        requests.append(pymongo.UpdateOne({"_id": obj["_id"]}, {"$set": {"ngrams": ngrams(obj, indexed)}}))
+        if len(requests) >= chunk_size:
+            database[otype].bulk_write(requests, ordered=False)
+            requests = []
+    if requests:
+        database[otype].bulk_write(requests, ordered=False)
+
+
+def substring_filter(database, otype, term):
+    """Return a filter matching objects whose indexed fields contain a substring.
+
+    Returns
+    -------
+    filter: dict or None
+        Filter specification compatible with :meth:`pymongo.collection.Collection.find`,
+        or `None` if trigram indexing isn't enabled or the term is too short.
+    """
+    indexed = indexed_fields(database, otype)
+    grams = trigrams(term)
+    if not indexed or not grams:
+        return None
+
+    # The trigram index narrows the candidates, which are checked against the original field values.
+    pattern = re.escape(term)
+    return {"$and": [
+        {"ngrams": {"$all": sorted(grams)}},
+        {"$or": [{field: {"$regex": pattern, "$options": "i"}} for field in indexed]},
+        ]}
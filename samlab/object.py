@@ -6,32 +6,96 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import collections
 import collections.abc
 import logging
+import re
+import time
 
 import arrow
 import bson.objectid
 import gridfs
 import pymongo
 
+import samlab.ngram
 import samlab.search
 
 log = logging.getLogger(__name__)
 
 
 def load(database, otype, filter=None, oids=None):
-    """Load database objects of the given type."""
+    """Load database objects of the given type.
+
+    See :func:`iterate` for a more efficient alternative when working with large numbers of objects.
+    """
     assert(isinstance(database, pymongo.database.Database))
     assert(otype in ["observations", "experiments", "artifacts"])
 
     if filter is not None:
-        return list(database[otype].find(filter=filter))
+        return list(iterate(database, otype, filter=filter))
 
     if oids is not None:
         assert(isinstance(oids, collections.abc.Collection))
-        return [database[otype].find_one({"_id": oid}) for oid in oids]
+        return list(iterate(database, otype, oids=oids))
+
+    return list(iterate(database, otype))
+
+
+def iterate(database, otype, filter=None, search=None, oids=None, projection=None, sort=None, batch_size=1000, limit=None):
+    """Iterate over database objects of the given type.
+
+    Objects are retrieved from the database in batches as they are consumed, so
+    callers can process arbitrarily many objects in constant memory.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    filter: filter specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
+    search: str, optional
+        Search expression, see :mod:`samlab.search`.  Combined with `filter` if both are specified.
+    oids: sequence of :class:`bson.objectid.ObjectId`, optional
+        Objects to return, in order.  The ids are retrieved `batch_size` at a
+        time, and `None` is returned for ids that don't exist.  Cannot be
+        combined with `filter`, `search`, or `sort`.
+    projection: projection specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
+    sort: sort specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
+    batch_size: int, optional
+        Number of objects to retrieve per round trip.
+    limit: int, optional
+        Maximum number of objects to return.
+
+    Yields
+    ------
+    object: dict
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+    assert(isinstance(batch_size, int) and batch_size > 0)
+    assert(limit is None or (isinstance(limit, int) and limit >= 0))
 
-    return list(database[otype].find())
+    if oids is not None:
+        if filter is not None or search is not None or sort is not None:
+            raise ValueError("oids cannot be combined with filter, search, or sort.")
+        oids = list(oids)
+        if limit is not None:
+            oids = oids[:limit]
+        for begin in range(0, len(oids), batch_size):
+            chunk = [require_objectid(oid) for oid in oids[begin:begin + batch_size]]
+            objects = {obj["_id"]: obj for obj in database[otype].find({"_id": {"$in": chunk}}, projection=projection)}
+            for oid in chunk:
+                yield objects.get(oid)
+        return
+
+    if search is not None:
+        search = search_filter(database, otype, search)
+        filter = {"$and": [filter, search]} if filter else search
+
+    if limit == 0:
+        return
+    for obj in database[otype].find(filter=filter, projection=projection, sort=sort, batch_size=batch_size, limit=limit or 0):
+        yield obj
 
 
 def require_objectid(oid):
@@ -42,6 +106,100 @@ def require_objectid(oid):
     return oid
 
 
+def put_content(database, fs, value):
+    """Store serialized content in GridFS.
+
+    Content marked with :func:`samlab.serialize.content_addressed` is stored
+    once per distinct hash, with a reference count that is decremented by
+    :func:`release_content`.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    fs: :class:`gridfs.GridFS`, required
+        GridFS instance using the default "fs" collections.
+    value: dict, required
+        Serialized content created using functions in :mod:`samlab.serialize`.
+
+    Returns
+    -------
+    content: dict
+        Content subdocument, suitable for storage in an object's "content" field.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(isinstance(fs, gridfs.GridFS))
+    assert(isinstance(value, dict))
+
+    digest = value.get("sha256", None)
+    if digest is None:
+        fid = fs.put(value["data"])
+    else:
+        while True:
+            # Files whose references have dropped to zero are about to be deleted, and can't be reused.
+            existing = database.fs.files.find_one_and_update({"sha256": digest, "references": {"$gt": 0}}, {"$inc": {"references": 1}}, projection={"_id": True})
+            if existing is not None:
+                fid = existing["_id"]
+                break
+            fid = bson.objectid.ObjectId()
+            try:
+                fs.put(value["data"], _id=fid, sha256=digest, references=1)
+                break
+            except gridfs.errors.FileExists:
+                # Either someone else stored the same content concurrently, and we'll use theirs,
+                # or an unreferenced copy wasn't cleaned-up, and we'll replace it.
+                database.fs.chunks.delete_many({"files_id": fid})
+                for dead in database.fs.files.find({"sha256": digest, "references": {"$lte": 0}}, projection={"_id": True}):
+                    database.fs.files.delete_one({"_id": dead["_id"]})
+                    database.fs.chunks.delete_many({"files_id": dead["_id"]})
+
+    content = {"data": fid, "content-type": value["content-type"], "filename": value.get("filename", None)}
+    if digest is not None:
+        content["sha256"] = digest
+    if value.get("content-encoding", None) is not None:
+        content["content-encoding"] = value["content-encoding"]
+    if value.get("decoded-length", None) is not None:
+        content["decoded-length"] = value["decoded-length"]
+    if value.get("metadata", None) is not None:
+        content["metadata"] = value["metadata"]
+    return content
+
+
+def release_content(database, fs, fids):
+    """Release GridFS files that are no longer referenced by an object.
+
+    Content-addressed files (see :func:`put_content`) are deleted when their
+    last reference is released; all other files are deleted immediately.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    fs: :class:`gridfs.GridFS`, required
+        GridFS instance using the default "fs" collections.
+    fids: list of :class:`bson.objectid.ObjectId`, required
+        Ids of the files to be released.  A file can be listed more than once,
+        releasing more than one reference.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(isinstance(fs, gridfs.GridFS))
+
+    fids = list(fids)
+    if not fids:
+        return
+
+    references = collections.Counter(fids)
+    shared = set([f["_id"] for f in database.fs.files.find({"_id": {"$in": list(references)}, "references": {"$exists": True}}, projection={"_id": True})])
+    if shared:
+        database.fs.files.bulk_write([pymongo.UpdateOne({"_id": fid}, {"$inc": {"references": -references[fid]}}) for fid in shared], ordered=False)
+        unreferenced = [f["_id"] for f in database.fs.files.find({"_id": {"$in": list(shared)}, "references": {"$lte": 0}}, projection={"_id": True})]
+    else:
+        unreferenced = []
+
+    deleted = [fid for fid in references if fid not in shared] + unreferenced
+    if deleted:
+        database.fs.files.delete_many({"_id": {"$in": deleted}})
+        database.fs.chunks.delete_many({"files_id": {"$in": deleted}})
+
+
 def set_attributes(database, fs, otype, oid, attributes):
     assert(isinstance(database, pymongo.database.Database))
     assert(isinstance(fs, gridfs.GridFS))
@@ -49,11 +207,10 @@ def set_attributes(database, fs, otype, oid, attributes):
     oid = require_objectid(oid)
     assert(isinstance(attributes, dict))
 
-    obj = database[otype].find_one({"_id": oid})
-    if obj is None:
-        raise KeyError()
-
-    database[otype].update_one({"_id": oid}, {"$set": {"attributes": attributes, "modified": arrow.utcnow().datetime}})
+    result = database[otype].update_one({"_id": oid}, {"$set": {"attributes": attributes, "modified": arrow.utcnow().datetime}})
+    if not result.matched_count:
+        raise KeyError(oid)
+    samlab.ngram.refresh(database, otype, {"_id": oid})
 
 
 def set_content(database, fs, otype, oid, key, value):
@@ -64,19 +221,25 @@ def set_content(database, fs, otype, oid, key, value):
     assert(isinstance(key, str))
     assert(isinstance(value, (dict, type(None))))
 
-    obj = database[otype].find_one({"_id": oid})
-    if obj is None:
-        raise KeyError()
-    content = obj["content"]
+    update = {"$set": {"modified": arrow.utcnow().datetime}}
+    if value is not None:
+        content = put_content(database, fs, value)
+        update["$set"]["content." + key] = content
+    else:
+        content = None
+        update["$unset"] = {"content." + key: ""}
+
+    # Swap in the new content and retrieve the old content in a single round trip.
+    original = database[otype].find_one_and_update({"_id": oid}, update, projection={"content." + key: True}, return_document=pymongo.ReturnDocument.BEFORE)
+    if original is None:
+        if content is not None:
+            release_content(database, fs, [content["data"]])
+        raise KeyError(oid)
 
     # Delete existing content, if any
-    if key in content:
-        fs.delete(content[key]["data"])
-        del content[key]
-
-    if value is not None:
-        content[key] = {"data": fs.put(value["data"]), "content-type": value["content-type"], "filename": value.get("filename", None)}
-    database[otype].update_one({"_id": oid}, {"$set": {"content": content, "modified": arrow.utcnow().datetime}})
+    if key in original.get("content", {}):
+        release_content(database, fs, [original["content"][key]["data"]])
+    samlab.ngram.refresh(database, otype, {"_id": oid})
 
 
 def set_name(database, fs, otype, oid, name):
@@ -86,11 +249,10 @@ def set_name(database, fs, otype, oid, name):
     oid = require_objectid(oid)
     assert(isinstance(name, str))
 
-    obj = database[otype].find_one({"_id": oid})
-    if obj is None:
-        raise KeyError()
-
-    database[otype].update_one({"_id": oid}, {"$set": {"name": name, "modified": arrow.utcnow().datetime}})
+    result = database[otype].update_one({"_id": oid}, {"$set": {"name": name, "modified": arrow.utcnow().datetime}})
+    if not result.matched_count:
+        raise KeyError(oid)
+    samlab.ngram.refresh(database, otype, {"_id": oid})
 
 
 def set_tags(database, fs, otype, oid, tags):
@@ -100,66 +262,679 @@ def set_tags(database, fs, otype, oid, tags):
     oid = require_objectid(oid)
     assert(isinstance(tags, list))
 
-    obj = database[otype].find_one({"_id": oid})
-    if obj is None:
-        raise KeyError()
-
-    database[otype].update_one({"_id": oid}, {"$set": {"tags": tags, "modified": arrow.utcnow().datetime}})
+    result = database[otype].update_one({"_id": oid}, {"$set": {"tags": tags, "modified": arrow.utcnow().datetime}})
+    if not result.matched_count:
+        raise KeyError(oid)
+
+
+def set_many(database, otype, field, values):
+    """Set the attributes, name, or tags of many objects using a single bulk write.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    field: str, required
+        Field to be set.  One of "attributes", "name", or "tags".
+    values: sequence of (oid, value) tuples, required
+        Object ids and the new field value for each.
+
+    Returns
+    -------
+    count: int
+        Number of objects updated.
+
+    Raises
+    ------
+    KeyError, listing the ids of any objects that don't exist.  Objects that
+    do exist are still updated.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+    assert(field in ["attributes", "name", "tags"])
+
+    value_type = {"attributes": dict, "name": str, "tags": list}[field]
+    modified = arrow.utcnow().datetime
+
+    # If an object appears more than once, the last value wins.
+    updates = collections.OrderedDict()
+    for oid, value in values:
+        oid = require_objectid(oid)
+        assert(isinstance(value, value_type))
+        updates[oid] = value
+
+    if not updates:
+        return 0
+
+    oids = list(updates.keys())
+    requests = [pymongo.UpdateOne({"_id": oid}, {"$set": {field: value, "modified": modified}}) for oid, value in updates.items()]
+    count = database[otype].bulk_write(requests, ordered=False).matched_count
+    if field != "tags":
+        samlab.ngram.refresh(database, otype, {"_id": {"$in": oids}})
+    if count < len(oids):
+        existing = set([obj["_id"] for obj in database[otype].find({"_id": {"$in": oids}}, projection={"_id": True})])
+        raise KeyError([oid for oid in oids if oid not in existing])
+    return count
+
+
+def delete_many(database, fs, otype, filter=None, search=None, chunk_size=1000):
+    """Delete every object that matches a filter and/or search expression.
+
+    Note that this implicitly deletes any content owned by the objects,
+    favorites that refer to them, and, for experiments, the artifacts they
+    own.  Objects are deleted `chunk_size` at a time, with a handful of bulk
+    operations per chunk regardless of the amount of content.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    fs: :class:`gridfs.GridFS`, required
+        GridFS instance using the default "fs" collections.
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    filter: filter specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
+    search: str, optional
+        Search expression, see :mod:`samlab.search`.  Combined with `filter` if both are specified.
+    chunk_size: int, optional
+        Maximum number of objects to delete at a time.
+
+    Returns
+    -------
+    count: int
+        Number of objects deleted, not including artifacts owned by deleted experiments.
+
+    Raises
+    ------
+    ValueError, if neither `filter` nor `search` are specified.  Use an empty
+    filter to delete every object.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(isinstance(fs, gridfs.GridFS))
+    assert(otype in ["observations", "experiments", "artifacts"])
+    assert(isinstance(chunk_size, int) and chunk_size > 0)
+
+    if filter is None and search is None:
+        raise ValueError("A filter or search expression is required.")
+    if search is not None:
+        search = search_filter(database, otype, search)
+        filter = {"$and": [filter, search]} if filter else search
+
+    count = 0
+    # Collect ids up-front, since we're deleting objects that match the filter as we go.
+    oids = [obj["_id"] for obj in database[otype].find(filter, projection={"_id": True})]
+    for begin in range(0, len(oids), chunk_size):
+        chunk = oids[begin:begin + chunk_size]
+        fids = [content["data"] for obj in database[otype].find({"_id": {"$in": chunk}}, projection={"content": True}) for content in obj.get("content", {}).values()]
+
+        if otype == "experiments":
+            delete_many(database, fs, "artifacts", filter={"experiment": {"$in": chunk}}, chunk_size=chunk_size)
+
+        database.favorites.delete_many({"otype": otype, "oid": {"$in": [str(oid) for oid in chunk]}})
+        count += database[otype].delete_many({"_id": {"$in": chunk}}).deleted_count
+        # Delete content last, so no remaining objects refer to missing files.
+        release_content(database, fs, fids)
+
+    log.info("Deleted %s %s.", count, otype)
+    return count
+
+
+def update_tags(database, otype, filter, add=None, remove=None, toggle=None, modified_by=None, chunk_size=1000):
+    """Add, remove, and toggle tags on every object that matches a filter.
+
+    Tags are added first, then removed, then toggled.  Adding and removing tags
+    are each handled with a single update; toggling requires per-object updates,
+    which are sent to the database in chunks.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    filter: filter specification compatible with :meth:`pymongo.collection.Collection.find`, required.
+    add: list of str, optional
+        Tags to add to every matching object.
+    remove: list of str, optional
+        Tags to remove from every matching object.
+    toggle: list of str, optional
+        Tags to add to matching objects that don't have them, and remove from matching objects that do.
+    modified_by: str, optional
+        Username to record as the last modifier of every changed object.
+    chunk_size: int, optional
+        Maximum number of operations per bulk write.
+
+    Returns
+    -------
+    count: int
+        Number of object updates.  Objects that are changed by more than one
+        of `add`, `remove`, and `toggle` are counted more than once.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+    assert(isinstance(filter, dict))
+    add = list(add or [])
+    remove = list(remove or [])
+    toggle = list(toggle or [])
+    for tag in add + remove + toggle:
+        assert(isinstance(tag, str))
+
+    modified = {"modified": arrow.utcnow().datetime}
+    if modified_by is not None:
+        modified["modified-by"] = modified_by
+
+    count = 0
+    if add:
+        # Only touch objects that are missing one or more tags.
+        query = {"$and": [filter, {"tags": {"$not": {"$all": add}}}]}
+        count += database[otype].update_many(query, {"$addToSet": {"tags": {"$each": add}}, "$set": modified}).matched_count
+    if remove:
+        query = {"$and": [filter, {"tags": {"$in": remove}}]}
+        count += database[otype].update_many(query, {"$pull": {"tags": {"$in": remove}}, "$set": modified}).matched_count
+    if toggle:
+        requests = []
+        for obj in database[otype].find(filter, projection={"tags": True}):
+            tags = set(obj.get("tags", []))
+            tags.symmetric_difference_update(toggle)
+            requests.append(pymongo.UpdateOne({"_id": obj["_id"]}, {"$set": dict(modified, tags=sorted(tags))}))
+            if len(requests) >= chunk_size:
+                count += database[otype].bulk_write(requests, ordered=False).matched_count
+                requests = []
+        if requests:
+            count += database[otype].bulk_write(requests, ordered=False).matched_count
+
+    return count
+
+
+def update_attributes(database, otype, filter, set=None, unset=None, modified_by=None, chunk_size=1000):
+    """Set and unset attributes on every object that matches a filter.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    filter: filter specification compatible with :meth:`pymongo.collection.Collection.find`, required.
+    set: dict, optional
+        Attribute values to be set.  Keys may use dotted notation to set nested attributes.
+    unset: list of str, optional
+        Attributes to be removed.  Keys may use dotted notation to remove nested attributes.
+    modified_by: str, optional
+        Username to record as the last modifier of every changed object.
+    chunk_size: int, optional
+        Maximum number of objects whose trigrams are refreshed at a time, if
+        trigram indexing is enabled (see :mod:`samlab.ngram`).
+
+    Returns
+    -------
+    count: int
+        Number of objects modified.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+    assert(isinstance(filter, dict))
+    set = dict(set or {})
+    unset = list(unset or [])
+    for key in list(set.keys()) + unset:
+        assert(isinstance(key, str))
+        if not key or key.startswith("$"):
+            raise ValueError("Invalid attribute key: %r" % key)
+
+    if not set and not unset:
+        return 0
+
+    update = {"$set": {"modified": arrow.utcnow().datetime}}
+    if modified_by is not None:
+        update["$set"]["modified-by"] = modified_by
+    for key, value in set.items():
+        update["$set"]["attributes." + key] = value
+    if unset:
+        update["$unset"] = {"attributes." + key: "" for key in unset}
+
+    # The update can change which objects match the filter, so find the
+    # objects whose trigrams will need to be refreshed beforehand.
+    oids = [obj["_id"] for obj in database[otype].find(filter, projection={"_id": True})] if samlab.ngram.indexed_fields(database, otype) else []
+
+    count = database[otype].update_many(filter, update).matched_count
+    for index in range(0, len(oids), chunk_size):
+        samlab.ngram.refresh(database, otype, {"_id": {"$in": oids[index:index + chunk_size]}}, chunk_size=chunk_size)
+    return count
+
+
+def tag_counts(database, otype, filter=None):
+    """Count the number of objects that use each tag.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    filter: filter specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
+        Restricts the counts to matching objects.
+
+    Returns
+    -------
+    counts: list of (str, int) tuples
+        Tag names and counts, sorted by tag name.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
 
+    pipeline = []
+    if filter:
+        pipeline.append({"$match": filter})
+    pipeline += [
+        {"$project": {"_id": False, "tags": True}},
+        {"$unwind": "$tags"},
+        {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+        {"$sort": {"_id": pymongo.ASCENDING}},
+        ]
+
+    return [(group["_id"], group["count"]) for group in database[otype].aggregate(pipeline)]
+
+
+def update_content_metadata(database, fs, otype, filter=None, overwrite=False):
+    """Compute and store summary metadata for existing content.
+
+    Content created with :mod:`samlab.serialize` includes summary metadata
+    (array shapes and statistics, image dimensions, etc.) that allows clients to
+    display information about content without retrieving it.  Use this function
+    to add the same metadata to content that was stored before it was
+    available.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    fs: :class:`gridfs.GridFS`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    filter: filter specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
+    overwrite: bool, optional
+        If `True`, recompute metadata for content that already has it.
+
+    Returns
+    -------
+    count: int
+        Number of content items updated.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(isinstance(fs, gridfs.GridFS))
+    assert(otype in ["observations", "experiments", "artifacts"])
 
-class _IdSearchVisitor(object):
-    def __init__(self, collection):
+    import samlab.deserialize
+    import samlab.serialize
+
+    count = 0
+    for obj in database[otype].find(filter=filter, projection={"content": True}):
+        update = {}
+        for key, content in obj.get("content", {}).items():
+            if "metadata" in content and not overwrite:
+                continue
+            try:
+                if content["content-type"] == "application/x-numpy-array":
+                    metadata = samlab.serialize.array_metadata(samlab.deserialize.array(fs, content))
+                elif content["content-type"] == "application/x-numpy-arrays":
+                    with samlab.deserialize.arrays(fs, content) as arrays:
+                        metadata = samlab.serialize.arrays_metadata(arrays)
+                elif content["content-type"] in ["image/jpeg", "image/png"]:
+                    with samlab.deserialize.image(fs, content) as image:
+                        metadata = samlab.serialize.image_metadata(image)
+                else:
+                    continue
+            except Exception as e:
+                log.error("Couldn't compute metadata for %s %s content %s: %s", otype, obj["_id"], key, e)
+                continue
+            update["content." + key + ".metadata"] = metadata
+        if update:
+            database[otype].update_one({"_id": obj["_id"]}, {"$set": update})
+            count += len(update)
+
+    log.info("Updated metadata for %s content items.", count)
+    return count
+
+
+_comparison_operators = {
+    "!=": "$ne",
+    "<": "$lt",
+    "<=": "$lte",
+    ">": "$gt",
+    ">=": "$gte",
+}
+
+
+def _objectid_or_value(value):
+    try:
+        return bson.objectid.ObjectId(value)
+    except:
+        return value
+
+
+_text_match_limit = 100000
+
+
+class _FilterSearchVisitor(object):
+    """Compiles a search expression parse tree into a single MongoDB filter.
+
+    A term matches the same objects wherever it appears in an expression, but
+    MongoDB allows only one $text expression per query, never inside $nor, and
+    inside $or only if every other clause is indexed.  Text matches for terms
+    that every match must satisfy (terms that aren't inside an "or" or "not")
+    are combined into a single top-level $text expression.  Other terms use
+    indexed clauses (tags, ids, and substrings), plus a separate text search
+    for objects that the indexed clauses miss, limited to
+    :data:`_text_match_limit` ids.
+    """
+    def __init__(self, collection, within=None, required=True):
         self._collection = collection
+        self._within = within if within is not None else {}
         self._stack = []
+        self._required = required
+        self._text = []
+        self._indexed = []
+        self.fields = set()
 
     @property
-    def ids(self):
-        return list(self._stack[0])
+    def filter(self):
+        clauses = []
+        if self._stack and self._stack[0] is not None:
+            clauses = list(self._stack[0]["$and"]) if list(self._stack[0]) == ["$and"] else [self._stack[0]]
+        if self._text:
+            text = {"$text": {"$search": " ".join(['"' + term + '"' for term in self._text])}}
+            indexed = self._indexed[0] if len(self._indexed) == 1 else {"$and": self._indexed}
+            clauses.insert(0, {"$or": [text, indexed]})
+        if not clauses:
+            return {}
+        if len(clauses) == 1:
+            return clauses[0]
+        return {"$and": clauses}
+
+    def _visit_optional(self, operand):
+        required = self._required
+        self._required = False
+        operand.accept(self)
+        self._required = required
 
     def visit_and(self, operands):
         current = len(self._stack)
         for operand in operands:
             operand.accept(self)
-        result = self._stack.pop()
-        while(len(self._stack) > current):
-            result &= self._stack.pop()
-        self._stack.append(result)
+        clauses = [clause for clause in self._stack[current:] if clause is not None]
+        del self._stack[current:]
+        self._stack.append({"$and": clauses} if clauses else None)
 
     def visit_not(self, operand):
-        operand.accept(self)
-        result = set([o["_id"] for o in self._collection.find(projection={"_id": True})])
-        result -= self._stack.pop()
-        self._stack.append(result)
+        self._visit_optional(operand)
+        self._stack.append({"$nor": [self._stack.pop()]})
 
     def visit_or(self, operands):
         current = len(self._stack)
         for operand in operands:
-            operand.accept(self)
-        result = self._stack.pop()
-        while(len(self._stack) > current):
-            result |= self._stack.pop()
-        self._stack.append(result)
+            self._visit_optional(operand)
+        clauses = self._stack[current:]
+        del self._stack[current:]
+        self._stack.append({"$or": clauses})
 
     def visit_term(self, term):
-        # Match documents that contain the search term in text (field values).
-        result = set([o["_id"] for o in self._collection.find(filter={"$text": {"$search": '"' + term + '"'}}, projection={"_id": True})])
-        # Match documents with content that matches the search term.
-        result |= set([o["_id"] for o in self._collection.find(filter={"content." + term: {"$exists": True}}, projection={"_id": True})])
-        # Match documents with attribute fields that match the search term.
-        result |= set([o["_id"] for o in self._collection.find(filter={"attributes." + term: {"$exists": True}}, projection={"_id": True})])
-        # Match documents whose ID matches the search term.
         try:
             oid = bson.objectid.ObjectId(term)
-            result |= set([o["_id"] for o in self._collection.find(filter={"_id": oid}, projection={"_id": True})])
         except:
-            pass
-        self._stack.append(result)
+            oid = None
+
+        # Match documents with the search term as a tag or ID, or whose
+        # trigram-indexed fields contain it as a substring, if enabled.
+        clauses = [{"tags": term}]
+        if oid is not None:
+            clauses.append({"_id": oid})
+        substring = samlab.ngram.substring_filter(self._collection.database, self._collection.name, term)
+        if substring is not None:
+            clauses.append(substring)
+
+        # Match documents that contain the search term in text (field values).
+        if self._required and oid is None:
+            self._text.append(term)
+            self._indexed.append(clauses[0] if len(clauses) == 1 else {"$or": clauses})
+            self._stack.append(None)
+            return
+
+        # Only documents that the indexed clauses miss are resolved to ids, which keeps
+        # the list short for common searches such as "not label:reviewed".
+        filter = dict(self._within)
+        filter["$text"] = {"$search": '"' + term + '"'}
+        filter["$nor"] = list(clauses)
+        oids = [o["_id"] for o in self._collection.find(filter=filter, projection={"_id": True}, limit=_text_match_limit + 1)]
+        if len(oids) > _text_match_limit:
+            raise samlab.search.SearchError(term, "%r matches the text of more than %s objects that aren't tagged with it, which is too many to combine with 'or' or 'not'.  Try a more specific search." % (term, _text_match_limit))
+        if oids:
+            clauses.append({"_id": {"$in": oids}})
+        self._stack.append(clauses[0] if len(clauses) == 1 else {"$or": clauses})
+
+    def visit_predicate(self, field, operator, values):
+        self.fields.add(field)
+
+        if field == "_id":
+            values = [_objectid_or_value(value) for value in values]
+
+        if operator == "=":
+            predicate = values[0]
+        elif operator in _comparison_operators:
+            predicate = {_comparison_operators[operator]: values[0]}
+        elif operator == "in":
+            predicate = {"$in": values}
+        elif operator == "between":
+            predicate = {"$gte": values[0], "$lte": values[1]}
+        elif operator == "startswith":
+            # Anchored, case-sensitive prefix expressions can use an index.
+            predicate = {"$regex": "^" + re.escape(str(values[0]))}
+        else:
+            raise ValueError("Unknown search operator: %s" % operator)
+
+        self._stack.append({field: predicate})
+
+
+def search_filter(database, otype, search, within=None):
+    """Compile a search expression into a MongoDB filter.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    search: str, required
+        Search expression, see :mod:`samlab.search`.  An empty expression matches every object.
+    within: dict, optional
+        Simple equality filter (such as `{"_id": oid}`) restricting the objects
+        that the returned filter will be used with.  Supplying it makes
+        compilation cheaper for small sets of objects.
+
+    Returns
+    -------
+    filter: dict
+        Filter specification compatible with :meth:`pymongo.collection.Collection.find`.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+    assert(isinstance(search, str))
+    assert(isinstance(within, (dict, type(None))))
+
+    if not search.strip():
+        return {}
+
+    visitor = samlab.search.parser().parse(search).accept(_FilterSearchVisitor(database[otype], within=within))
+
+    # Keep track of the fields used in interactive searches, so we can suggest indexes.
+    if visitor.fields and within is None:
+        now = arrow.utcnow().datetime
+        database.search_fields.bulk_write([pymongo.UpdateOne({"otype": otype, "field": field}, {"$inc": {"count": 1}, "$set": {"last": now}}, upsert=True) for field in sorted(visitor.fields)], ordered=False)
+
+    return visitor.filter
+
+
+def suggest_indexes(database, otype, minimum=10):
+    """Suggest indexes for fields that are frequently used in search predicates.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    minimum: int, optional
+        Minimum number of searches that must have used a field before it is suggested.
+
+    Returns
+    -------
+    suggestions: list of dict
+        Unindexed fields with "field", "count", and "last" (time last used) keys,
+        sorted from most- to least-frequently searched.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+
+    indexed = set([index["key"][0][0] for index in database[otype].index_information().values()])
+
+    suggestions = []
+    for usage in database.search_fields.find({"otype": otype, "count": {"$gte": minimum}}, sort=[("count", pymongo.DESCENDING)]):
+        if usage["field"] in indexed:
+            continue
+        suggestions.append({"field": usage["field"], "count": usage["count"], "last": usage["last"]})
+    return suggestions
+
+
+def create_indexes(database, otype, fields=None, minimum=10):
+    """Create indexes for fields used in search predicates.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    fields: list of str, optional
+        Fields to be indexed.  Defaults to the fields returned by :func:`suggest_indexes`.
+    minimum: int, optional
+        Passed to :func:`suggest_indexes` when `fields` isn't specified.
+
+    Returns
+    -------
+    fields: list of str
+        Fields that were indexed.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+
+    if fields is None:
+        fields = [suggestion["field"] for suggestion in suggest_indexes(database, otype, minimum=minimum)]
+
+    for field in fields:
+        log.info("Creating %s index for %s.", otype, field)
+        database[otype].create_index(field)
+    return fields
 
 
 def search(database, otype, search):
+    """Return the ids of objects that match a search expression.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    search: str, required
+        Search expression, see :mod:`samlab.search`.
+
+    Returns
+    -------
+    oids: list of :class:`bson.objectid.ObjectId`
+    """
+    filter = search_filter(database, otype, search)
+    return [o["_id"] for o in database[otype].find(filter=filter, projection={"_id": True})]
+
+
+def _plan_summary(explanation):
+    stages = []
+    indexes = []
+    def walk(stage):
+        stages.append(stage.get("stage"))
+        if "indexName" in stage:
+            indexes.append(stage["indexName"])
+        for child in stage.get("inputStages", []) + [stage[key] for key in ["inputStage", "queryPlan"] if key in stage]:
+            walk(child)
+    walk(explanation.get("queryPlanner", {}).get("winningPlan", {}))
+
+    summary = {"stages": stages, "indexes": sorted(set(indexes))}
+    stats = explanation.get("executionStats", {})
+    for key in ["nReturned", "totalKeysExamined", "totalDocsExamined", "executionTimeMillis"]:
+        if key in stats:
+            summary[key] = stats[key]
+    return summary
+
+
+def _explain_filter(collection, expression, filter, compile_time, children):
+    start = time.time()
+    count = collection.count_documents(filter)
+    query_time = time.time() - start
+
+    plan = _plan_summary(collection.find(filter).explain())
+
+    return {
+        "expression": expression,
+        "filter": filter,
+        "count": count,
+        "compile-time": compile_time,
+        "query-time": query_time,
+        "plan": plan,
+        "index-miss": "COLLSCAN" in plan["stages"],
+        "children": children,
+        }
+
+
+def _explain_node(collection, node, required=True):
+    # Compile each node the way it is compiled as part of the whole search, so
+    # terms inside "or" and "not" explain the sub-filters that are actually run.
+    start = time.time()
+    filter = node.accept(_FilterSearchVisitor(collection, required=required)).filter
+    compile_time = time.time() - start
+
+    if isinstance(node, samlab.search.SearchAnd):
+        children = node.operands
+    elif isinstance(node, samlab.search.SearchOr):
+        children = node.operands
+        required = False
+    elif isinstance(node, samlab.search.SearchNot):
+        children = [node.operand]
+        required = False
+    else:
+        children = []
+
+    return _explain_filter(collection, repr(node), filter, compile_time, [_explain_node(collection, child, required) for child in children])
+
+
+def explain_search(database, otype, search):
+    """Profile a search expression, to find out which parts of it are slow.
+
+    Every node in the search parse tree is compiled and run as a separate query,
+    so this is much more expensive than the search itself, and intended for
+    diagnosing problems.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    search: str, required
+        Search expression, see :mod:`samlab.search`.  An empty expression matches every object.
+
+    Returns
+    -------
+    explanation: dict
+        Parse tree node with "expression", "filter", "count", "compile-time"
+        (seconds, including any text searches), "query-time" (seconds),
+        "plan" (summary of the MongoDB query plan), "index-miss" (`True` if the
+        query scans the collection), and "children" keys.  Each child is a
+        node with the same keys.
+    """
     assert(isinstance(database, pymongo.database.Database))
     assert(otype in ["observations", "experiments", "artifacts"])
     assert(isinstance(search, str))
 
-    visitor = samlab.search.parser().parse(search).accept(_IdSearchVisitor(database[otype]))
-    return visitor.ids
+    # Like search_filter(), an empty search matches every object.
+    if not search.strip():
+        return _explain_filter(database[otype], "", {}, 0.0, [])
+    return _explain_node(database[otype], samlab.search.parser().parse(search))
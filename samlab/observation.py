@@ -7,9 +7,13 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 import collections
-import copy
+import concurrent.futures
+import hashlib
 import io
 import logging
+import os
+import threading
+import time
 
 import arrow
 import bson
@@ -19,6 +23,7 @@ import pymongo
 
 import samlab
 import samlab.deserialize
+import samlab.ngram
 import samlab.object
 import samlab.serialize
 
@@ -58,7 +63,7 @@ def create(database, fs, attributes=None, content=None, tags=None):
     if content is None:
         content = {}
     assert(isinstance(content, dict))
-    content = {key: {"data": fs.put(value["data"]), "content-type": value["content-type"], "filename": value.get("filename", None)} for key, value in content.items()}
+    content = {key: samlab.object.put_content(database, fs, value) for key, value in content.items()}
 
     if tags is None:
         tags = []
@@ -73,12 +78,71 @@ def create(database, fs, attributes=None, content=None, tags=None):
         "tags": tags,
     }
 
+    samlab.ngram.add(database, "observations", document)
+
     return database.observations.insert_one(document).inserted_id
 
 
-def create_many(database, fs):
+def _chunks(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _map_ordered(function, work, processes, max_pending):
+    """Call a function for each item of work, yielding results in order.
+
+    Each item of `work` is a (key, args) tuple, and (key, function(*args)) is
+    yielded for each.  If `processes` is `None` the calls run inline, otherwise
+    they run in a pool of worker processes, so `function`, `args`, and the
+    results must be picklable.  No more than `max_pending` calls are in flight
+    at once, so memory use is bounded no matter how much work there is.
+    """
+    if processes is None:
+        for key, args in work:
+            yield key, function(*args)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = collections.deque()
+        for key, args in work:
+            pending.append((key, executor.submit(function, *args)))
+            if len(pending) >= max_pending:
+                key, future = pending.popleft()
+                yield key, future.result()
+        while pending:
+            key, future = pending.popleft()
+            yield key, future.result()
+
+
+def _content_size(value):
+    data = value["data"]
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    try:
+        return os.fstat(data.fileno()).st_size
+    except Exception:
+        return 0
+
+
+def create_many(database, fs, batch_size=1000, max_workers=8, max_inflight_bytes=256 * 1024 * 1024):
     """Return a context object that can add multiple observations to the :ref:`database <database>`.
 
+    Content is uploaded to GridFS concurrently by a pool of threads, and
+    observations are inserted `batch_size` at a time, so that large ingests
+    are limited by network and disk bandwidth instead of round trips.
+    Observations are written when a batch fills up and when the context
+    exits, so they won't appear in the database immediately.  If any
+    observations can't be created, the failures are logged and
+    :class:`RuntimeError` is raised when the context exits; the remaining
+    observations are still created, and the `failures` attribute of the
+    context object contains a list of (oid, exception) tuples.
+
     Examples
     --------
 
@@ -94,21 +158,93 @@ def create_many(database, fs):
     ----------
     database: database object returned by :func:`samlab.database.connect`, required
     fs: :class:`gridfs.GridFS`, required
+    batch_size: int, optional
+        Maximum number of observations to insert at a time.
+    max_workers: int, optional
+        Maximum number of concurrent GridFS uploads.
+    max_inflight_bytes: int, optional
+        Maximum total size of content that has been submitted but not yet
+        uploaded.  :meth:`create` blocks until enough uploads complete.
     """
     assert(isinstance(database, pymongo.database.Database))
     assert(isinstance(fs, gridfs.GridFS))
+    assert(isinstance(batch_size, int) and batch_size > 0)
+    assert(isinstance(max_workers, int) and max_workers > 0)
+    assert(isinstance(max_inflight_bytes, int) and max_inflight_bytes > 0)
 
     class Implementation(object):
         def __init__(self, database, fs):
             self._database = database
             self._fs = fs
             self._created = arrow.utcnow().datetime
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+            self._inflight = 0
+            self._inflight_condition = threading.Condition()
+            self._pending = []
+            self.failures = []
 
         def __enter__(self):
             return self
 
         def __exit__(self, exc_type, exc_val, exc_tb):
-            pass
+            try:
+                self.flush()
+            finally:
+                self._executor.shutdown(wait=True)
+
+            if self.failures and exc_type is None:
+                raise RuntimeError("%s observations couldn't be created." % len(self.failures))
+
+        def _put(self, value, size):
+            try:
+                return samlab.object.put_content(self._database, self._fs, value)
+            finally:
+                with self._inflight_condition:
+                    self._inflight -= size
+                    self._inflight_condition.notify_all()
+
+        def _submit(self, value):
+            size = _content_size(value)
+            with self._inflight_condition:
+                # Always allow at least one upload, no matter how large.
+                while self._inflight and self._inflight + size > max_inflight_bytes:
+                    self._inflight_condition.wait()
+                self._inflight += size
+            return self._executor.submit(self._put, value, size)
+
+        def _fail(self, document, e):
+            log.error("Couldn't create observation %s: %s", document["_id"], e)
+            self.failures.append((document["_id"], e))
+            samlab.object.release_content(self._database, self._fs, [content["data"] for content in document["content"].values()])
+
+        def flush(self):
+            """Write pending observations to the :ref:`database <database>`."""
+            pending, self._pending = self._pending, []
+
+            documents = []
+            for document, uploads in pending:
+                content = {}
+                error = None
+                for key, upload in uploads.items():
+                    try:
+                        content[key] = upload.result()
+                    except Exception as e:
+                        error = e
+                document["content"] = content
+                if error is not None:
+                    self._fail(document, error)
+                    continue
+                samlab.ngram.add(self._database, "observations", document)
+                documents.append(document)
+
+            if not documents:
+                return
+
+            try:
+                self._database.observations.insert_many(documents, ordered=False)
+            except pymongo.errors.BulkWriteError as e:
+                for error in e.details["writeErrors"]:
+                    self._fail(documents[error["index"]], error["errmsg"])
 
         def create(self, attributes=None, content=None, tags=None):
             """Add an observation to the :ref:`database <database>`.
@@ -138,7 +274,6 @@ def create_many(database, fs):
             if content is None:
                 content = {}
             assert(isinstance(content, dict))
-            content = {key: {"data": self._fs.put(value["data"]), "content-type": value["content-type"], "filename": value.get("filename", None)} for key, value in content.items()}
 
             if tags is None:
                 tags = []
@@ -147,18 +282,191 @@ def create_many(database, fs):
                 assert(isinstance(tag, str))
 
             document = {
+                "_id": bson.objectid.ObjectId(),
                 "attributes": attributes,
-                "content": content,
+                "content": {},
                 "created": self._created,
                 "tags": tags,
             }
 
-            oid = self._database.observations.insert_one(document).inserted_id
-            return oid
+            uploads = {key: self._submit(value) for key, value in content.items()}
+            self._pending.append((document, uploads))
+            if len(self._pending) >= batch_size:
+                self.flush()
+
+            return document["_id"]
 
     return Implementation(database, fs)
 
 
+_ingest_content_types = {
+    ".jpeg": "image/jpeg",
+    ".jpg": "image/jpeg",
+    ".npy": "application/x-numpy-array",
+    ".png": "image/png",
+}
+
+
+def _ingest_paths(source):
+    if isinstance(source, str) and os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in _ingest_content_types:
+                    yield os.path.join(root, name)
+    elif isinstance(source, str):
+        with open(source, "r") as manifest:
+            for line in manifest:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    yield line
+    else:
+        for path in source:
+            yield path
+
+
+def _ingest_load(path, size, deduplicate):
+    try:
+        content_type = _ingest_content_types.get(os.path.splitext(path)[1].lower())
+        if content_type is None:
+            raise ValueError("Unknown content type: %s" % path)
+
+        with open(path, "rb") as stream:
+            data = stream.read()
+        digest = hashlib.sha256(data).hexdigest()
+
+        if content_type == "application/x-numpy-array":
+            metadata = samlab.serialize.array_metadata(numpy.load(io.BytesIO(data), allow_pickle=False))
+        else:
+            import PIL.Image
+
+            with PIL.Image.open(io.BytesIO(data)) as image:
+                # Decoding the image validates it.
+                image.load()
+                if size is not None and max(image.size) > size:
+                    image.thumbnail((size, size), resample=PIL.Image.BICUBIC)
+                    stream = io.BytesIO()
+                    if content_type == "image/jpeg":
+                        image.convert("RGB").save(stream, format="jpeg", quality=95)
+                    else:
+                        image.save(stream, format="png")
+                    data = stream.getvalue()
+                metadata = samlab.serialize.image_metadata(image)
+
+        content = {"data": data, "content-type": content_type, "filename": path, "metadata": metadata}
+        if deduplicate:
+            content = samlab.serialize.content_addressed(content)
+        return path, content, digest, None
+    except Exception as e:
+        return path, None, None, "%s: %s" % (type(e).__name__, e)
+
+
+def ingest(database, fs, source, key="original", tags=None, size=None, processes=None, batch_size=1000, max_pending=None, checkpoint=None, deduplicate=False):
+    """Create observations from a directory tree or manifest of images and arrays.
+
+    Files are read, validated, decoded, optionally resized, and hashed by a
+    pool of worker processes, and the results are written to the database in
+    batches using :func:`create_many`.  The number of files being processed at
+    any one time is bounded, so memory use stays constant regardless of the
+    size of the dataset.  Files that can't be decoded are logged and skipped.
+
+    Each observation stores the file as content, and the SHA-256 hash of the
+    original file as the "sha256" attribute.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    fs: :class:`gridfs.GridFS`, required
+    source: str or sequence of str, required
+        Directory to be searched recursively for JPEG, PNG, and Numpy (.npy)
+        files, path to a manifest file containing one file path per line, or
+        sequence of file paths.
+    key: str, optional
+        Content key used to store each file.
+    tags: list of str, optional
+        Tags to be stored with every observation.
+    size: int, optional
+        If specified, images larger than `size` along either axis are resized
+        to fit, preserving their aspect ratio.
+    processes: int, optional
+        Number of worker processes.  Defaults to the number of CPUs.
+    batch_size: int, optional
+        Number of observations to write at a time.
+    max_pending: int, optional
+        Maximum number of files being processed at once.  Defaults to four per
+        worker process.
+    checkpoint: str, optional
+        Path to a checkpoint file.  The paths of files are appended to the
+        checkpoint after their observations have been written, and files
+        already listed in it are skipped, so an interrupted ingest can be
+        resumed by running it again with the same checkpoint.
+    deduplicate: bool, optional
+        If `True`, use content-addressed storage (see
+        :func:`samlab.serialize.content_addressed`), so files whose content is
+        already in the database aren't stored again.
+
+    Returns
+    -------
+    count: int
+        Number of observations created.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(isinstance(fs, gridfs.GridFS))
+    assert(isinstance(key, str))
+    if tags is None:
+        tags = []
+    assert(isinstance(tags, list))
+    assert(size is None or (isinstance(size, int) and size > 0))
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = processes * 4
+
+    completed = set()
+    if checkpoint is not None and os.path.exists(checkpoint):
+        with open(checkpoint, "r") as stream:
+            completed = set([line.rstrip("\n") for line in stream])
+        log.info("Skipping %s files listed in checkpoint %s.", len(completed), checkpoint)
+
+    checkpoint_stream = open(checkpoint, "a") if checkpoint is not None else None
+    batch = {}
+    count = 0
+
+    try:
+        with create_many(database, fs, batch_size=batch_size) as observations:
+            def commit():
+                nonlocal count
+                observations.flush()
+                failed = set([oid for oid, e in observations.failures])
+                written = [path for oid, path in batch.items() if oid not in failed]
+                if checkpoint_stream is not None and written:
+                    checkpoint_stream.write("".join([path + "\n" for path in written]))
+                    checkpoint_stream.flush()
+                    os.fsync(checkpoint_stream.fileno())
+                count += len(written)
+                batch.clear()
+                log.info("Ingested %s observations.", count)
+
+            def write(path, content, digest, error):
+                if error is not None:
+                    log.error("Couldn't ingest %s: %s", path, error)
+                    return
+                oid = observations.create(attributes={"sha256": digest}, content={key: content}, tags=list(tags))
+                batch[oid] = path
+                if len(batch) >= batch_size:
+                    commit()
+
+            work = ((path, (path, size, deduplicate)) for path in _ingest_paths(source) if path not in completed)
+            for path, result in _map_ordered(_ingest_load, work, processes, max_pending):
+                write(*result)
+            commit()
+    finally:
+        if checkpoint_stream is not None:
+            checkpoint_stream.close()
+
+    return count
+
+
 def delete(database, fs, oid):
     """Delete an observation from the :ref:`database <database>`.
 
@@ -175,64 +483,157 @@ def delete(database, fs, oid):
     assert(isinstance(fs, gridfs.GridFS))
     assert(isinstance(oid, bson.objectid.ObjectId))
 
-    # Delete favorites pointing to this observation
-    database.favorites.delete_many({"otype": "observations", "oid": str(oid)})
-    # Delete content owned by this observation
-    for observation in database.observations.find({"_id": oid}):
-        for key, value in observation["content"].items():
-            fs.delete(value["data"])
-    # Delete the observation
-    database.observations.delete_many({"_id": oid})
+    samlab.object.delete_many(database, fs, "observations", filter={"_id": oid})
+
+
+def delete_many(database, fs, filter=None, search=None, chunk_size=1000):
+    """Delete every observation that matches a filter and/or search expression.
+
+    See :func:`samlab.object.delete_many` for details.
+
+    Returns
+    -------
+    count: int
+        Number of observations deleted.
+    """
+    return samlab.object.delete_many(database, fs, "observations", filter=filter, search=search, chunk_size=chunk_size)
+
+
+def _update_apply(updater, documents):
+    return [updater(document) for document in documents]
+
+
+def _update_change(database, fs, snapshot, modified, indexed):
+    if modified["_id"] != snapshot["_id"]:
+        raise ValueError("Cannot change observation ID.")
+    if "created" in snapshot and modified.get("created") != snapshot["created"]:
+        raise ValueError("Cannot change observation creation timestamp.")
+
+    if "tags" in modified:
+        modified["tags"] = sorted(set(modified["tags"]))
+    if "content" in modified:
+        for key, value in modified["content"].items():
+            if not isinstance(value["data"], bson.objectid.ObjectId):
+                modified["content"][key] = samlab.object.put_content(database, fs, value)
+
+    change = {"$set": {}}
+    for field in ["attributes", "content", "tags"]:
+        if field in snapshot and field in modified and bson.BSON.encode({field: modified[field]}) != snapshot[field]:
+            change["$set"][field] = modified[field]
 
+    if not change["$set"]:
+        return None, []
 
-def update(database, fs, updater, filter=None, sort=None):
+    # Content that was replaced or removed must be released once the change has been written.
+    released = []
+    if "content" in change["$set"]:
+        before = bson.BSON(snapshot["content"]).decode()["content"]
+        after = set([value["data"] for value in modified["content"].values()])
+        released = [value["data"] for value in before.values() if value["data"] not in after]
+
+    change["$set"]["modified"] = arrow.utcnow().datetime
+    if indexed:
+        change["$set"]["ngrams"] = samlab.ngram.ngrams(modified, indexed)
+    return pymongo.UpdateOne({"_id": modified["_id"]}, change), released
+
+
+def update(database, fs, updater, filter=None, sort=None, projection=None, processes=None, chunk_size=1000):
     """Make changes to observations stored in the database.
 
+    The `updater` callable is called once for every matching observation, and
+    may modify the observation in-place and return it, or return `None` to
+    leave it unchanged.  Changes to observation attributes, content, and tags
+    are written back to the database in bulk.
+
     Parameters
     ----------
     database: database object returned by :func:`samlab.database.connect`, required.
+    fs: :class:`gridfs.GridFS`, required
+    updater: callable, required
+        Called with each observation, returning the modified observation or `None`.
     filter: filter specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
     sort: sort specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
+    projection: projection specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
+        Limits the fields passed to `updater`, which can greatly reduce the
+        amount of data retrieved.  Only fields included in the projection can
+        be changed.
+    processes: int, optional
+        If specified, run `updater` on observations in parallel using this many
+        worker processes.  The updater must be picklable, such as a
+        module-level function.
+    chunk_size: int, optional
+        Maximum number of observations per bulk write, and per batch of work
+        sent to a worker process.
+
+    Returns
+    -------
+    count: int
+        Number of observations changed.
     """
     assert(isinstance(database, pymongo.database.Database))
     assert(isinstance(fs, gridfs.GridFS))
+    assert(processes is None or (isinstance(processes, int) and processes > 0))
+    assert(isinstance(chunk_size, int) and chunk_size > 0)
 
     if filter is None:
         filter = {}
 
-    cursor = database.observations.find(filter=filter, sort=sort)
-
-    for original in cursor:
-        modified = updater(copy.deepcopy(original))
-
-        if modified is not None:
-            if modified["_id"] != original["_id"]:
-                raise ValueError("Cannot change observation ID.")
-            if modified["created"] != original["created"]:
-                raise ValueError("Cannot change observation creation timestamp.")
+    # Trigrams can only be computed inline when the updater sees whole observations.
+    indexed = samlab.ngram.indexed_fields(database, "observations") if projection is None else []
+    cursor = database.observations.find(filter=filter, sort=sort, projection=projection, batch_size=chunk_size)
 
-            modified["tags"] = list(set(modified["tags"]))
+    # Observations are encoded before the updater sees them, which is much cheaper than a deep copy.
+    def snapshot(document):
+        result = {field: bson.BSON.encode({field: document[field]}) for field in ["attributes", "content", "tags"] if field in document}
+        result["_id"] = document["_id"]
+        if "created" in document:
+            result["created"] = document["created"]
+        return result
 
-            change = {"$set": {}}
-            if modified["attributes"] != original["attributes"]:
-                change["$set"]["attributes"] = modified["attributes"]
-            if modified["content"] != original["content"]:
-                for key, value in modified["content"].items():
-                    if not isinstance(value["data"], bson.objectid.ObjectId):
-                        value["data"] = fs.put(value["data"])
-                change["$set"]["content"] = modified["content"]
-            if modified["tags"] != original["tags"]:
-                change["$set"]["tags"] = modified["tags"]
-
-            if change["$set"]:
-                change["$set"]["modified"] = arrow.utcnow().datetime
-
-            if change["$set"]:
-                database.observations.update_one({"_id": original["_id"]}, change)
-                #changes.append(pymongo.UpdateOne({"_id": original["_id"]}, change))
-
-
-def set_tag(database, tag, state, filter=None, sort=None):
+    requests = []
+    oids = []
+    released = []
+    count = 0
+
+    def flush():
+        nonlocal count
+        count += database.observations.bulk_write(requests, ordered=False).modified_count
+        # Only release replaced content after the observations no longer refer to it.
+        samlab.object.release_content(database, fs, released)
+        if projection is not None:
+            samlab.ngram.refresh(database, "observations", {"_id": {"$in": oids}})
+        del requests[:]
+        del oids[:]
+        del released[:]
+
+    def apply(snapshots, modified):
+        for before, after in zip(snapshots, modified):
+            if after is None:
+                continue
+            request, fids = _update_change(database, fs, before, after, indexed)
+            if request is not None:
+                requests.append(request)
+                oids.append(before["_id"])
+                released.extend(fids)
+        if len(requests) >= chunk_size:
+            flush()
+
+    work = (([snapshot(document) for document in chunk], (updater, chunk)) for chunk in _chunks(cursor, chunk_size))
+    for snapshots, modified in _map_ordered(_update_apply, work, processes, processes * 2 if processes else None):
+        apply(snapshots, modified)
+
+    if requests:
+        flush()
+
+    log.info("Updated %s observations.", count)
+    return count
+
+
+def _set_tag_apply(state, documents):
+    return [bool(state(document)) for document in documents]
+
+
+def set_tag(database, tag, state, filter=None, sort=None, projection=None, processes=None, chunk_size=1000):
     """Add or remove observation tags using the caller's criteria.
 
     Parameters
@@ -246,48 +647,92 @@ def set_tag(database, tag, state, filter=None, sort=None):
         adding `tag` when `state` returns True and removing `tag` if `state` returns False.
     filter: filter specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
     sort: sort specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
+    projection: projection specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
+        Limits the fields passed to `state`.  Retrieving only the fields that
+        `state` needs avoids transferring content references and large
+        attributes.
+    processes: int, optional
+        If specified, evaluate `state` in parallel using this many worker
+        processes.  `state` must be picklable, such as a module-level function.
+    chunk_size: int, optional
+        Maximum number of observations per bulk write, and per batch of work
+        sent to a worker process.
+
+    Returns
+    -------
+    count: int
+        Number of observations with the tag set, or the number of observations
+        it was removed from if `state` is False.
     """
     assert(isinstance(database, pymongo.database.Database))
     assert(isinstance(tag, str))
+    assert(processes is None or (isinstance(processes, int) and processes > 0))
+    assert(isinstance(chunk_size, int) and chunk_size > 0)
 
     if filter is None:
         filter = {}
 
     if state is True:
-        database.observations.update_many(filter=filter, update={"$addToSet": {"tags": tag}})
-        log.info("Added tag %s to %s observations." % (tag, database.observations.count(filter=filter)))
+        count = database.observations.update_many(filter=filter, update={"$addToSet": {"tags": tag}}).matched_count
+        log.info("Added tag %s to %s observations." % (tag, count))
+        return count
 
-    elif state is False:
-        database.observations.update_many(filter=filter, update={"$pull": {"tags": tag}})
-        log.info("Removed tag %s from %s observations." % (tag, database.observations.count(filter=filter)))
+    if state is False:
+        count = database.observations.update_many(filter=filter, update={"$pull": {"tags": tag}}).modified_count
+        log.info("Removed tag %s from %s observations." % (tag, count))
+        return count
 
-    else:
-        if sort is None:
-            sort = [("_id", pymongo.ASCENDING)]
+    if sort is None:
+        sort = [("_id", pymongo.ASCENDING)]
 
-        cursor = database.observations.find(filter=filter, sort=sort)
+    cursor = database.observations.find(filter=filter, sort=sort, projection=projection, batch_size=chunk_size)
 
-        add_tags = []
-        remove_tags = []
-        for observation in cursor:
-            if state(observation):
-                add_tags.append(pymongo.UpdateOne({"_id": observation["_id"]}, {"$addToSet": {"tags": tag}}))
+    added = 0
+    total = 0
+
+    def write(oids, states):
+        nonlocal added, total
+        requests = []
+        for oid, tagged in zip(oids, states):
+            if tagged:
+                requests.append(pymongo.UpdateOne({"_id": oid}, {"$addToSet": {"tags": tag}}))
             else:
-                remove_tags.append(pymongo.UpdateOne({"_id": observation["_id"]}, {"$pull": {"tags": tag}}))
+                requests.append(pymongo.UpdateOne({"_id": oid}, {"$pull": {"tags": tag}}))
+        if requests:
+            database.observations.bulk_write(requests, ordered=False)
+        added += sum(states)
+        total += len(states)
+
+    work = (([observation["_id"] for observation in chunk], (state, chunk)) for chunk in _chunks(cursor, chunk_size))
+    for oids, states in _map_ordered(_set_tag_apply, work, processes, processes * 2 if processes else None):
+        write(oids, states)
+
+    log.info("Set tag %s on %s of %s observations." % (tag, added, total))
+    return added
+
 
-        if add_tags:
-            database.observations.bulk_write(add_tags)
-        if remove_tags:
-            database.observations.bulk_write(remove_tags)
-        log.info("Set tag %s on %s of %s observations." % (tag, len(add_tags), cursor.count()))
+def _resize_image(data, size):
+    import PIL.Image
+
+    try:
+        with PIL.Image.open(io.BytesIO(data)) as image:
+            return samlab.serialize.image(image.resize(size, resample=PIL.Image.BICUBIC)), None
+    except Exception as e:
+        return None, "%s: %s" % (type(e).__name__, e)
 
 
-def resize_images(database, size, target_key, source_key="original", filter=None, overwrite=False):
+def resize_images(database, size, target_key, source_key="original", filter=None, overwrite=False, processes=None, chunk_size=100):
     """Add resized images to existing observations
 
     Use this function to resize / resample images when the originals aren't the
     correct size for training.
 
+    Images are decoded, resized, and encoded by a pool of worker processes,
+    and the results are written to the database in chunks as they complete.
+    Since observations that already have resized images are skipped (unless
+    `overwrite` is `True`), an interrupted run can be resumed by running it
+    again.
+
     Parameters
     ----------
     database: database object returned by :func:`samlab.database.connect`, required.
@@ -297,46 +742,80 @@ def resize_images(database, size, target_key, source_key="original", filter=None
         Name of the key that will store the resized images.
     source_key: str, optional
         Name of the key that contains the existing images to be resized.
+    filter: filter specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
+    overwrite: bool, optional
+        If `True`, replace existing resized images.
+    processes: int, optional
+        Number of worker processes.  Defaults to the number of CPUs.
+    chunk_size: int, optional
+        Maximum number of observations per bulk write.
+
+    Returns
+    -------
+    count: int
+        Number of images resized.
     """
     assert(isinstance(database, pymongo.database.Database))
     assert(isinstance(size, tuple))
     assert(len(size) == 2)
     assert(isinstance(target_key, str))
     assert(isinstance(source_key, str))
-
-    import PIL.Image
+    assert(isinstance(chunk_size, int) and chunk_size > 0)
+    if processes is None:
+        processes = os.cpu_count() or 1
 
     fs = gridfs.GridFS(database)
 
-    cursor = database.observations.find(filter=filter)
+    query = {"content." + source_key: {"$exists": True}}
+    if not overwrite:
+        query["content." + target_key] = {"$exists": False}
+    if filter:
+        query = {"$and": [filter, query]}
 
-    progress = samlab.Progress(
-        total=cursor.count(),
-        step_message="Completed image resizing for {count} of {total} observations in {elapsed:.1f}s ({rate:.2f} observations/s).",
-        log=log,
-        )
+    total = database.observations.count_documents(query)
+    log.info("Resizing images for %s observations.", total)
 
     requests = []
-    for observation in cursor:
-        content = dict(observation["content"]) # Force a deep-copy
-
-        if target_key in content and not overwrite:
-            continue
-
-        try:
-            image = samlab.deserialize.image(fs, content[source_key])
-        except Exception as e:
-            log.error("Couldn't load observation %s image %s: %s", observation["_id"], content[source_key], e)
-            continue
-        image = image.resize(size, resample=PIL.Image.BICUBIC)
-        content[target_key] = samlab.serialize.image(image)
-        content[target_key]["data"] = fs.put(content[target_key]["data"])
-
-        requests.append(pymongo.UpdateOne({"_id": observation["_id"]}, {"$set": {"content": content}}))
-
-        progress.step()
+    replaced = []
+    count = 0
+    start = time.time()
+
+    def flush():
+        nonlocal count
+        database.observations.bulk_write(requests, ordered=False)
+        # Only remove replaced images after the observations no longer refer to them.
+        samlab.object.release_content(database, fs, replaced)
+        count += len(requests)
+        del requests[:]
+        del replaced[:]
+        elapsed = time.time() - start
+        log.info("Completed image resizing for %s of %s observations in %.1fs (%.2f observations/s).", count, total, elapsed, count / elapsed if elapsed else 0)
+
+    def write(observation, image, error):
+        if error is not None:
+            log.error("Couldn't resize observation %s image %s: %s", observation["_id"], observation["content"][source_key], error)
+            return
+        requests.append(pymongo.UpdateOne({"_id": observation["_id"]}, {"$set": {"content." + target_key: samlab.object.put_content(database, fs, image)}}))
+        if target_key in observation["content"]:
+            replaced.append(observation["content"][target_key]["data"])
+        if len(requests) >= chunk_size:
+            flush()
+
+    cursor = database.observations.find(query, projection={"content." + source_key: True, "content." + target_key: True})
+
+    def work():
+        for observation in cursor:
+            try:
+                data = samlab.deserialize.stream(fs, observation["content"][source_key]).read()
+            except Exception as e:
+                log.error("Couldn't load observation %s image %s: %s", observation["_id"], observation["content"][source_key], e)
+                continue
+            yield observation, (data, size)
 
-    database.observations.bulk_write(requests)
-    progress.finish()
+    for observation, (image, error) in _map_ordered(_resize_image, work(), processes, processes * 4):
+        write(observation, image, error)
 
+    if requests:
+        flush()
 
+    return count
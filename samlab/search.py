@@ -2,81 +2,196 @@
 # (NTESS).  Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
 # Government retains certain rights in this software.
 
+"""Parses search expressions.
+
+Search expressions combine terms and field predicates using `and`, `or`,
+`not`, and parentheses.  A term (a bare word or "quoted string") matches
+objects that contain it in their text, have it as a tag or id, or contain it
+as a substring of any fields with trigram indexing (see :mod:`samlab.ngram`).
+Terms don't match content or attribute keys; use a predicate such as
+`content.original != null` instead.  A predicate compares a field (using MongoDB dotted notation, such as
+`attributes.score` or `created`) to a value:
+
+* `field = value`, `field != value`, `field < value`, `field <= value`, `field > value`, `field >= value`
+* `field in (value, value, ...)`
+* `field between value and value`
+* `field startswith value`
+
+Values may be numbers, dates in ISO-8601 format (`2026-01-01`,
+`2026-01-01T12:30`), `true`, `false`, `null`, bare words, or quoted strings.
+"""
+
+import functools
+import threading
+
+import arrow
 from pyparsing import *
 
-def parser():
-    """Return an object that can parse search expressions.
+# Packrat parsing avoids re-parsing the same sub-expressions at every precedence level of infixNotation.
+ParserElement.enablePackrat()
 
-    Returns
-    -------
-    parser: `pyparsing.ParserElement`
-        The returned object can be used to parse a search expression using
-        `parser.parse(expression)`, which will return a parse tree.  Use the
-        `accept(visitor)` method of the parse tree to access its contents.
+
+class SearchError(ParseException):
+    """Raised when a valid search expression can't be compiled into a query.
+
+    Derived from :class:`pyparsing.ParseException`, so callers can handle
+    every kind of invalid search the same way.
     """
+    def __init__(self, expression, msg):
+        ParseException.__init__(self, expression, 0, msg)
+
+    def __str__(self):
+        return self.msg
+
+
+class ParseElement(object):
+    def accept(self, visitor):
+        raise NotImplementedError()
+
+
+class UnaryOperation(ParseElement):
+    def __init__(self, tokens):
+        self.operation, self.operand = tokens[0]
+
+    def __repr__(self):
+        return "%s(%s)" % (self.operation, self.operand)
+
+
+class BinaryOperation(ParseElement):
+    def __init__(self, tokens):
+        self.operation = tokens[0][1]
+        self.operands = tokens[0][0::2]
+
+    def __repr__(self):
+        return "%s(%s)" % (self.operation, ", ".join([str(operand) for operand in self.operands]))
+
+
+class SearchAnd(BinaryOperation):
+    def accept(self, visitor):
+        visitor.visit_and(self.operands)
+        return visitor
+
 
-    class ParseElement(object):
-        def accept(self, visitor):
-            raise NotImplementedError()
+class SearchNot(UnaryOperation):
+    def accept(self, visitor):
+        visitor.visit_not(self.operand)
+        return visitor
 
-    class UnaryOperation(ParseElement):
-        def __init__(self, tokens):
-            self.operation, self.operand = tokens[0]
 
-        def __repr__(self):
-            return "%s(%s)" % (self.operation, self.operand)
+class SearchOr(BinaryOperation):
+    def accept(self, visitor):
+        visitor.visit_or(self.operands)
+        return visitor
 
-    class BinaryOperation(ParseElement):
-        def __init__(self, tokens):
-            self.operation = tokens[0][1]
-            self.operands = tokens[0][0::2]
 
-        def __repr__(self):
-            return "%s(%s)" % (self.operation, ", ".join([str(operand) for operand in self.operands]))
+class SearchTerm(ParseElement):
+    def __init__(self, tokens):
+        self.term = tokens[0]
 
-    class SearchAnd(BinaryOperation):
-        def accept(self, visitor):
-            visitor.visit_and(self.operands)
-            return visitor
+    def accept(self, visitor):
+        visitor.visit_term(self.term)
+        return visitor
 
-    class SearchNot(UnaryOperation):
-        def accept(self, visitor):
-            visitor.visit_not(self.operand)
-            return visitor
+    def __repr__(self):
+        return repr(self.term)
 
-    class SearchOr(BinaryOperation):
-        def accept(self, visitor):
-            visitor.visit_or(self.operands)
-            return visitor
 
-    class SearchTerm(ParseElement):
-        def __init__(self, tokens):
-            self.term = tokens[0]
+class SearchPredicate(ParseElement):
+    def __init__(self, tokens):
+        self.field = tokens[0]
+        self.operator = tokens[1].lower()
+        self.values = list(tokens[2:])
 
-        def accept(self, visitor):
-            visitor.visit_term(self.term)
-            return visitor
+    def accept(self, visitor):
+        visitor.visit_predicate(self.field, self.operator, self.values)
+        return visitor
 
-        def __repr__(self):
-            return repr(self.term)
+    def __repr__(self):
+        return "%s(%r, %s)" % (self.operator, self.field, ", ".join([repr(value) for value in self.values]))
 
-    class SearchParser(object):
-        def __init__(self, search_expression):
-            self._search_expression = search_expression
 
-        def parse(self, expression):
-            return self._search_expression.parseString(expression, parseAll=True)[0]
+def _date_value(text, location, tokens):
+    try:
+        return arrow.get(tokens[0]).datetime
+    except (arrow.parser.ParserError, ValueError) as e:
+        # Don't let the date be parsed as a string instead.
+        raise ParseFatalException(text, location, "Invalid date %r: %s" % (tokens[0], e))
 
-    search_term = Word(printables, excludeChars='"') | QuotedString(quoteChar='"')
+
+def _grammar():
+    search_term = Word(printables, excludeChars='"()') | QuotedString(quoteChar='"')
     search_term.setParseAction(SearchTerm)
 
-    search_expression = infixNotation(search_term, [
+    # Typed values.  Numbers and dates must not be followed by other word characters.
+    boundary = r"(?![^\s(),])"
+    date_value = Regex(r"\d{4}-\d{2}-\d{2}(T\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?)?" + boundary)
+    date_value.setParseAction(_date_value)
+    number_value = Regex(r"[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?" + boundary)
+    number_value.setParseAction(lambda tokens: float(tokens[0]) if set(tokens[0]) & set(".eE") else int(tokens[0]))
+    constant_value = CaselessKeyword("true") | CaselessKeyword("false") | CaselessKeyword("null")
+    # Return a list, because pyparsing ignores parse actions that return None.
+    constant_value.setParseAction(lambda tokens: [{"true": True, "false": False, "null": None}[tokens[0].lower()]])
+    string_value = QuotedString(quoteChar='"') | Word(printables, excludeChars='"(),')
+    value = date_value | number_value | constant_value | string_value
+
+    field = Regex(r"[A-Za-z_][\w\-]*(\.[\w\-]+)*")
+    comparison = field + oneOf("= != < <= > >=") + value
+    membership = field + CaselessKeyword("in") + Suppress("(") + delimitedList(value) + Suppress(")")
+    between = field + CaselessKeyword("between") + value + Suppress(CaselessKeyword("and")) + value
+    prefix = field + CaselessKeyword("startswith") + string_value
+    search_predicate = comparison | membership | between | prefix
+    search_predicate.setParseAction(SearchPredicate)
+
+    search_expression = infixNotation(search_predicate | search_term, [
         (CaselessKeyword("not")("not"), 1, opAssoc.RIGHT, SearchNot),
         (CaselessKeyword("and")("and"), 2, opAssoc.LEFT, SearchAnd),
         (CaselessKeyword("or")("or"), 2, opAssoc.LEFT, SearchOr),
     ])
+    search_expression.streamline()
+
+    return search_expression
+
+
+_search_expression = _grammar()
+_search_expression_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse(expression):
+    with _search_expression_lock:
+        try:
+            return _search_expression.parseString(expression, parseAll=True)[0]
+        except ParseFatalException as e:
+            # Callers only need to handle one type of exception for invalid searches.
+            raise ParseException(e.pstr, e.loc, e.msg)
+
+
+class SearchParser(object):
+    def parse(self, expression):
+        """Parse a search expression, returning a parse tree.
+
+        Parse trees are cached, so repeated searches skip parsing entirely.  The
+        returned parse tree is shared, and must not be modified.
+        """
+        return _parse(expression)
+
+
+_parser = SearchParser()
+
+
+def parser():
+    """Return an object that can parse search expressions.
+
+    Returns
+    -------
+    parser: :class:`SearchParser`
+        The returned object can be used to parse a search expression using
+        `parser.parse(expression)`, which will return a parse tree.  Use the
+        `accept(visitor)` method of the parse tree to access its contents.
+        The parser is shared and safe to use from multiple threads.
+    """
+    return _parser
 
-    return SearchParser(search_expression)
 
 if __name__ == "__main__":
     p = parser()
@@ -112,6 +227,9 @@ if __name__ == "__main__":
         def visit_term(self, term):
             self._stack.append([term])
 
+        def visit_predicate(self, field, operator, values):
+            self._stack.append([operator, field] + values)
+
 
     for test in [
         'foo',
@@ -131,6 +249,12 @@ if __name__ == "__main__":
         'foo and not bar',
         'not foo and not bar',
         'not (foo or bar)',
+        'attributes.score > 0.9',
+        'created >= 2026-01-01',
+        'attributes.label in (cat, "hot dog", 3)',
+        'attributes.score between 0.1 and 0.9 and foo',
+        'content.original.filename startswith IMG_',
+        'not attributes.reviewed = true',
         ]:
         results = p.parse(test)
         print(test, "->", results)
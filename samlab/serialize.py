@@ -6,12 +6,14 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import hashlib
 import io
 import inspect
 import json as pyjson
 import logging
 import os
 import tempfile
+import zlib
 
 import numpy
 import pymongo
@@ -33,11 +35,48 @@ def array(value):
     content: dict
         Serialized in-memory representation of the array that can be used with :func:`samlab.observation.create`, :func:`samlab.observation.create_many`, :func:`samlab.experiment.create`, and :func:`samlab.artifact.create`.
     """
+    value = numpy.asanyarray(value)
     stream = io.BytesIO()
     numpy.save(stream, value)
     return {
         "data": stream.getvalue(),
         "content-type": "application/x-numpy-array",
+        "metadata": array_metadata(value),
+    }
+
+
+def _scalar(value):
+    value = value.item()
+    if isinstance(value, int) and not -2**63 <= value < 2**63:
+        return float(value)
+    return value
+
+
+def array_metadata(value):
+    """Summarize a numpy array, for storage alongside its serialized content.
+
+    Parameters
+    ----------
+    value: :class:`numpy.ndarray`, required
+        The array to be summarized.
+
+    Returns
+    -------
+    metadata: dict
+        Array dtype, ndim, shape, and size, plus min, mean, max, and sum for
+        numeric arrays (`None` for empty or non-numeric arrays).
+    """
+    value = numpy.asanyarray(value)
+    numeric = value.size and (numpy.issubdtype(value.dtype, numpy.integer) or numpy.issubdtype(value.dtype, numpy.floating) or numpy.issubdtype(value.dtype, numpy.bool_))
+    return {
+        "dtype": value.dtype.name,
+        "ndim": value.ndim,
+        "shape": list(value.shape),
+        "size": value.size,
+        "min": _scalar(value.min()) if numeric else None,
+        "mean": float(value.mean()) if numeric else None,
+        "max": _scalar(value.max()) if numeric else None,
+        "sum": float(value.sum()) if numeric else None,
     }
 
 
@@ -51,12 +90,44 @@ def arrays(*args, **kwargs):
     """
     stream = io.BytesIO()
     numpy.savez(stream, *args, **kwargs)
+
+    # Use the same array names as numpy.savez().
+    named = dict(kwargs)
+    for index, value in enumerate(args):
+        named["arr_%d" % index] = value
+
     return {
         "data": stream.getvalue(),
         "content-type": "application/x-numpy-arrays",
+        "metadata": arrays_metadata(named),
     }
 
 
+def arrays_metadata(values):
+    """Summarize a collection of numpy arrays, for storage alongside their serialized content.
+
+    Parameters
+    ----------
+    values: dict-like mapping of names to :class:`numpy.ndarray`, required
+        The arrays to be summarized.
+
+    Returns
+    -------
+    metadata: list of dict
+        Name, dtype, shape, and size of each array.
+    """
+    metadata = []
+    for key in values.keys():
+        value = numpy.asanyarray(values[key])
+        metadata.append({
+            "key": key,
+            "dtype": value.dtype.name,
+            "shape": list(value.shape),
+            "size": value.size,
+            })
+    return metadata
+
+
 def attributes(value):
     """Copy an arbitrary data structure with modifications so it can be stored in the database.
 
@@ -90,6 +161,86 @@ def attributes(value):
     return value
 
 
+def compressed(content, codec="zstd", level=None):
+    """Compress serialized content for storage in the database.
+
+    The codec is recorded with the stored content, and :mod:`samlab.deserialize`
+    and the dashboard decompress it transparently.  Compression works well for
+    content such as sparse masks, logits, and JSON documents, but is pointless
+    for content that is already compressed, such as JPEG and PNG images.
+
+    Examples
+    --------
+
+    >>> samlab.observation.create(database, fs, content={"mask": samlab.serialize.compressed(samlab.serialize.array(mask))})
+
+    Parameters
+    ----------
+    content: dict, required
+        Serialized content created using other functions in this module.
+    codec: str, optional
+        Compression codec.  One of "zstd" (requires the `zstandard` package),
+        "lz4" (requires the `lz4` package), or "zlib".
+    level: int, optional
+        Codec-specific compression level, or `None` to use the codec's default.
+
+    Returns
+    -------
+    content: dict
+        Copy of `content` with compressed data, and the size of the original data.
+    """
+    content = dict(content)
+    data = content["data"]
+    if not isinstance(data, (bytes, bytearray)):
+        data = data.read()
+
+    if codec == "zstd":
+        import zstandard
+        compressed_data = zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+    elif codec == "lz4":
+        import lz4.frame
+        compressed_data = lz4.frame.compress(data, compression_level=0 if level is None else level)
+    elif codec == "zlib":
+        compressed_data = zlib.compress(data, -1 if level is None else level)
+    else:
+        raise ValueError("Unknown codec: %s" % codec)
+
+    content["decoded-length"] = len(data)
+    content["data"] = compressed_data
+    content["content-encoding"] = codec
+    return content
+
+
+def content_addressed(content):
+    """Mark serialized content for content-addressed storage.
+
+    Content-addressed content is stored in the database once, no matter how
+    many objects it is added to; each copy just increments a reference count,
+    so storing data that is already in the database costs little more than
+    the object itself.
+
+    Examples
+    --------
+
+    >>> samlab.observation.create(database, fs, content={"image": samlab.serialize.content_addressed(samlab.serialize.image(path))})
+
+    Parameters
+    ----------
+    content: dict, required
+        Serialized content created using other functions in this module.
+
+    Returns
+    -------
+    content: dict
+        Copy of `content`, including the SHA-256 hash of its data.
+    """
+    content = dict(content)
+    if not isinstance(content["data"], (bytes, bytearray)):
+        content["data"] = content["data"].read()
+    content["sha256"] = hashlib.sha256(content["data"]).hexdigest()
+    return content
+
+
 def image(img):
     """Serialize an in-memory or on-disk image for storage in the database.
 
@@ -116,16 +267,38 @@ def image(img):
             content_type = "image/png"
         else:
             raise ValueError("Unknown image type: %s" % path)
+        # PIL only reads the image header here.
+        with PIL.Image.open(path) as header:
+            metadata = image_metadata(header)
     elif isinstance(img, PIL.Image.Image):
         path = None
         buffer = io.BytesIO()
         img.save(buffer, format="jpeg", quality=95)
         data = buffer.getvalue()
         content_type = "image/jpeg"
+        metadata = image_metadata(img)
     else:
         raise ValueError("Unknown image type: %s" % img)
 
-    return { "data": data, "content-type": content_type, "filename": path }
+    return { "data": data, "content-type": content_type, "filename": path, "metadata": metadata }
+
+
+def image_metadata(img):
+    """Summarize an image, for storage alongside its serialized content.
+
+    Parameters
+    ----------
+    img: :class:`PIL.Image.Image`, required
+
+    Returns
+    -------
+    metadata: dict
+        Image size (width, height) and mode.
+    """
+    return {
+        "size": list(img.size),
+        "mode": img.mode,
+    }
 
 
 def json(document, content_type="application/json"):
@@ -6,10 +6,20 @@
 """
 
 import collections
+import concurrent.futures
 import logging
+import os
 import subprocess
 
+import bson.objectid
+import gridfs
+import numpy
+import pymongo
 import torch.cuda
+import torch.utils.data
+
+import samlab.deserialize
+import samlab.object
 
 log = logging.getLogger(__name__)
 
@@ -46,3 +56,152 @@ def select_device():
     log.info("Selected device: {}".format(device))
     return device
 
+
+
+def _pack_oids(oids):
+    # Store ids as rows of raw bytes, since numpy "S12" strings drop trailing NUL bytes.
+    return numpy.frombuffer(b"".join([oid.binary for oid in oids]), dtype=numpy.uint8).reshape(-1, 12)
+
+
+def _unpack_oid(oids, index):
+    return bson.objectid.ObjectId(oids[index].tobytes())
+
+
+def _decode(fs, content):
+    if content["content-type"] in ["image/jpeg", "image/png"]:
+        return samlab.deserialize.image(fs, content)
+    if content["content-type"] == "application/x-numpy-array":
+        return samlab.deserialize.array(fs, content)
+    if content["content-type"] == "application/x-numpy-arrays":
+        return samlab.deserialize.arrays(fs, content)
+    return samlab.deserialize.stream(fs, content).read()
+
+
+class ObservationDataset(torch.utils.data.Dataset):
+    """Pytorch dataset containing observations that match a search or filter.
+
+    Matching observation ids are resolved once, when the dataset is created,
+    and stored in a compact array.  Each process that uses the dataset (such
+    as :class:`torch.utils.data.DataLoader` workers) opens its own database
+    connection the first time it retrieves an item, so the dataset is safe
+    to use with multiple workers.  When a data loader requests a batch, the
+    observations are retrieved with a single query and their content is read
+    concurrently.
+
+    Each item is a dict containing the observation "_id" (as a string),
+    "attributes", "tags", and "content", where "content" maps each content key
+    to its decoded value.  By default images are decoded to
+    :class:`PIL.Image.Image`, arrays to :class:`numpy.ndarray`, and other
+    content to bytes.
+
+    Examples
+    --------
+
+    >>> dataset = samlab.torch.ObservationDataset(search="training and attributes.label != null", keys=["original"], transform=lambda item: (to_tensor(item["content"]["original"]), item["attributes"]["label"]))
+    >>> loader = torch.utils.data.DataLoader(dataset, batch_size=64, shuffle=True, num_workers=8)
+
+    Parameters
+    ----------
+    search: str, optional
+        Search expression, see :mod:`samlab.search`.
+    filter: filter specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
+        Combined with `search` if both are specified.
+    keys: list of str, optional
+        Content keys to be retrieved and decoded.  Defaults to every content key.
+    decoders: dict, optional
+        Maps content keys to callables that will be called with
+        :class:`gridfs.GridFS` and a content object, returning the decoded content.
+    transform: callable, optional
+        Called with each item, returning the sample that will be returned by the dataset.
+    sort: sort specification compatible with :meth:`pymongo.collection.Collection.find`, optional.
+        Determines the order of the observations in the dataset.  Defaults to sorting by id.
+    threads: int, optional
+        Maximum number of content items to read concurrently.
+    name: str, optional
+        Database name, see :func:`samlab.database.connect`.
+    uri: str, optional
+        Database uri, see :func:`samlab.database.connect`.
+    replicaset: str, optional
+        Database replica set, see :func:`samlab.database.connect`.
+    """
+    def __init__(self, search=None, filter=None, keys=None, decoders=None, transform=None, sort=None, threads=4, name="samlab", uri="mongodb://localhost:27017", replicaset="samlab"):
+        assert(search is None or isinstance(search, str))
+        assert(filter is None or isinstance(filter, dict))
+        assert(keys is None or isinstance(keys, list))
+        assert(decoders is None or isinstance(decoders, dict))
+        assert(isinstance(threads, int) and threads > 0)
+
+        self._keys = keys
+        self._decoders = decoders or {}
+        self._transform = transform
+        self._threads = threads
+        self._connection = (name, uri, replicaset)
+        self._pid = None
+
+        if sort is None:
+            sort = [("_id", pymongo.ASCENDING)]
+        if search is None and filter is None:
+            filter = {}
+
+        database, fs = self._connect()
+        oids = [observation["_id"] for observation in samlab.object.iterate(database, "observations", filter=filter, search=search, projection={"_id": True}, sort=sort)]
+        self._oids = _pack_oids(oids)
+        log.info("Created dataset with %s observations.", len(self._oids))
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        for key in ["_database", "_fs", "_executor"]:
+            state.pop(key, None)
+        state["_pid"] = None
+        return state
+
+    def _connect(self):
+        # Connections can't be shared across a fork, so each worker process opens its own.
+        if self._pid != os.getpid():
+            name, uri, replicaset = self._connection
+            self._database = pymongo.MongoClient(uri, replicaset=replicaset)[name]
+            self._fs = gridfs.GridFS(self._database)
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._threads)
+            self._pid = os.getpid()
+        return self._database, self._fs
+
+    def __len__(self):
+        return len(self._oids)
+
+    def __getitem__(self, index):
+        return self.__getitems__([index])[0]
+
+    def __getitems__(self, indices):
+        database, fs = self._connect()
+
+        oids = [_unpack_oid(self._oids, index) for index in indices]
+        projection = {"attributes": True, "tags": True}
+        if self._keys is None:
+            projection["content"] = True
+        else:
+            projection.update({"content." + key: True for key in self._keys})
+        observations = list(samlab.object.iterate(database, "observations", oids=oids, projection=projection, batch_size=max(1, len(oids))))
+
+        for oid, observation in zip(oids, observations):
+            if observation is None:
+                raise KeyError(oid)
+
+        def decode(observation):
+            content = observation.get("content", {})
+            keys = self._keys if self._keys is not None else sorted(content.keys())
+            return {key: self._decoders.get(key, _decode)(fs, content[key]) for key in keys}
+
+        contents = list(self._executor.map(decode, observations))
+
+        items = []
+        for observation, content in zip(observations, contents):
+            item = {
+                "_id": str(observation["_id"]),
+                "attributes": observation.get("attributes", {}),
+                "tags": observation.get("tags", []),
+                "content": content,
+            }
+            if self._transform is not None:
+                item = self._transform(item)
+            items.append(item)
+        return items
@@ -0,0 +1,235 @@
+# Copyright 2018, National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS).  Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+"""Functionality for working with saved views.
+
+A saved view is a named search whose matching object ids are materialized
+in the database, so that counting and paging through the results doesn't
+require re-running the search.  The dashboard keeps saved views current by
+re-evaluating each changed object against the view searches; see
+:func:`update_object` and :func:`delete_object`.
+"""
+
+import logging
+
+import arrow
+import pymongo
+
+import samlab.object
+
+log = logging.getLogger(__name__)
+
+
+def _require_view(database, otype, name):
+    view = database.views.find_one({"otype": otype, "name": name})
+    if view is None:
+        raise KeyError(name)
+    return view
+
+
+def _write_members(database, requests):
+    try:
+        database.view_members.bulk_write(requests, ordered=False)
+    except pymongo.errors.BulkWriteError as e:
+        # Concurrent upserts of the same member can collide on the unique index, which is harmless.
+        if [error for error in e.details["writeErrors"] if error["code"] != 11000]:
+            raise
+
+
+def _materialize(database, view, chunk_size):
+    # Members are upserted in-place and stale members removed afterwards, so
+    # readers never see a partially-built view, and members added by
+    # update_object() while the view is rebuilt are kept.
+    started = arrow.utcnow().datetime
+    filter = samlab.object.search_filter(database, view["otype"], view["search"])
+    requests = []
+    count = 0
+    for obj in database[view["otype"]].find(filter, projection={"_id": True}):
+        requests.append(pymongo.UpdateOne({"view": view["_id"], "oid": obj["_id"]}, {"$set": {"refreshed": arrow.utcnow().datetime}}, upsert=True))
+        if len(requests) >= chunk_size:
+            _write_members(database, requests)
+            count += len(requests)
+            requests = []
+    if requests:
+        _write_members(database, requests)
+        count += len(requests)
+    database.view_members.delete_many({"view": view["_id"], "$or": [{"refreshed": {"$lt": started}}, {"refreshed": {"$exists": False}}]})
+
+    database.views.update_one({"_id": view["_id"]}, {"$set": {"refreshed": arrow.utcnow().datetime}})
+    log.info("Materialized %s view %r with %s members.", view["otype"], view["name"], count)
+    return count
+
+
+def create(database, otype, name, search, chunk_size=1000):
+    """Create or replace a saved view.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    name: str, required
+        Human-readable view name, unique for the object type.
+    search: str, required
+        Search expression, see :mod:`samlab.search`.
+    chunk_size: int, optional
+        Maximum number of view members to insert at a time.
+
+    Returns
+    -------
+    count: int
+        Number of objects matched by the view.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+    assert(isinstance(name, str))
+    assert(isinstance(search, str))
+
+    # Validate the search before we store it.
+    samlab.object.search_filter(database, otype, search)
+
+    database.views.update_one({"otype": otype, "name": name}, {"$set": {"otype": otype, "name": name, "search": search, "created": arrow.utcnow().datetime}}, upsert=True)
+    return _materialize(database, _require_view(database, otype, name), chunk_size)
+
+
+def delete(database, otype, name):
+    """Delete a saved view.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    name: str, required
+        Name of the view to be deleted.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+    assert(isinstance(name, str))
+
+    for view in database.views.find({"otype": otype, "name": name}):
+        database.view_members.delete_many({"view": view["_id"]})
+    database.views.delete_many({"otype": otype, "name": name})
+
+
+def refresh(database, otype, name, chunk_size=1000):
+    """Re-run a saved view's search from scratch.
+
+    Views are normally kept current automatically, so this is only needed if
+    objects were modified while the dashboard wasn't running.
+
+    Returns
+    -------
+    count: int
+        Number of objects matched by the view.
+
+    Raises
+    ------
+    KeyError, if the view doesn't exist.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+    assert(isinstance(name, str))
+
+    return _materialize(database, _require_view(database, otype, name), chunk_size)
+
+
+def count(database, otype, name):
+    """Return the number of objects in a saved view.
+
+    Raises
+    ------
+    KeyError, if the view doesn't exist.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+    assert(isinstance(name, str))
+
+    view = _require_view(database, otype, name)
+    return database.view_members.count_documents({"view": view["_id"]})
+
+
+def page(database, otype, name, skip=0, limit=100, after=None):
+    """Return the ids of a page of objects in a saved view, sorted by id.
+
+    Parameters
+    ----------
+    database: database object returned by :func:`samlab.database.connect`, required
+    otype: str, required
+        Object type.  One of "observations", "experiments", or "artifacts".
+    name: str, required
+        View name.
+    skip: int, optional
+        Number of objects to skip.
+    limit: int, optional
+        Maximum number of objects to return.
+    after: :class:`bson.objectid.ObjectId`, optional
+        If specified, return objects with ids greater than `after`.  This is
+        more efficient than `skip` for paging through large views.
+
+    Returns
+    -------
+    oids: list of :class:`bson.objectid.ObjectId`
+
+    Raises
+    ------
+    KeyError, if the view doesn't exist.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+    assert(isinstance(name, str))
+
+    view = _require_view(database, otype, name)
+    filter = {"view": view["_id"]}
+    if after is not None:
+        filter["oid"] = {"$gt": samlab.object.require_objectid(after)}
+    cursor = database.view_members.find(filter, projection={"oid": True}, sort=[("oid", pymongo.ASCENDING)], skip=skip, limit=limit)
+    return [member["oid"] for member in cursor]
+
+
+def update_object(database, otype, oid):
+    """Re-evaluate an inserted or modified object against every saved view.
+
+    Returns
+    -------
+    views: list of str
+        Names of the views whose membership changed.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+    oid = samlab.object.require_objectid(oid)
+
+    changed = []
+    for view in database.views.find({"otype": otype}):
+        filter = samlab.object.search_filter(database, otype, view["search"], within={"_id": oid})
+        if database[otype].count_documents({"$and": [{"_id": oid}, filter]}, limit=1):
+            try:
+                result = database.view_members.update_one({"view": view["_id"], "oid": oid}, {"$set": {"refreshed": arrow.utcnow().datetime}}, upsert=True)
+            except pymongo.errors.DuplicateKeyError:
+                continue
+            if result.upserted_id is not None:
+                changed.append(view["name"])
+        else:
+            if database.view_members.delete_one({"view": view["_id"], "oid": oid}).deleted_count:
+                changed.append(view["name"])
+    return changed
+
+
+def delete_object(database, otype, oid):
+    """Remove a deleted object from every saved view.
+
+    Returns
+    -------
+    views: list of str
+        Names of the views whose membership changed.
+    """
+    assert(isinstance(database, pymongo.database.Database))
+    assert(otype in ["observations", "experiments", "artifacts"])
+    oid = samlab.object.require_objectid(oid)
+
+    changed = []
+    for view in database.views.find({"otype": otype}):
+        if database.view_members.delete_one({"view": view["_id"], "oid": oid}).deleted_count:
+            changed.append(view["name"])
+    return changed
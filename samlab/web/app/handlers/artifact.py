@@ -15,7 +15,7 @@ from samlab.web.app import application, require_auth, require_permissions
 from samlab.web.app.database import database, fs
 
 
-@application.route("/artifacts/<exclude(count,tags):oid>", methods=["GET", "DELETE"])
+@application.route("/artifacts/<exclude(batch,count,tags):oid>", methods=["GET", "DELETE"])
 @require_auth
 def get_delete_artifacts_artifact(oid):
     oid = bson.objectid.ObjectId(oid)
@@ -19,16 +19,16 @@ from samlab.web.app import application, require_auth, require_permissions
 from samlab.web.app.database import database, fs
 
 
-def get_otype_oid(otype, oid):
-    assert(isinstance(otype, str))
-    assert(isinstance(oid, bson.objectid.ObjectId))
+def json_payload():
+    """Return the JSON object in the request body, or abort with 400 if there isn't one."""
+    payload = flask.request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        flask.abort(400, "Request body must be a JSON object.")
+    return payload
 
-    require_permissions(["read"])
-
-    obj = database[otype].find_one({"_id": oid})
-    if obj is None:
-        flask.abort(404)
 
+def object_representation(obj):
+    """Convert a database object into the representation used by the browser UI."""
     obj["name"] = obj.get("name", obj["_id"])
 
     obj["attributes-pre"] = pprint.pformat(obj["attributes"], depth=1)
@@ -43,10 +43,21 @@ def get_otype_oid(otype, oid):
 
     obj["tags"] = sorted(obj.get("tags", []))
 
+    return obj
+
+
+def get_otype_oid(otype, oid):
+    assert(isinstance(otype, str))
+    assert(isinstance(oid, bson.objectid.ObjectId))
+
+    require_permissions(["read"])
+
+    obj = database[otype].find_one({"_id": oid})
+    if obj is None:
+        flask.abort(404)
+
     result = {
-        otype[:-1]: obj,
+        otype[:-1]: object_representation(obj),
     }
 
     return flask.jsonify(result)
-
-
@@ -51,7 +51,7 @@ def get_experiments():
     return flask.jsonify(experiments=experiments)
 
 
-@application.route("/experiments/<exclude(count,tags):oid>", methods=["GET", "DELETE"])
+@application.route("/experiments/<exclude(batch,count,tags):oid>", methods=["GET", "DELETE"])
 @require_auth
 def get_delete_experiments_experiment(oid):
     oid = bson.objectid.ObjectId(oid)
@@ -2,10 +2,8 @@
 # (NTESS).  Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
 # Government retains certain rights in this software.
 
-import io
 import logging
 import pprint
-import re
 
 import arrow
 import bson
@@ -13,12 +11,16 @@ import cachetools.func
 import flask
 import numpy
 import pymongo
-import toyplot.bitmap
+import pyparsing
 import toyplot.color
 import toyplot.html
 
+import samlab.derived
 import samlab.deserialize
+import samlab.ngram
 import samlab.object
+import samlab.serialize
+import samlab.web.app.handlers.common
 
 # Setup logging.
 log = logging.getLogger(__name__)
@@ -54,6 +56,14 @@ def get_otype_attributes_keys(otype):
     return flask.jsonify(keys=sorted(keys))
 
 
+def _attributes_pre(obj):
+    return pprint.pformat(obj["attributes"])
+
+
+def _attributes_summary(obj):
+    return "{" + ", ".join([key + ":&hellip;" for key in obj["attributes"]]) + "}"
+
+
 @application.route("/<allow(observations,experiments,artifacts):otype>/<oid>/attributes/pre")
 @require_auth
 def get_otype_oid_attributes_pre(otype, oid):
@@ -64,7 +74,7 @@ def get_otype_oid_attributes_pre(otype, oid):
     if obj is None:
         flask.abort(404)
 
-    response = flask.make_response(pprint.pformat(obj["attributes"]))
+    response = flask.make_response(_attributes_pre(obj))
     response.headers["content-type"] = "text/plain"
     return response
 
@@ -79,8 +89,7 @@ def get_otype_oid_attributes_summary(otype, oid):
     if obj is None:
         flask.abort(404)
 
-    markup = "{" + ", ".join([key + ":&hellip;" for key in obj["attributes"]]) + "}"
-    response = flask.make_response(markup)
+    response = flask.make_response(_attributes_summary(obj))
     response.headers["content-type"] = "text/html"
     return response
 
@@ -97,88 +106,231 @@ def get_otype_content_keys(otype):
     return flask.jsonify(keys=sorted(keys))
 
 
+def _content_etag(data):
+    # GridFS files are never modified in-place, so the file id is a strong validator.
+    return str(data._id)
+
+
+def _content_ranges(header, length, limit=16):
+    """Parse an HTTP Range header.
+
+    Returns a sorted list of non-overlapping (begin, end) tuples with exclusive
+    ends, an empty list if the header should be ignored, or None if none of the
+    ranges can be satisfied.  Headers containing more than `limit` ranges are
+    ignored, so clients can't make us send the same content many times over.
+    """
+    units, _, specs = header.partition("=")
+    if units.strip().lower() != "bytes":
+        return []
+
+    specs = [spec.strip() for spec in specs.split(",") if spec.strip()]
+    if len(specs) > limit:
+        return []
+
+    ranges = []
+    for spec in specs:
+        first, separator, last = spec.partition("-")
+        if not separator:
+            return []
+        try:
+            if first.strip():
+                begin = int(first)
+                end = int(last) + 1 if last.strip() else None
+                if end is not None and end <= begin:
+                    return []
+            else:
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                begin = max(0, length - suffix)
+                end = length
+        except ValueError:
+            return []
+        if begin >= length:
+            continue
+        ranges.append((begin, length if end is None else min(end, length)))
+
+    if not ranges:
+        return None
+
+    # Merge overlapping and adjacent ranges.
+    merged = []
+    for begin, end in sorted(ranges):
+        if merged and begin <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((begin, end))
+    return merged
+
+
+def _content_chunks(data, ranges, prefixes=None, suffix=None):
+    """Yield GridFS file contents one chunk at a time, so memory use is bounded by the chunk size."""
+    for index, (begin, end) in enumerate(ranges):
+        if prefixes is not None:
+            yield prefixes[index]
+        data.seek(begin)
+        remaining = end - begin
+        while remaining > 0:
+            chunk = data.read(min(remaining, data.chunk_size))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    if suffix is not None:
+        yield suffix
+
+
 @application.route("/<allow(observations,experiments,artifacts):otype>/<oid>/content/<key>/data")
 @require_auth
 def get_otype_oid_content_key_data(otype, oid, key):
     require_permissions(["read"])
     oid = bson.objectid.ObjectId(oid)
-    obj = database[otype].find_one({"_id": oid})
+    obj = database[otype].find_one({"_id": oid}, projection={"content." + key: True})
 
-    if key not in obj["content"]:
+    if obj is None or key not in obj.get("content", {}):
         flask.abort(404)
 
     content = obj["content"][key]
     content_type = content["content-type"]
-    data = fs.get(content["data"])
+    data = samlab.deserialize.stream(fs, content)
+    etag = _content_etag(data)
+
     headers = {
-        "content-type": content_type,
+        "accept-ranges": "bytes",
+        "etag": '"%s"' % etag,
     }
 
-    begin = 0
-    end = data.length
-    status_code = 200
-
-    if flask.request.headers.has_key("range"):
+    if flask.request.if_none_match.contains(etag):
+        response = flask.make_response(("", 304, headers))
+        response.cache_control.max_age = "300"
+        response.cache_control.public = True
+        return response
+
+    ranges = []
+    if "range" in flask.request.headers:
+        # Ignore the range if the client's copy is stale.
+        if_range = flask.request.headers.get("if-range")
+        if if_range is None or if_range.strip() == headers["etag"]:
+            ranges = _content_ranges(flask.request.headers["range"], data.length)
+
+    if ranges is None:
+        headers["content-range"] = "bytes */%s" % data.length
+        return flask.make_response(("", 416, headers))
+
+    if not ranges:
+        status_code = 200
+        headers["content-type"] = content_type
+        headers["content-length"] = str(data.length)
+        body = _content_chunks(data, [(0, data.length)])
+    elif len(ranges) == 1:
         status_code = 206
-        headers["accept-ranges"] = "bytes"
-
-        ranges = re.findall(r"\d+", flask.request.headers["range"])
-        begin = int(ranges[0])
-        if len(ranges) > 1:
-            end = int(ranges[1]) + 1
+        begin, end = ranges[0]
+        headers["content-type"] = content_type
         headers["content-range"] = "bytes %s-%s/%s" % (begin, end - 1, data.length)
+        headers["content-length"] = str(end - begin)
+        body = _content_chunks(data, ranges)
+    else:
+        status_code = 206
+        boundary = bson.objectid.ObjectId().binary.hex()
+        prefixes = [("--%s\r\ncontent-type: %s\r\ncontent-range: bytes %s-%s/%s\r\n\r\n" % (boundary, content_type, begin, end - 1, data.length)).encode("ascii") for begin, end in ranges]
+        prefixes = [prefixes[0]] + [b"\r\n" + prefix for prefix in prefixes[1:]]
+        suffix = ("\r\n--%s--\r\n" % boundary).encode("ascii")
+        headers["content-type"] = "multipart/byteranges; boundary=%s" % boundary
+        headers["content-length"] = str(sum([len(prefix) for prefix in prefixes]) + sum([end - begin for begin, end in ranges]) + len(suffix))
+        body = _content_chunks(data, ranges, prefixes, suffix)
+
+    response = flask.Response(body, status=status_code, headers=headers, direct_passthrough=True)
+    response.cache_control.max_age = "300"
+    response.cache_control.public = True
+    return response
 
-    headers["content-length"] = str(end - begin)
-
-    data.seek(begin)
-    body = data.read(end - begin)
 
-    response = flask.make_response((body, status_code, headers))
+def _send_derived(data, content_type):
+    etag = _content_etag(data)
+    headers = {"etag": '"%s"' % etag}
+    if flask.request.if_none_match.contains(etag):
+        response = flask.make_response(("", 304, headers))
+    else:
+        headers["content-type"] = content_type
+        headers["content-length"] = str(data.length)
+        response = flask.Response(_content_chunks(data, [(0, data.length)]), headers=headers, direct_passthrough=True)
     response.cache_control.max_age = "300"
     response.cache_control.public = True
     return response
 
 
+def _snap_size(size, maximum, minimum=16):
+    """Round a requested size up to a power of two, limited to `maximum`.
+
+    Every distinct size creates a new derived content entry, so clients are
+    limited to a small, fixed set of sizes.
+    """
+    snapped = minimum
+    while snapped < size and snapped < maximum:
+        snapped *= 2
+    return min(snapped, maximum)
+
+
+def _size_arg():
+    size = flask.request.args.get("size", None)
+    if size is None:
+        return None
+    try:
+        size = int(size)
+    except:
+        flask.abort(400, "Size must be an integer: %s" % size)
+    if size <= 0:
+        flask.abort(400, "Size must be a positive integer: %s" % size)
+    return _snap_size(size, application.config.get("derived-max-size", 2048))
+
+
 @application.route("/<allow(observations,experiments,artifacts):otype>/<oid>/content/<key>/array/image")
 @require_auth
 def get_otype_oid_content_key_array_image(otype, oid, key):
     require_permissions(["read"])
 
     oid = bson.objectid.ObjectId(oid)
-    obj = database[otype].find_one({"_id": oid})
+    obj = database[otype].find_one({"_id": oid}, projection={"content." + key: True})
 
-    if not key in obj["content"]:
+    if obj is None or key not in obj.get("content", {}):
         flask.abort(404)
 
     if obj["content"][key]["content-type"] != "application/x-numpy-array":
         flask.abort(400)
 
-    data = samlab.deserialize.array(fs, obj["content"][key])
-
-    cmap_factory, cmap_name = flask.request.args.get("colormap", "linear/Blackbody").split("/")
-
-    if cmap_factory == "brewer":
-        cmap_factory = toyplot.color.brewer
-    elif cmap_factory == "linear":
-        cmap_factory = toyplot.color.linear
-    elif cmap_factory == "diverging":
-        cmap_factory = toyplot.color.diverging
-    else:
-        flask.abort(400)
+    colormap = flask.request.args.get("colormap", "linear/Blackbody")
+    size = _size_arg()
 
     try:
-        colormap = cmap_factory.map(cmap_name)
-    except:
+        samlab.derived.lookup_colormap(colormap)
+    except ValueError:
         flask.abort(400)
 
-    data = colormap.colors(data)
+    data = samlab.derived.array_image(database, fs, obj["content"][key], colormap=colormap, size=size)
+    return _send_derived(data, "image/png")
 
-    stream = io.BytesIO()
-    toyplot.bitmap.to_png(data, stream)
 
-    response = flask.make_response(stream.getvalue())
-    response.headers["content-type"] = "image/png"
-    return response
+@application.route("/<allow(observations,experiments,artifacts):otype>/<oid>/content/<key>/image/thumbnail")
+@require_auth
+def get_otype_oid_content_key_image_thumbnail(otype, oid, key):
+    require_permissions(["read"])
+
+    oid = bson.objectid.ObjectId(oid)
+    obj = database[otype].find_one({"_id": oid}, projection={"content." + key: True})
+
+    if obj is None or key not in obj.get("content", {}):
+        flask.abort(404)
+
+    content = obj["content"][key]
+    if content["content-type"] not in ["image/jpeg", "image/png"]:
+        flask.abort(400)
+
+    size = _size_arg()
+    if size is None:
+        size = 256
+
+    data = samlab.derived.image(database, fs, content, size=size)
+    return _send_derived(data, content["content-type"])
 
 
 @application.route("/<allow(observations,experiments,artifacts):otype>/<oid>/content/<key>/array/metadata")
@@ -187,26 +339,19 @@ def get_otype_oid_content_key_array_metadata(otype, oid, key):
     require_permissions(["read"])
 
     oid = bson.objectid.ObjectId(oid)
-    obj = database[otype].find_one({"_id": oid})
+    obj = database[otype].find_one({"_id": oid}, projection={"content." + key: True})
 
-    if not key in obj["content"]:
+    if obj is None or key not in obj.get("content", {}):
         flask.abort(404)
 
-    if obj["content"][key]["content-type"] != "application/x-numpy-array":
+    content = obj["content"][key]
+    if content["content-type"] != "application/x-numpy-array":
         flask.abort(400)
 
-    array = samlab.deserialize.array(fs, obj["content"][key])
-
-    metadata = {
-        "dtype": array.dtype.name,
-        "ndim": array.ndim,
-        "shape": array.shape,
-        "size": array.size,
-        "min": array.min() if array.size else None,
-        "mean": array.mean() if array.size else None,
-        "max": array.max() if array.size else None,
-        "sum": array.sum() if array.size else None,
-        }
+    # Content stored before metadata was computed at ingest requires a fallback.
+    metadata = content.get("metadata", None)
+    if metadata is None:
+        metadata = samlab.serialize.array_metadata(samlab.deserialize.array(fs, content))
     return flask.jsonify(metadata=metadata)
 
 
@@ -216,22 +361,47 @@ def get_otype_oid_content_key_arrays_metadata(otype, oid, key):
     require_permissions(["read"])
 
     oid = bson.objectid.ObjectId(oid)
-    obj = database[otype].find_one({"_id": oid})
+    obj = database[otype].find_one({"_id": oid}, projection={"content." + key: True})
 
-    if not key in obj["content"]:
+    if obj is None or key not in obj.get("content", {}):
         flask.abort(404)
 
-    if obj["content"][key]["content-type"] != "application/x-numpy-arrays":
+    content = obj["content"][key]
+    if content["content-type"] != "application/x-numpy-arrays":
         flask.abort(400)
 
-    with samlab.deserialize.arrays(fs, obj["content"][key]) as arrays:
-        metadata = [{
-            "key": key,
-            "dtype": array.dtype.name,
-            "shape": array.shape,
-            "size": array.size,
-            } for key, array in arrays.items()]
-        return flask.jsonify(metadata=metadata)
+    metadata = content.get("metadata", None)
+    if metadata is None:
+        with samlab.deserialize.arrays(fs, content) as arrays:
+            metadata = samlab.serialize.arrays_metadata(arrays)
+    return flask.jsonify(metadata=metadata)
+
+
+def _parse_index(text):
+    """Convert a Numpy-style index such as "0:10,::2,5" into a tuple of ints and slices."""
+    index = []
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            if ":" in item:
+                parts = [int(part) if part.strip() else None for part in item.split(":")]
+                if len(parts) > 3:
+                    raise ValueError()
+                index.append(slice(*parts))
+            else:
+                index.append(int(item))
+        except ValueError:
+            flask.abort(400, "Invalid slice: %s" % text)
+    return tuple(index)
+
+
+def _downsample(data, points):
+    """Downsample an array so that no axis has more than the requested number of points."""
+    if points is None or not data.ndim:
+        return data
+    return data[tuple([slice(None, None, max(1, -(-length // points))) for length in data.shape])]
 
 
 @application.route("/<allow(observations,experiments,artifacts):otype>/<oid>/content/<key>/arrays/<array>/data")
@@ -240,18 +410,53 @@ def get_otype_oid_content_key_arrays_array_data(otype, oid, key, array):
     require_permissions(["read"])
 
     oid = bson.objectid.ObjectId(oid)
-    obj = database[otype].find_one({"_id": oid})
+    obj = database[otype].find_one({"_id": oid}, projection={"content." + key: True})
 
-    if not key in obj["content"]:
+    if obj is None or key not in obj.get("content", {}):
         flask.abort(404)
 
     if obj["content"][key]["content-type"] != "application/x-numpy-arrays":
         flask.abort(400)
 
-    with samlab.deserialize.arrays(fs, obj["content"][key]) as arrays:
-        if array not in arrays:
-            flask.abort(404)
-        return flask.jsonify(data = arrays[array].tolist())
+    index = _parse_index(flask.request.args.get("slice", ""))
+
+    reduce = flask.request.args.get("reduce", None)
+    if reduce not in [None, "max", "mean", "min", "sum"]:
+        flask.abort(400, "Unknown reduction: %s" % reduce)
+
+    axis = flask.request.args.get("axis", None)
+    if axis is not None:
+        try:
+            axis = tuple([int(a) for a in axis.split(",")])
+        except:
+            flask.abort(400, "Axis must be a comma-separated list of integers: %s" % axis)
+
+    points = flask.request.args.get("points", None)
+    if points is not None:
+        try:
+            points = int(points)
+        except:
+            flask.abort(400, "Points must be an integer: %s" % points)
+        if points <= 0:
+            flask.abort(400, "Points must be a positive integer: %s" % points)
+
+    try:
+        data = samlab.deserialize.arrays_slice(fs, obj["content"][key], array, index)
+    except KeyError:
+        flask.abort(404)
+    except (IndexError, ValueError) as e:
+        flask.abort(400, str(e))
+
+    if reduce is not None:
+        try:
+            data = getattr(numpy, reduce)(data, axis=axis)
+        except (TypeError, ValueError) as e:
+            flask.abort(400, str(e))
+        data = numpy.asarray(data)
+
+    data = _downsample(data, points)
+
+    return flask.jsonify(data=data.tolist(), shape=data.shape)
 
 
 @application.route("/<allow(observations,experiments,artifacts):otype>/<oid>/content/<key>/image/metadata")
@@ -260,43 +465,116 @@ def get_otype_oid_content_key_image_metadata(otype, oid, key):
     require_permissions(["read"])
 
     oid = bson.objectid.ObjectId(oid)
-    obj = database[otype].find_one({"_id": oid})
+    obj = database[otype].find_one({"_id": oid}, projection={"content." + key: True})
 
-    if not key in obj["content"]:
+    if obj is None or key not in obj.get("content", {}):
         flask.abort(404)
 
-    if obj["content"][key]["content-type"] not in ["image/jpeg", "image/png"]:
+    content = obj["content"][key]
+    if content["content-type"] not in ["image/jpeg", "image/png"]:
         flask.abort(400)
 
-    image = samlab.deserialize.image(fs, obj["content"][key])
+    metadata = content.get("metadata", None)
+    if metadata is None:
+        with samlab.deserialize.image(fs, content) as image:
+            metadata = samlab.serialize.image_metadata(image)
+    return flask.jsonify(metadata=metadata)
+
+
+# Maps each batch view to the fields it requires, or None if it requires the entire object.
+_batch_views = {
+    "attributes": ["attributes"],
+    "attributes-pre": ["attributes"],
+    "attributes-summary": ["attributes"],
+    "content": ["content"],
+    "object": None,
+    "tags": ["tags"],
+}
 
-    return flask.jsonify(metadata={"size": image.size})
+_batch_limit = 1000
+
+
+@application.route("/<allow(observations,experiments,artifacts):otype>/batch", methods=["POST"])
+@require_auth
+def post_otype_batch(otype):
+    require_permissions(["read"])
+
+    payload = samlab.web.app.handlers.common.json_payload()
+    oids = payload.get("oids", [])
+    if not isinstance(oids, list):
+        flask.abort(400, "oids must be a list.")
+    if len(oids) > _batch_limit:
+        flask.abort(400, "Too many objects requested, limit is %s." % _batch_limit)
+    try:
+        oids = [bson.objectid.ObjectId(oid) for oid in oids]
+    except:
+        flask.abort(400, "Invalid object id.")
+
+    views = payload.get("views", ["object"])
+    if not isinstance(views, list):
+        flask.abort(400, "views must be a list.")
+    for view in views:
+        if not isinstance(view, str) or view not in _batch_views:
+            flask.abort(400, "Unknown view: %s" % view)
+
+    projection = {}
+    for view in views:
+        if _batch_views[view] is None:
+            projection = None
+            break
+        for field in _batch_views[view]:
+            projection[field] = True
+
+    objects = {obj["_id"]: obj for obj in database[otype].find({"_id": {"$in": oids}}, projection=projection)}
+
+    results = []
+    for oid in oids:
+        obj = objects.get(oid, None)
+        if obj is None:
+            results.append(None)
+            continue
+
+        result = {"id": oid}
+        if "attributes" in views:
+            result["attributes"] = obj["attributes"]
+        if "attributes-pre" in views:
+            result["attributes-pre"] = _attributes_pre(obj)
+        if "attributes-summary" in views:
+            result["attributes-summary"] = _attributes_summary(obj)
+        if "content" in views:
+            result["content"] = [{"key": key, "content-type": value["content-type"], "filename": value.get("filename", None), "metadata": value.get("metadata", None)} for key, value in obj.get("content", {}).items()]
+        if "tags" in views:
+            result["tags"] = sorted(obj.get("tags", []))
+        # Note: the object representation modifies the object in-place, so it must come last.
+        if "object" in views:
+            result["object"] = samlab.web.app.handlers.common.object_representation(obj)
+        results.append(result)
+
+    return flask.jsonify(otype=otype, objects=results)
 
 
 @cachetools.func.lru_cache()
-def get_objects(session, otype, search):
-    if search:
-        return samlab.object.load(database, otype, oids=samlab.object.search(database, otype, search))
+def get_search_filter(session, otype, search):
+    try:
+        return samlab.object.search_filter(database, otype, search)
+    except pyparsing.ParseException as e:
+        flask.abort(400, "Invalid search: %s" % e)
+
 
-    return samlab.object.load(database, otype)
+@cachetools.func.lru_cache()
+def get_count(session, otype, search):
+    return database[otype].count_documents(get_search_filter(session, otype, search))
 
 
 @cachetools.func.lru_cache()
-def get_sorted_objects(session, otype, search, sort, direction):
-    objects = get_objects(session, otype, search)
-    if sort == "_id":
-        objects = sorted(objects, key=lambda o: o["_id"])
-    elif sort == "created":
-        objects = sorted(objects, key=lambda o: o.get("created", ""))
-    elif sort == "modified":
-        objects = sorted(objects, key=lambda o: o.get("modified", ""))
-    elif sort == "modified-by":
-        objects = sorted(objects, key=lambda o: o.get("modified-by", ""))
-    elif sort == "tags":
-        objects = sorted(objects, key=lambda o: o.get("tags", []))
-    if direction != "ascending":
-        objects = objects[::-1]
-    return objects
+def get_sorted_ids(session, otype, search, sort, direction):
+    direction = pymongo.ASCENDING if direction == "ascending" else pymongo.DESCENDING
+    order = [("_id", direction)]
+    if sort != "_id":
+        order.insert(0, (sort, direction))
+    cursor = database[otype].find(get_search_filter(session, otype, search), projection={"_id": True}, sort=order)
+    oids = [obj["_id"] for obj in cursor]
+    return oids, {oid: index for index, oid in enumerate(oids)}
 
 
 @application.route("/<allow(observations,experiments,artifacts):otype>/count")
@@ -310,9 +588,23 @@ def get_otype_count(otype):
 
     search = flask.request.args.get("search", "")
 
-    objects = get_objects(session, otype, search)
+    count = get_count(session, otype, search)
+
+    return flask.jsonify(session=session, otype=otype, search=search, count=count)
+
+
+@application.route("/<allow(observations,experiments,artifacts):otype>/search/explain")
+@require_auth
+def get_otype_search_explain(otype):
+    require_permissions(["read"])
+
+    search = flask.request.args.get("search", "")
+    try:
+        explanation = samlab.object.explain_search(database, otype, search)
+    except pyparsing.ParseException as e:
+        flask.abort(400, "Invalid search: %s" % e)
 
-    return flask.jsonify(session=session, otype=otype, search=search, count=len(objects))
+    return flask.jsonify(otype=otype, search=search, explanation=explanation)
 
 
 @application.route("/<allow(observations,experiments,artifacts):otype>/index/<oindex>")
@@ -341,11 +633,11 @@ def get_otype_index_oindex(otype, oindex):
     if direction not in ["ascending", "descending"]:
         flask.abort(400, "Unknown sort direction: %s" % direction)
 
-    objects = get_sorted_objects(session, otype, search, sort, direction)
-    if oindex >= len(objects):
+    oids, indices = get_sorted_ids(session, otype, search, sort, direction)
+    if oindex >= len(oids):
         flask.abort(400, "Index out of range: %s" % oindex)
 
-    oid = objects[oindex]["_id"]
+    oid = oids[oindex]
 
     return flask.jsonify(session=session, otype=otype, search=search, sort=sort, direction=direction, oindex=oindex, oid=oid)
 
@@ -369,27 +661,46 @@ def get_otype_id_oid(otype, oid):
     if direction not in ["ascending", "descending"]:
         flask.abort(400, "Unknown sort direction: %s" % direction)
 
-    objects = get_sorted_objects(session, otype, search, sort, direction)
+    oids, indices = get_sorted_ids(session, otype, search, sort, direction)
     oid = bson.objectid.ObjectId(oid)
-    oindex = None
-    for index, obj in enumerate(objects):
-        if obj["_id"] == oid:
-            oindex = index
-            break
+    oindex = indices.get(oid, None)
 
     return flask.jsonify(session=session, otype=otype, search=search, sort=sort, direction=direction, oid=oid, oindex=oindex)
 
 
+@cachetools.func.ttl_cache(ttl=60)
+def get_tag_counts(otype, search):
+    return samlab.object.tag_counts(database, otype, filter=samlab.object.search_filter(database, otype, search))
+
+
+def tags_changed(otype):
+    get_tag_counts.cache_clear()
+    socketio.emit("tags-changed", otype) # TODO: Handle this in samlab.web.app.watch_database
+
+
 @application.route("/<allow(observations,experiments,artifacts):otype>/tags")
 @require_auth
 def get_otype_tags(otype):
     require_permissions(["read"])
 
-    tags = set()
-    for obj in database[otype].find(projection={"tags":True, "_id": False}):
-        tags.update(obj["tags"])
+    tags = [tag for tag, count in get_tag_counts(otype, "")]
+
+    return flask.jsonify(tags=tags)
+
+
+@application.route("/<allow(observations,experiments,artifacts):otype>/tags/counts")
+@require_auth
+def get_otype_tags_counts(otype):
+    require_permissions(["read"])
+
+    search = flask.request.args.get("search", "")
 
-    return flask.jsonify(tags=sorted(tags))
+    try:
+        tags = [{"tag": tag, "count": count} for tag, count in get_tag_counts(otype, search)]
+    except pyparsing.ParseException as e:
+        flask.abort(400, "Invalid search: %s" % e)
+
+    return flask.jsonify(otype=otype, search=search, tags=tags)
 
 
 def _add_modified(update):
@@ -419,6 +730,9 @@ def get_put_otype_oid_attributes(otype, oid):
         attributes.update(flask.request.json)
 
         update = {"$set": _add_modified({"attributes": attributes})}
+        indexed = samlab.ngram.indexed_fields(database, otype)
+        if indexed:
+            update["$set"]["ngrams"] = samlab.ngram.ngrams(dict(obj, attributes=attributes), indexed)
         database[otype].update_one({"_id": oid}, update)
 
         socketio.emit("attribute-keys-changed", otype) # TODO: Handle this in samlab.web.app.watch_database
@@ -426,6 +740,13 @@ def get_put_otype_oid_attributes(otype, oid):
         return flask.jsonify()
 
 
+def _json_strings(payload, key):
+    value = payload.get(key, [])
+    if not isinstance(value, list) or not all([isinstance(item, str) for item in value]):
+        flask.abort(400, "%s must be a list of strings." % key)
+    return value
+
+
 @application.route("/<allow(observations,experiments,artifacts):otype>/<oid>/tags", methods=["PUT"])
 @require_auth
 def put_otype_oid_tags(otype, oid):
@@ -433,9 +754,10 @@ def put_otype_oid_tags(otype, oid):
     oid = bson.objectid.ObjectId(oid)
     obj = database[otype].find_one({"_id": oid})
 
-    add = flask.request.json["add"]
-    remove = flask.request.json["remove"]
-    toggle = flask.request.json["toggle"]
+    payload = samlab.web.app.handlers.common.json_payload()
+    add = _json_strings(payload, "add")
+    remove = _json_strings(payload, "remove")
+    toggle = _json_strings(payload, "toggle")
 
     tags = set(obj["tags"])
     for tag in add:
@@ -452,11 +774,90 @@ def put_otype_oid_tags(otype, oid):
     update = {"$set": _add_modified({"tags": tags})}
     database[otype].update_one({"_id": oid}, update)
 
-    socketio.emit("tags-changed", otype) # TODO: Handle this in samlab.web.app.watch_database
+    tags_changed(otype)
 
     return flask.jsonify()
 
 
+_bulk_chunk_size = 10000
+
+
+def _bulk_filters(otype, payload):
+    """Yield filters matching the objects selected by a bulk request, chunked to keep each query small.
+
+    Searches are resolved to object ids up front, so every operation in the
+    request applies to the same objects, even if it changes what the search matches.
+    """
+    if "oids" in payload:
+        if not isinstance(payload["oids"], list):
+            flask.abort(400, "oids must be a list.")
+        try:
+            oids = [bson.objectid.ObjectId(oid) for oid in payload["oids"]]
+        except:
+            flask.abort(400, "Invalid object id.")
+    elif "search" in payload:
+        if not isinstance(payload["search"], str):
+            flask.abort(400, "search must be a string.")
+        try:
+            filter = samlab.object.search_filter(database, otype, payload["search"])
+        except pyparsing.ParseException as e:
+            flask.abort(400, "Invalid search: %s" % e)
+        oids = [obj["_id"] for obj in database[otype].find(filter, projection={"_id": True})]
+    else:
+        flask.abort(400, "Bulk requests require oids or search.")
+
+    for index in range(0, len(oids), _bulk_chunk_size):
+        yield {"_id": {"$in": oids[index:index + _bulk_chunk_size]}}
+
+
+def _modified_by():
+    if hasattr(flask.request.authorization, "username"):
+        return flask.request.authorization.username
+    return None
+
+
+@application.route("/<allow(observations,experiments,artifacts):otype>/bulk/tags", methods=["PUT"])
+@require_auth
+def put_otype_bulk_tags(otype):
+    require_permissions(["write"])
+
+    payload = samlab.web.app.handlers.common.json_payload()
+    add = _json_strings(payload, "add")
+    remove = _json_strings(payload, "remove")
+    toggle = _json_strings(payload, "toggle")
+
+    count = 0
+    for filter in _bulk_filters(otype, payload):
+        count += samlab.object.update_tags(database, otype, filter, add=add, remove=remove, toggle=toggle, modified_by=_modified_by())
+
+    tags_changed(otype)
+
+    return flask.jsonify(count=count)
+
+
+@application.route("/<allow(observations,experiments,artifacts):otype>/bulk/attributes", methods=["PUT"])
+@require_auth
+def put_otype_bulk_attributes(otype):
+    require_permissions(["write"])
+
+    payload = samlab.web.app.handlers.common.json_payload()
+    set = payload.get("set", {})
+    if not isinstance(set, dict):
+        flask.abort(400, "set must be an object.")
+    unset = _json_strings(payload, "unset")
+
+    count = 0
+    try:
+        for filter in _bulk_filters(otype, payload):
+            count += samlab.object.update_attributes(database, otype, filter, set=set, unset=unset, modified_by=_modified_by())
+    except ValueError as e:
+        flask.abort(400, str(e))
+
+    socketio.emit("attribute-keys-changed", otype) # TODO: Handle this in samlab.web.app.watch_database
+
+    return flask.jsonify(count=count)
+
+
 @application.route("/<allow(observations,experiments,artifacts):otype>/<oid>/plots/auto")
 @require_auth
 def get_otype_oid_plots_auto(otype, oid):
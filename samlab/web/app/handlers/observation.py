@@ -23,7 +23,7 @@ from samlab.web.app import application, require_auth, require_permissions
 from samlab.web.app.database import database, fs
 
 
-@application.route("/observations/<exclude(count,tags):oid>", methods=["GET", "DELETE"])
+@application.route("/observations/<exclude(batch,count,tags):oid>", methods=["GET", "DELETE"])
 @require_auth
 def get_delete_observations_observation(oid):
     oid = bson.objectid.ObjectId(oid)
@@ -0,0 +1,101 @@
+# Copyright 2018, National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS).  Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import logging
+
+import bson
+import flask
+import pyparsing
+
+import samlab.view
+import samlab.web.app.handlers.common
+
+# Setup logging.
+log = logging.getLogger(__name__)
+
+# Get the web server.
+from samlab.web.app import application, socketio, require_auth, require_permissions
+
+# Get the database.
+from samlab.web.app.database import database, fs
+
+
+@application.route("/views/<allow(observations,experiments,artifacts):otype>")
+@require_auth
+def get_views_otype(otype):
+    require_permissions(["read"])
+    views = [{"name": view["name"], "search": view["search"]} for view in database.views.find({"otype": otype}, sort=[("name", 1)])]
+    return flask.jsonify(otype=otype, views=views)
+
+
+@application.route("/views/<allow(observations,experiments,artifacts):otype>/<name>", methods=["PUT", "DELETE"])
+@require_auth
+def put_delete_views_otype_name(otype, name):
+    if flask.request.method == "PUT":
+        require_permissions(["write"])
+        search = samlab.web.app.handlers.common.json_payload().get("search", None)
+        if not isinstance(search, str):
+            flask.abort(400, "search must be a string.")
+        try:
+            count = samlab.view.create(database, otype, name, search)
+        except pyparsing.ParseException as e:
+            flask.abort(400, "Invalid search: %s" % e)
+        socketio.emit("view-changed", {"otype": otype, "name": name})
+        return flask.jsonify(count=count)
+
+    elif flask.request.method == "DELETE":
+        require_permissions(["delete"])
+        samlab.view.delete(database, otype, name)
+        socketio.emit("view-changed", {"otype": otype, "name": name})
+        return flask.jsonify()
+
+
+@application.route("/views/<allow(observations,experiments,artifacts):otype>/<name>/count")
+@require_auth
+def get_views_otype_name_count(otype, name):
+    require_permissions(["read"])
+    try:
+        count = samlab.view.count(database, otype, name)
+    except KeyError:
+        flask.abort(404)
+    return flask.jsonify(otype=otype, name=name, count=count)
+
+
+@application.route("/views/<allow(observations,experiments,artifacts):otype>/<name>/page")
+@require_auth
+def get_views_otype_name_page(otype, name):
+    require_permissions(["read"])
+
+    try:
+        skip = int(flask.request.args.get("skip", 0))
+        limit = int(flask.request.args.get("limit", 100))
+    except:
+        flask.abort(400, "Skip and limit must be integers.")
+    if skip < 0 or limit < 0:
+        flask.abort(400, "Skip and limit must be non-negative integers.")
+
+    after = flask.request.args.get("after", None)
+    if after is not None:
+        try:
+            after = bson.objectid.ObjectId(after)
+        except:
+            flask.abort(400, "Invalid object id: %s" % after)
+
+    try:
+        oids = samlab.view.page(database, otype, name, skip=skip, limit=limit, after=after)
+    except KeyError:
+        flask.abort(404)
+    return flask.jsonify(otype=otype, name=name, skip=skip, limit=limit, oids=oids)
+
+
+@application.route("/views/<allow(observations,experiments,artifacts):otype>/<name>/refresh", methods=["POST"])
+@require_auth
+def post_views_otype_name_refresh(otype, name):
+    require_permissions(["write"])
+    try:
+        count = samlab.view.refresh(database, otype, name)
+    except KeyError:
+        flask.abort(404)
+    socketio.emit("view-changed", {"otype": otype, "name": name})
+    return flask.jsonify(count=count)
@@ -11,10 +11,9 @@ define([
     "samlab-artifact-manager",
     "samlab-object-manager",
     "samlab-permissions",
-    "samlab-server",
     "samlab-tag-manager",
     "samlab-content-list-control",
-    ], function(ko, mapping, attribute_manager, dashboard, dialog, artifact_manager, object, permissions, server, tag_manager)
+    ], function(ko, mapping, attribute_manager, dashboard, dialog, artifact_manager, object, permissions, tag_manager)
 {
     var component_name= "samlab-artifact-widget";
     ko.components.register(component_name,
@@ -42,7 +41,7 @@ define([
                 var auto_delete_subscription = dashboard.auto_delete(widget, "artifacts", widget.params.id);
                 var artifact_changed_subscription = object.notify_changed("artifacts", widget.params.id, function()
                 {
-                    server.load_json(component, "/artifacts/" + component.artifact.id());
+                    component.load();
                 });
 
                 component.dispose = function()
@@ -126,7 +125,18 @@ define([
                     return null;
                 });
 
-                server.load_json(component, "/artifacts/" + component.artifact.id());
+                component.load = function()
+                {
+                    object.load("artifacts", component.artifact.id(),
+                    {
+                        success: function(data)
+                        {
+                            mapping.fromJS({artifact: data.object}, component);
+                        },
+                    });
+                }
+
+                component.load();
 
                 return component;
             }
@@ -7,9 +7,7 @@ define([
     "knockout",
     "knockout.mapping",
     "samlab-object-manager",
-    "samlab-server",
-    "URI",
-    ], function(debug, ko, mapping, object, server, URI)
+    ], function(debug, ko, mapping, object)
 {
     var component_name = "samlab-attribute-control";
 
@@ -49,15 +47,14 @@ define([
                     if(component.otype() == null || component.oid() == null)
                         return;
 
-                    var uri = new URI("/" + component.otype() + "/" + component.oid());
-                    if(component.expanded())
-                        uri.path(uri.path() + "/attributes/pre");
-                    else
-                        uri.path(uri.path() + "/attributes/summary");
-
-                    server.load_text(uri, function(value)
+                    var view = component.expanded() ? "attributes-pre" : "attributes-summary";
+                    object.load(component.otype(), component.oid(),
                     {
-                        component.markup(value);
+                        views: [view],
+                        success: function(data)
+                        {
+                            component.markup(data[view]);
+                        },
                     });
                 };
 
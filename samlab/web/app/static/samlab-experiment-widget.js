@@ -43,7 +43,7 @@ define([
                 var auto_delete_subscription = dashboard.auto_delete(widget, "experiments", widget.params.id);
                 var experiment_changed_subscription = object.notify_changed("experiments", widget.params.id, function()
                 {
-                    server.load_json(component, "/experiments/" + component.experiment.id());
+                    component.load();
                     server.load_json(component, "/experiments/" + component.experiment.id() + "/artifacts");
                 });
 
@@ -127,7 +127,18 @@ define([
                     return null;
                 });
 
-                server.load_json(component, "/experiments/" + component.experiment.id());
+                component.load = function()
+                {
+                    object.load("experiments", component.experiment.id(),
+                    {
+                        success: function(data)
+                        {
+                            mapping.fromJS({experiment: data.object}, component);
+                        },
+                    });
+                }
+
+                component.load();
                 server.load_json(component, "/experiments/" + component.experiment.id() + "/artifacts");
 
                 return component;
@@ -6,10 +6,11 @@ define([
     "debug",
     "knockout",
     "knockout.mapping",
+    "lodash",
     "samlab-server",
     "samlab-socket",
     "URI",
-    ], function(debug, ko, mapping, server, socket, URI)
+    ], function(debug, ko, mapping, lodash, server, socket, URI)
 {
     var log = debug("samlab-object-manager");
 
@@ -76,6 +77,111 @@ define([
         server.delete("/" + otype + "/" + oid + "/content/" + key, "DELETE");
     }
 
+    // Retrieve multiple views of many objects with a single request.
+    module.load_batch = function(otype, oids, params)
+    {
+        var otype = ko.unwrap(otype);
+        var oids = ko.unwrap(oids);
+        var params = params || {};
+
+        server.post_json("/" + otype + "/batch",
+        {
+            oids: oids,
+            views: params.views || ["object"],
+        },
+        {
+            success: params.success,
+            error: params.error,
+            finished: params.finished,
+        });
+    }
+
+    // Objects requested with load() are collected until the current event
+    // handler returns, then retrieved using one load_batch() call per object type.
+    var batch_limit = 1000;
+    var pending_loads = {};
+
+    function send_loads(otype, loads)
+    {
+        var oids = lodash.uniq(lodash.map(loads, "oid"));
+        var views = lodash.uniq(lodash.flatten(lodash.map(loads, "views")));
+
+        module.load_batch(otype, oids,
+        {
+            views: views,
+            success: function(data)
+            {
+                var objects = lodash.zipObject(oids, data.objects);
+                lodash.each(loads, function(load)
+                {
+                    var result = objects[load.oid];
+                    if(result)
+                    {
+                        if(load.params.success)
+                            load.params.success(result);
+                    }
+                    else
+                    {
+                        if(load.params.error)
+                            load.params.error();
+                    }
+                    if(load.params.finished)
+                        load.params.finished();
+                });
+            },
+            error: function()
+            {
+                lodash.each(loads, function(load)
+                {
+                    if(load.params.error)
+                        load.params.error();
+                    if(load.params.finished)
+                        load.params.finished();
+                });
+            },
+        });
+    }
+
+    function flush_loads(otype)
+    {
+        var loads = pending_loads[otype];
+        delete pending_loads[otype];
+
+        log("load batch", otype, loads.length);
+        lodash.each(lodash.chunk(loads, batch_limit), function(chunk)
+        {
+            send_loads(otype, chunk);
+        });
+    }
+
+    // Retrieve views of one object, sharing a request with other widgets that load objects at the same time.
+    module.load = function(otype, oid, params)
+    {
+        var otype = ko.unwrap(otype);
+        var oid = ko.unwrap(oid);
+        var params = params || {};
+
+        if(oid == null)
+        {
+            if(params.error)
+                params.error();
+            if(params.finished)
+                params.finished();
+            return;
+        }
+
+        if(!(otype in pending_loads))
+        {
+            pending_loads[otype] = [];
+            window.setTimeout(function()
+            {
+                flush_loads(otype);
+            }, 0);
+        }
+
+        pending_loads[otype].push({oid: oid, views: params.views || ["object"], params: params});
+    }
+
     module.lookup_count = function(otype, params)
     {
         var params = params || {};
@@ -11,11 +11,10 @@ define([
     "samlab-object-manager",
     "samlab-observation-manager",
     "samlab-permissions",
-    "samlab-server",
     "samlab-tag-manager",
     "samlab-attribute-control",
     "samlab-content-list-control",
-    ], function(ko, mapping, attribute_manager, dashboard, dialog, object, observation_manager, permissions, server, tag_manager)
+    ], function(ko, mapping, attribute_manager, dashboard, dialog, object, observation_manager, permissions, tag_manager)
 {
     var component_name = "samlab-observation-widget";
     ko.components.register(component_name,
@@ -39,7 +38,7 @@ define([
                 var auto_delete_subscription = dashboard.auto_delete(widget, "observations", widget.params.id);
                 var observation_changed_subscription = object.notify_changed("observations", widget.params.id, function()
                 {
-                    server.load_json(component, "/observations/" + component.observation.id());
+                    component.load();
                 });
 
 
@@ -113,7 +112,18 @@ define([
                     return content["content-type"]().split("/")[0] == "image";
                 });
 
-                server.load_json(component, "/observations/" + component.observation.id());
+                component.load = function()
+                {
+                    object.load("observations", component.observation.id(),
+                    {
+                        success: function(data)
+                        {
+                            mapping.fromJS({observation: data.object}, component);
+                        },
+                    });
+                }
+
+                component.load();
 
                 return component;
             }
@@ -16,13 +16,12 @@ define([
     "samlab-object-manager",
     "samlab-observation-manager",
     "samlab-permissions",
-    "samlab-server",
     "samlab-socket",
     "samlab-tag-manager",
     "samlab-uuidv4",
     "samlab-attribute-control",
     "samlab-content-list-control",
-    ], function(debug, ko, mapping, lodash, URI, attribute_manager, bounding_box_manager, dashboard, dialog, notify, object, observation, permissions, server, socket, tag_manager, uuidv4)
+    ], function(debug, ko, mapping, lodash, URI, attribute_manager, bounding_box_manager, dashboard, dialog, notify, object, observation, permissions, socket, tag_manager, uuidv4)
 {
     var log = debug("samlab-observations-widget");
 
@@ -264,20 +263,19 @@ define([
                     component.oindex(oindex);
                     component.observation.id(oid);
 
-                    server.load_json(component, "/observations/" + oid, "GET",
+                    object.load("observations", oid,
                     {
-                        success: function()
+                        views: ["object", "attributes-summary"],
+                        success: function(data)
                         {
+                            mapping.fromJS({observation: data.object}, component);
+                            component.observation["attributes-pre"](data["attributes-summary"]);
                             component.deleted(false);
                         },
                         error: function()
                         {
                             component.deleted(true);
                         }
-                    })
-                    server.load_text("/observations/" + oid + "/attributes/summary", function(data)
-                    {
-                        component.observation["attributes-pre"](data);
                     });
 
                     attribute_manager.manage("observations", oid);
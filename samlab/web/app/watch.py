@@ -5,6 +5,8 @@
 import logging
 import threading
 
+import samlab.view
+
 log = logging.getLogger(__name__)
 
 # Get the web server.
@@ -28,6 +30,21 @@ def watch_objects(otype):
         elif operation == "delete":
             socketio.emit("object-deleted", {"otype": otype, "oid": oid})
 
+        # Keep saved views current.
+        if otype in ["observations", "experiments", "artifacts"]:
+            try:
+                if operation in ["insert", "update", "replace"]:
+                    views = samlab.view.update_object(database, otype, oid)
+                elif operation == "delete":
+                    views = samlab.view.delete_object(database, otype, oid)
+                else:
+                    views = []
+            except Exception as e:
+                log.error("Couldn't update saved views for %s %s: %s", otype, oid, e)
+                views = []
+            for view in views:
+                socketio.emit("view-changed", {"otype": otype, "name": view})
+
 
 def watch_timeseries():
     log.info("Watching timeseries for changes.")
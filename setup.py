@@ -33,6 +33,10 @@ setup(
         "requests",
         "toyplot",
     ],
+    extras_require={
+        "compression": ["lz4", "zstandard"],
+        "torch": ["torch"],
+    },
     maintainer="Timothy M. Shead",
     maintainer_email="tshead@sandia.gov",
     packages=find_packages(),
@@ -46,6 +50,8 @@ setup(
     scripts = [
         "bin/samlab-gputop",
         "bin/samlab-dashboard",
+        "bin/samlab-ingest",
+        "bin/samlab-update-metadata",
         ],
     version=re.search(
         r"^__version__ = ['\"]([^'\"]*)['\"]",